@@ -5,6 +5,7 @@
 """
 
 import logging
+from typing import Literal
 
 from dependency_injector import containers, providers
 from pydantic import Field, ValidationInfo, field_validator
@@ -30,8 +31,66 @@ class Settings(BaseSettings):
     COMPANY_ID: int = Field()
     USER_LOGIN: str = Field()
     PASSWORD: str = Field()
+    KIT_SHOP_BASE_URL: str = "https://api.kitshop.ru/APIService.svc"
+    KIT_SHOP_POOL_SIZE: int = 10
+    KIT_SHOP_TIMEOUT: float = 30.0
+    KIT_SHOP_RATE_LIMIT: float = 10.0
+    KIT_SHOP_RATE_BURST: int = 10
+    KIT_SHOP_MIN_CONCURRENCY: int = 1
+    KIT_SHOP_MAX_CONCURRENCY: int = 10
+    KIT_SHOP_RETRY_ATTEMPTS: int = 3
+    KIT_SHOP_RETRY_BASE_DELAY: float = 0.5
+    KIT_SHOP_RETRY_MAX_DELAY: float = 10.0
+    KIT_SHOP_BREAKER_THRESHOLD: int = 5
+    KIT_SHOP_BREAKER_RECOVERY: float = 30.0
+    KIT_SHOP_DETAILS_CONCURRENCY: int = 10
+    CUSTOMERS_CACHE_TTL: float = 300.0
+    CUSTOMERS_CACHE_MAX_SIZE: int = 64 * 1024 * 1024
+    SALE_DETAILS_CACHE_SIZE: int = 10_000
+    SALE_DETAILS_CACHE_TTL: float = 60.0
+    # Запись обмена с KitShop в фикстуры или ответы из фикстур вместо KitShop
+    KIT_SHOP_RECORD_PATH: str | None = None
+    KIT_SHOP_REPLAY_PATH: str | None = None
+    KIT_SHOP_REPLAY_TIMING: Literal["fast", "original"] = "fast"
+    KIT_SHOP_REPLAY_SPEED: float = 1.0
+    # Пул процессов для разбора больших ответов (None - по количеству ядер)
+    CPU_POOL_WORKERS: int | None = None
+    CPU_POOL_INLINE_BYTES: int = 256 * 1024
+
+    # Синхронизация
+    SALES_SYNC_OVERLAP_MINUTES: int = 10
+    SALES_SYNC_INITIAL_DAYS: int = 1
+    BULK_WRITE_BATCH_SIZE: int = 1000
+    BACKFILL_WINDOW_HOURS: int = 24
+    BACKFILL_WORKERS: int = 4
+    SALE_DETAILS_SYNC_DAYS: int = 1
+    SALE_DETAILS_SYNC_BATCH: int = 500
+    # Задержка повторного запроса подробностей после неудачи (удваивается с каждой попыткой)
+    SALE_DETAILS_SYNC_RETRY_MINUTES: int = 5
+    # Максимальная доля покупателей компании, удаляемая одной синхронизацией
+    CUSTOMERS_SYNC_MAX_DELETE_SHARE: float = 0.5
+
+    # Фоновый запуск синхронизаций (интервалы в секундах, 0 - задача отключена)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_JITTER: float = 0.1
+    SCHEDULER_JOB_TIMEOUT: float = 300.0
+    SALES_SYNC_INTERVAL: float = 60.0
+    SALE_DETAILS_SYNC_INTERVAL: float = 60.0
+    CUSTOMERS_SYNC_INTERVAL: float = 900.0
 
     DB_URL: str | None = None
+    # Пул соединений, отдельный у основной БД, реплики и асинхронного хелпера
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    # Журнал медленных запросов (порог в секундах, 0 - отключен) и доля SELECT с EXPLAIN ANALYZE
+    SLOW_QUERY_THRESHOLD: float = 1.0
+    SLOW_QUERY_EXPLAIN_RATE: float = 0.0
+    SLOW_QUERY_EXPLAIN_INTERVAL: float = 60.0
+    # Реплика для запросов только для чтения (отчеты по продажам)
+    DB_REPLICA_URL: str | None = None
+    DB_REPLICA_MAX_LAG: float = 30.0
+    DB_REPLICA_CHECK_INTERVAL: float = 5.0
 
     @field_validator("DB_URL", mode="before")
     def assemble_db_connection(cls, _v: str, values: ValidationInfo) -> str:
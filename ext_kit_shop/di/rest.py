@@ -7,21 +7,47 @@
 import time
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from datetime import timedelta
 from logging import Logger
-from typing import Any, cast
+from typing import Any, Literal, cast
 
+import httpx
 from dependency_injector import containers, providers
 from fastapi import FastAPI, Request
 from fastapi_offline import FastAPIOffline
 from pydantic_settings import BaseSettings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 
 from ext_kit_shop import __appname__, __version__
 from ext_kit_shop.di.common import CommonDI
 from ext_kit_shop.rest.auth.auth_router import AuthRouter
 from ext_kit_shop.rest.common import RoutsCommon
-from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.rest.metrics.metrics_router import MetricsRouter
+from ext_kit_shop.utils.bulk_writer import BulkWriter
+from ext_kit_shop.utils.cpu_pool import CpuPool
+from ext_kit_shop.utils.customers_cache import CustomersCache
+from ext_kit_shop.utils.customers_sync import CustomersSync
+from ext_kit_shop.utils.db_helper import AsyncDBHelper, DBHelper
+from ext_kit_shop.utils.db_metrics import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    instrument_engine,
+    observe_route,
+    track_db_time,
+)
+from ext_kit_shop.utils.kit_shop_client import KitShopClient
+from ext_kit_shop.utils.kit_shop_fixtures import RecordingTransport, ReplayTransport
 from ext_kit_shop.utils.kit_shop_manager import ApiAccess, KitShopManager
+from ext_kit_shop.utils.rate_limiter import AdaptiveRateLimiter
+from ext_kit_shop.utils.resilience import CircuitBreaker, RetryPolicy
+from ext_kit_shop.utils.sale_details_cache import SaleDetailsCache
+from ext_kit_shop.utils.sale_details_sync import SaleDetailsSync
+from ext_kit_shop.utils.sales_backfill import SalesBackfill
+from ext_kit_shop.utils.sales_sync import SalesSync
+from ext_kit_shop.utils.scheduler import Scheduler
+from ext_kit_shop.utils.single_flight import SingleFlight
+from ext_kit_shop.utils.slow_query_log import SlowQueryLog
 
 __all__ = ("RestDI",)
 
@@ -36,22 +62,35 @@ def init_rest_app(
     routers: list[type[RoutsCommon]],
     logger: Logger,
     settings: BaseSettings,
+    kit_shop_client: KitShopClient,
+    async_db_helper: AsyncDBHelper,
+    scheduler: Scheduler,
+    cpu_pool: CpuPool,
 ) -> FastAPI:
     """
     Инициализация Rest интерфейса
 
+    :param kit_shop_client: Клиент KitShop API, соединения которого закрываются при остановке
+    :param async_db_helper: Асинхронный хелпер БД, соединения которого закрываются при остановке
+    :param scheduler: Планировщик фоновых синхронизаций, работает между запуском и остановкой
+    :param cpu_pool: Пул процессов, процессы которого останавливаются при остановке
 
     :return: Экземпляр :class:`FastAPIOffline`
     """
 
     @asynccontextmanager
-    async def lifespan(app: FastAPI) -> AsyncGenerator[Any]:  # noqa: ARG001, RUF029
+    async def lifespan(app: FastAPI) -> AsyncGenerator[Any]:  # noqa: ARG001
         # Ожидание запуска сервисов от которых зависит приложение
         logger.info(
             "Приложение инициализировано",
             extra=settings.model_dump(),
         )
+        scheduler.start()
         yield
+        await scheduler.stop()
+        await kit_shop_client.aclose()
+        await async_db_helper.dispose()
+        await cpu_pool.aclose()
 
     app: CustomFastAPIType = cast(
         CustomFastAPIType, FastAPIOffline(version=__version__, lifespan=lifespan)
@@ -67,11 +106,17 @@ def init_rest_app(
         """Middleware для автоматического замера времени выполнения ВСЕХ маршрутов в FastAPI."""
         start_time = time.time()
 
-        response = await call_next(request)
+        with track_db_time(f"{request.method} {request.url.path}") as db_time:
+            response = await call_next(request)
         duration = time.time() - start_time
 
+        # Шаблон пути, а не сам путь: иначе каждый идентификатор в пути давал бы новую метку
+        route = request.scope.get("route")
+        observe_route(route.path if route is not None else "unmatched", db_time)
+
         logger.info(
             f"Маршрут {request.url.path} выполнен за {duration:.4f} секунд.",
+            extra={"db_seconds": db_time.seconds, "db_queries": db_time.queries},
         )
 
         return response
@@ -84,18 +129,169 @@ def get_db_helper(
     url: str,
     pool_size: int | None = None,
     max_overflow: int | None = None,
+    pool_timeout: float = 30.0,
+    replica_url: str | None = None,
+    replica_max_lag: float = 30.0,
+    replica_check_interval: float = 5.0,
+    slow_query_log: SlowQueryLog | None = None,
+    logger: Logger | None = None,
 ) -> DBHelper:
+    """
+    Хелпер БД
+
+    Пулы соединений основной БД и реплики отдают метрики под именами `primary` и `replica`.
+
+    :param url: URL основной БД
+    :param pool_size: Размер пула соединений (у основной БД и у реплики свои пулы)
+    :param max_overflow: Количество соединений сверх пула
+    :param pool_timeout: Максимальное ожидание свободного соединения (секунды)
+    :param replica_url: URL реплики для сессий только для чтения
+    :param replica_max_lag: Допустимое отставание реплики (секунды)
+    :param replica_check_interval: Интервал проверки отставания реплики (секунды)
+    :param slow_query_log: Журнал медленных запросов
+    :param logger: Логгер
+    :return: Экземпляр :class:`DBHelper`
+    """
     pool_size = pool_size or 5
     max_overflow = max_overflow or 10
     engine = create_engine(
         url,
         pool_pre_ping=True,
+        poolclass=InstrumentedQueuePool,
+        pool_logging_name="primary",
         pool_size=pool_size,
         max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
         connect_args={"application_name": __appname__},
     )
+    instrument_engine(engine, "primary")
+    if slow_query_log is not None:
+        slow_query_log.attach(engine)
+
+    replica_engine = None
+    if replica_url:
+        replica_engine = create_engine(
+            replica_url,
+            pool_pre_ping=True,
+            poolclass=InstrumentedQueuePool,
+            pool_logging_name="replica",
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            # Недоступная реплика не должна надолго задерживать переключение на основную БД
+            connect_args={"application_name": __appname__, "connect_timeout": 5},
+        )
+        instrument_engine(replica_engine, "replica")
+        if slow_query_log is not None:
+            slow_query_log.attach(replica_engine)
+
+    return DBHelper(
+        engine=engine,
+        replica_engine=replica_engine,
+        replica_max_lag=replica_max_lag,
+        replica_check_interval=replica_check_interval,
+        logger=logger,
+    )
+
+
+def get_async_db_helper(
+    url: str,
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    pool_timeout: float = 30.0,
+    slow_query_log: SlowQueryLog | None = None,
+) -> AsyncDBHelper:
+    """
+    Асинхронный хелпер БД на драйвере asyncpg
+
+    Пул соединений отдает метрики под именем `async`.
+
+    :param url: URL БД (драйвер в URL заменяется на asyncpg)
+    :param pool_size: Размер пула соединений
+    :param max_overflow: Количество соединений сверх пула
+    :param pool_timeout: Максимальное ожидание свободного соединения (секунды)
+    :param slow_query_log: Журнал медленных запросов
+    :return: Экземпляр :class:`AsyncDBHelper`
+    """
+    pool_size = pool_size or 5
+    max_overflow = max_overflow or 10
+    engine = create_async_engine(
+        make_url(url).set(drivername="postgresql+asyncpg"),
+        pool_pre_ping=True,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_logging_name="async",
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        connect_args={"server_settings": {"application_name": __appname__}},
+    )
+    instrument_engine(engine.sync_engine, "async")
+    if slow_query_log is not None:
+        slow_query_log.attach(engine.sync_engine)
 
-    return DBHelper(engine=engine)
+    return AsyncDBHelper(engine=engine)
+
+
+def get_kit_shop_transport(
+    pool_size: int,
+    record_path: str | None = None,
+    replay_path: str | None = None,
+    replay_timing: Literal["fast", "original"] = "fast",
+    replay_speed: float = 1.0,
+) -> httpx.AsyncBaseTransport | None:
+    """
+    Транспорт для клиента KitShop API
+
+    :param pool_size: Размер пула соединений
+    :param record_path: Файл, в который записывается обмен с KitShop
+    :param replay_path: Файл фикстур, которыми отвечать вместо KitShop
+    :param replay_timing: Режим задержки ответов при воспроизведении
+    :param replay_speed: Ускорение воспроизведения
+    :return: Транспорт или None - обычные HTTP соединения клиента
+    """
+    if replay_path:
+        return ReplayTransport(replay_path, timing=replay_timing, speed=replay_speed)
+
+    if record_path:
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        return RecordingTransport(record_path, httpx.AsyncHTTPTransport(limits=limits))
+
+    return None
+
+
+def get_scheduler(
+    enabled: bool,
+    sales_sync: SalesSync,
+    sale_details_sync: SaleDetailsSync,
+    customers_sync: CustomersSync,
+    sales_interval: float,
+    sale_details_interval: float,
+    customers_interval: float,
+    jitter: float,
+    timeout: float,
+    logger: Logger,
+) -> Scheduler:
+    """
+    Планировщик фоновых синхронизаций
+
+    :param enabled: Запускать ли синхронизации (False - планировщик без задач)
+    :param sales_interval: Интервал синхронизации продаж (секунды)
+    :param sale_details_interval: Интервал догрузки позиций продаж (секунды)
+    :param customers_interval: Интервал синхронизации покупателей (секунды)
+    :param jitter: Случайное отклонение интервалов, доля от интервала
+    :param timeout: Максимальная длительность одного прогона (секунды)
+    :return: Экземпляр :class:`Scheduler`
+    """
+    scheduler = Scheduler(logger=logger)
+    if not enabled:
+        return scheduler
+
+    scheduler.add("sales_sync", sales_sync.sync, sales_interval, jitter, timeout)
+    scheduler.add(
+        "sale_details_sync", sale_details_sync.sync, sale_details_interval, jitter, timeout
+    )
+    scheduler.add("customers_sync", customers_sync.sync, customers_interval, jitter, timeout)
+    return scheduler
 
 
 class RestDI(containers.DeclarativeContainer):
@@ -103,9 +299,34 @@ class RestDI(containers.DeclarativeContainer):
 
     common_di = providers.Container(CommonDI)
 
+    slow_query_log = providers.Singleton(
+        SlowQueryLog,
+        threshold=common_di.settings.provided().SLOW_QUERY_THRESHOLD,
+        explain_rate=common_di.settings.provided().SLOW_QUERY_EXPLAIN_RATE,
+        explain_interval=common_di.settings.provided().SLOW_QUERY_EXPLAIN_INTERVAL,
+        logger=common_di.logger,
+    )
+
     db_helper: DBHelper = providers.Resource(
         get_db_helper,  # type: ignore
         url=common_di.settings.provided().DB_URL,
+        pool_size=common_di.settings.provided().DB_POOL_SIZE,
+        max_overflow=common_di.settings.provided().DB_MAX_OVERFLOW,
+        pool_timeout=common_di.settings.provided().DB_POOL_TIMEOUT,
+        replica_url=common_di.settings.provided().DB_REPLICA_URL,
+        replica_max_lag=common_di.settings.provided().DB_REPLICA_MAX_LAG,
+        replica_check_interval=common_di.settings.provided().DB_REPLICA_CHECK_INTERVAL,
+        slow_query_log=slow_query_log,
+        logger=common_di.logger,
+    )
+
+    async_db_helper = providers.Singleton(
+        get_async_db_helper,
+        url=common_di.settings.provided().DB_URL,
+        pool_size=common_di.settings.provided().DB_POOL_SIZE,
+        max_overflow=common_di.settings.provided().DB_MAX_OVERFLOW,
+        pool_timeout=common_di.settings.provided().DB_POOL_TIMEOUT,
+        slow_query_log=slow_query_log,
     )
 
     api_access = providers.Resource(
@@ -115,11 +336,161 @@ class RestDI(containers.DeclarativeContainer):
         password=common_di.settings.provided().PASSWORD,
     )
 
+    kit_shop_rate_limiter = providers.Singleton(
+        AdaptiveRateLimiter,
+        rate=common_di.settings.provided().KIT_SHOP_RATE_LIMIT,
+        burst=common_di.settings.provided().KIT_SHOP_RATE_BURST,
+        min_concurrency=common_di.settings.provided().KIT_SHOP_MIN_CONCURRENCY,
+        max_concurrency=common_di.settings.provided().KIT_SHOP_MAX_CONCURRENCY,
+        logger=common_di.logger,
+    )
+
+    kit_shop_retry_policy = providers.Singleton(
+        RetryPolicy,
+        attempts=common_di.settings.provided().KIT_SHOP_RETRY_ATTEMPTS,
+        base_delay=common_di.settings.provided().KIT_SHOP_RETRY_BASE_DELAY,
+        max_delay=common_di.settings.provided().KIT_SHOP_RETRY_MAX_DELAY,
+    )
+
+    kit_shop_circuit_breaker = providers.Singleton(
+        CircuitBreaker,
+        name="kit_shop",
+        failure_threshold=common_di.settings.provided().KIT_SHOP_BREAKER_THRESHOLD,
+        recovery_timeout=common_di.settings.provided().KIT_SHOP_BREAKER_RECOVERY,
+        logger=common_di.logger,
+    )
+
+    kit_shop_single_flight = providers.Singleton(SingleFlight)
+
+    kit_shop_transport = providers.Singleton(
+        get_kit_shop_transport,
+        pool_size=common_di.settings.provided().KIT_SHOP_POOL_SIZE,
+        record_path=common_di.settings.provided().KIT_SHOP_RECORD_PATH,
+        replay_path=common_di.settings.provided().KIT_SHOP_REPLAY_PATH,
+        replay_timing=common_di.settings.provided().KIT_SHOP_REPLAY_TIMING,
+        replay_speed=common_di.settings.provided().KIT_SHOP_REPLAY_SPEED,
+    )
+
+    kit_shop_client = providers.Singleton(
+        KitShopClient,
+        pool_size=common_di.settings.provided().KIT_SHOP_POOL_SIZE,
+        timeout=common_di.settings.provided().KIT_SHOP_TIMEOUT,
+        rate_limiter=kit_shop_rate_limiter,
+        retry_policy=kit_shop_retry_policy,
+        circuit_breaker=kit_shop_circuit_breaker,
+        single_flight=kit_shop_single_flight,
+        transport=kit_shop_transport,
+        logger=common_di.logger,
+    )
+
+    cpu_pool = providers.Singleton(
+        CpuPool,
+        workers=common_di.settings.provided().CPU_POOL_WORKERS,
+        inline_threshold=common_di.settings.provided().CPU_POOL_INLINE_BYTES,
+        logger=common_di.logger,
+    )
+
+    customers_cache = providers.Singleton(
+        CustomersCache,
+        ttl=common_di.settings.provided().CUSTOMERS_CACHE_TTL,
+        max_size=common_di.settings.provided().CUSTOMERS_CACHE_MAX_SIZE,
+    )
+
+    sale_details_cache = providers.Singleton(
+        SaleDetailsCache,
+        db_helper=db_helper,
+        max_size=common_di.settings.provided().SALE_DETAILS_CACHE_SIZE,
+        ttl=common_di.settings.provided().SALE_DETAILS_CACHE_TTL,
+        logger=common_di.logger,
+    )
+
     kit_shop_manger = providers.Singleton(
         KitShopManager,
         db_helper=db_helper,
         logger=common_di.logger,
         api_access=api_access,
+        kit_shop_client=kit_shop_client,
+        details_concurrency=common_di.settings.provided().KIT_SHOP_DETAILS_CONCURRENCY,
+        customers_cache=customers_cache,
+        sale_details_cache=sale_details_cache,
+        base_url=common_di.settings.provided().KIT_SHOP_BASE_URL,
+        cpu_pool=cpu_pool,
+    )
+
+    bulk_writer = providers.Singleton(
+        BulkWriter,
+        db_helper=db_helper,
+        batch_size=common_di.settings.provided().BULK_WRITE_BATCH_SIZE,
+        logger=common_di.logger,
+    )
+
+    sales_sync = providers.Singleton(
+        SalesSync,
+        db_helper=db_helper,
+        kit_shop_manager=kit_shop_manger,
+        bulk_writer=bulk_writer,
+        overlap=providers.Factory(
+            timedelta,
+            minutes=common_di.settings.provided().SALES_SYNC_OVERLAP_MINUTES,
+        ),
+        initial_lookback=providers.Factory(
+            timedelta,
+            days=common_di.settings.provided().SALES_SYNC_INITIAL_DAYS,
+        ),
+        logger=common_di.logger,
+    )
+
+    sales_backfill = providers.Singleton(
+        SalesBackfill,
+        db_helper=db_helper,
+        kit_shop_manager=kit_shop_manger,
+        bulk_writer=bulk_writer,
+        window=providers.Factory(
+            timedelta,
+            hours=common_di.settings.provided().BACKFILL_WINDOW_HOURS,
+        ),
+        workers=common_di.settings.provided().BACKFILL_WORKERS,
+        logger=common_di.logger,
+    )
+
+    customers_sync = providers.Singleton(
+        CustomersSync,
+        db_helper=db_helper,
+        kit_shop_manager=kit_shop_manger,
+        bulk_writer=bulk_writer,
+        max_delete_share=common_di.settings.provided().CUSTOMERS_SYNC_MAX_DELETE_SHARE,
+        logger=common_di.logger,
+    )
+
+    sale_details_sync = providers.Singleton(
+        SaleDetailsSync,
+        db_helper=db_helper,
+        kit_shop_manager=kit_shop_manger,
+        bulk_writer=bulk_writer,
+        lookback=providers.Factory(
+            timedelta,
+            days=common_di.settings.provided().SALE_DETAILS_SYNC_DAYS,
+        ),
+        batch_size=common_di.settings.provided().SALE_DETAILS_SYNC_BATCH,
+        retry_delay=providers.Factory(
+            timedelta,
+            minutes=common_di.settings.provided().SALE_DETAILS_SYNC_RETRY_MINUTES,
+        ),
+        logger=common_di.logger,
+    )
+
+    scheduler = providers.Singleton(
+        get_scheduler,
+        enabled=common_di.settings.provided().SCHEDULER_ENABLED,
+        sales_sync=sales_sync,
+        sale_details_sync=sale_details_sync,
+        customers_sync=customers_sync,
+        sales_interval=common_di.settings.provided().SALES_SYNC_INTERVAL,
+        sale_details_interval=common_di.settings.provided().SALE_DETAILS_SYNC_INTERVAL,
+        customers_interval=common_di.settings.provided().CUSTOMERS_SYNC_INTERVAL,
+        jitter=common_di.settings.provided().SCHEDULER_JITTER,
+        timeout=common_di.settings.provided().SCHEDULER_JOB_TIMEOUT,
+        logger=common_di.logger,
     )
 
     auth_router = providers.Singleton(
@@ -128,13 +499,26 @@ class RestDI(containers.DeclarativeContainer):
         prefix="/auth",
         tags=["auth"],
         db_helper=db_helper,
+        async_db_helper=async_db_helper,
+    )
+
+    metrics_router = providers.Singleton(
+        MetricsRouter,
+        kit_shop_manger=kit_shop_manger,
+        tags=["metrics"],
+        db_helper=db_helper,
     )
 
     app = providers.Factory(
         init_rest_app,
         routers=[
             auth_router,
+            metrics_router,
         ],
         logger=common_di.logger,
         settings=common_di.settings,
+        kit_shop_client=kit_shop_client,
+        async_db_helper=async_db_helper,
+        scheduler=scheduler,
+        cpu_pool=cpu_pool,
     )
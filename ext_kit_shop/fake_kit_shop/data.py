@@ -0,0 +1,201 @@
+"""
+:mod:`data` -- Детерминированные тестовые данные для локальной замены KitShop API
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import random
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from ext_kit_shop.models.kit_shop import (
+    CustomerModel,
+    PositionModel,
+    SalesAboutModel,
+)
+
+__all__ = ("FakeKitShopData",)
+
+# Начало отсчета часов, из номера часа и порядкового номера продажи складывается SaleId
+EPOCH = datetime(2020, 1, 1)
+# Максимальное количество продаж за час и позиций в продаже
+MAX_SALES_PER_HOUR = 1000
+MAX_POSITIONS = 10
+# Доли покупателей с покупками, позиций со скидкой и по акции, фискализированных продаж
+LAST_PURCHASE_SHARE = 0.9
+DISCOUNT_SHARE = 0.15
+DISCOUNT = 0.9
+PROMOTION_SHARE = 0.05
+FISCAL_SHARE = 0.98
+
+# Доля продаж по часам суток (магазины работают днем)
+HOURLY_PROFILE = (
+    0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.2, 0.6, 1.0, 1.2, 1.3,
+    1.5, 1.5, 1.3, 1.2, 1.3, 1.6, 1.9, 2.0, 1.6, 1.0, 0.4, 0.0,
+)  # fmt: skip
+
+
+class FakeKitShopData:
+    """
+    Генератор продаж, позиций и покупателей
+
+    Данные не хранятся, а вычисляются по `seed`: продажи каждого часа генерируются отдельным
+    генератором случайных чисел, инициализированным номером часа. Поэтому любой период можно
+    запросить без предварительной генерации, а одинаковые запросы всегда возвращают одно и то же.
+    `SaleId` кодирует час и номер продажи в нем, что позволяет найти продажу по идентификатору.
+    """
+
+    def __init__(
+        self,
+        seed: int = 0,
+        company_id: int = 1,
+        shops: int = 5,
+        devices_per_shop: int = 2,
+        products: int = 500,
+        customers: int = 1000,
+        sales_per_hour: int = 60,
+        customer_share: float = 0.3,
+    ) -> None:
+        """
+        :param seed: Зерно генератора
+        :param company_id: Идентификатор компании
+        :param shops: Количество магазинов
+        :param devices_per_shop: Количество касс в магазине
+        :param products: Количество товаров в каталоге
+        :param customers: Количество покупателей
+        :param sales_per_hour: Среднее количество продаж в час
+        :param customer_share: Доля продаж с покупателем
+        """
+        self.seed = seed
+        self.company_id = company_id
+        self.shops = shops
+        self.devices_per_shop = devices_per_shop
+        self.products = products
+        self.customers = customers
+        self.sales_per_hour = min(sales_per_hour, MAX_SALES_PER_HOUR // 2)
+        self.customer_share = customer_share
+        self._prices = [
+            round(random.Random(f"{seed}:product:{product}").uniform(30, 3000), 2)
+            for product in range(products + 1)
+        ]
+        self._hour = lru_cache(maxsize=1024)(self._generate_hour)
+
+    def sales(self, up_date: datetime, to_date: datetime, now: datetime) -> list[SalesAboutModel]:
+        """
+        Продажи, поступившие на сервер в период `[up_date, to_date]`
+
+        :param up_date: Начало периода (включительно)
+        :param to_date: Конец периода (включительно)
+        :param now: Текущее время: продажи из будущего не возвращаются
+        :return: Продажи с позициями в порядке поступления
+        """
+        to_date = min(to_date, now)
+        # Время поступления на сервер отстает от времени продажи не более чем на минуту
+        hour = self._hour_number(up_date - timedelta(minutes=1))
+        last_hour = self._hour_number(to_date)
+
+        result: list[SalesAboutModel] = []
+        while hour <= last_hour:
+            result.extend(
+                sale
+                for sale in self._hour(hour)
+                if up_date <= self._server_date_time(sale) <= to_date
+            )
+            hour += 1
+        return result
+
+    def sale(self, sale_id: int, now: datetime) -> SalesAboutModel | None:
+        """
+        Продажа по идентификатору
+
+        :param sale_id: Идентификатор продажи
+        :param now: Текущее время
+        :return: Продажа или None, если ее нет
+        """
+        hour, number = divmod(sale_id, MAX_SALES_PER_HOUR)
+        sales = self._hour(hour) if hour >= 0 else []
+        if number >= len(sales) or self._server_date_time(sales[number]) > now:
+            return None
+        return sales[number]
+
+    def customers_list(self) -> list[CustomerModel]:
+        """Список покупателей"""
+        rng = random.Random(f"{self.seed}:customers")
+        return [
+            CustomerModel(
+                Balance=round(rng.uniform(0, 5000), 2),
+                CardNumber=f"{2700000000000 + customer_id * 7919:013d}",
+                CustomerId=customer_id,
+                CustomerName=f"Покупатель {customer_id}",
+                LastPurchase=(
+                    EPOCH + timedelta(minutes=rng.randint(0, 3_000_000))
+                    if rng.random() < LAST_PURCHASE_SHARE
+                    else None
+                ),
+                LoyaltyId=rng.choice((None, 1, 2, 3)),
+                Purchases=rng.randint(0, 300),
+            )
+            for customer_id in range(1, self.customers + 1)
+        ]
+
+    @staticmethod
+    def _hour_number(moment: datetime) -> int:
+        return int((moment - EPOCH).total_seconds() // 3600)
+
+    @staticmethod
+    def _server_date_time(sale: SalesAboutModel) -> datetime:
+        return sale.ServerDateTime or sale.SaleDateTime
+
+    def _generate_hour(self, hour: int) -> list[SalesAboutModel]:
+        rng = random.Random(f"{self.seed}:hour:{hour}")
+        start = EPOCH + timedelta(hours=hour)
+        expected = self.sales_per_hour * HOURLY_PROFILE[start.hour]
+        count = min(MAX_SALES_PER_HOUR - 1, round(rng.uniform(0, 2 * expected)))
+        offsets = sorted(rng.randrange(3600) for _ in range(count))
+
+        sales = []
+        for number, offset in enumerate(offsets):
+            sale_id = hour * MAX_SALES_PER_HOUR + number
+            sale_date_time = start + timedelta(seconds=offset)
+            server_date_time = sale_date_time + timedelta(seconds=rng.randint(0, 59))
+            shop_id = rng.randint(1, self.shops)
+
+            positions = []
+            for index in range(rng.randint(1, MAX_POSITIONS - 1)):
+                product_id = rng.randint(1, self.products)
+                nominal_price = self._prices[product_id]
+                has_discount = rng.random() < DISCOUNT_SHARE
+                positions.append(
+                    PositionModel(
+                        HasDiscount=has_discount,
+                        HasPromotion=rng.random() < PROMOTION_SHARE,
+                        NominalPrice=nominal_price,
+                        PositionId=sale_id * MAX_POSITIONS + index,
+                        Price=round(nominal_price * (DISCOUNT if has_discount else 1), 2),
+                        ProductId=product_id,
+                        Quantity=float(rng.choice((1, 1, 1, 2, 3))),
+                        SaleId=sale_id,
+                    )
+                )
+
+            sales.append(
+                SalesAboutModel(
+                    SaleId=sale_id,
+                    CompanyId=self.company_id,
+                    ShopId=shop_id,
+                    DeviceId=shop_id * 100 + rng.randint(1, self.devices_per_shop),
+                    SaleDateTime=sale_date_time,
+                    ServerDateTime=server_date_time,
+                    Sum=round(sum(position.Price * position.Quantity for position in positions), 2),
+                    PayType=rng.choice((0, 1, 1)),
+                    IsFiscal=rng.random() < FISCAL_SHARE,
+                    PayDetails="",
+                    Positions=positions,
+                    CustomerId=(
+                        rng.randint(1, self.customers)
+                        if self.customers and rng.random() < self.customer_share
+                        else None
+                    ),
+                )
+            )
+        return sales
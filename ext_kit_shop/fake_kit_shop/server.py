@@ -0,0 +1,313 @@
+"""
+:mod:`server` -- Локальная замена KitShop API для нагрузочного тестирования
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+Запуск::
+
+    export FAKE_KIT_SHOP_SEED=1 FAKE_KIT_SHOP_LATENCY=0.05
+    uvicorn --factory ext_kit_shop.fake_kit_shop.server:create_app --port 8090
+
+и `KIT_SHOP_BASE_URL=http://127.0.0.1:8090/APIService.svc` у приложения.
+Без сети приложение подключается через :class:`httpx.ASGITransport`, см. параметр
+`transport` у :class:`~ext_kit_shop.utils.kit_shop_client.KitShopClient`.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, FastAPI, Request, Response
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from ext_kit_shop.fake_kit_shop.data import FakeKitShopData
+from ext_kit_shop.models.kit_shop import parse_kit_shop_datetime
+from ext_kit_shop.utils.kit_shop_manager import ApiAccess
+
+__all__ = (
+    "FakeKitShopFaults",
+    "FakeKitShopServer",
+    "FakeKitShopSettings",
+    "create_app",
+)
+
+# ResultCode ответов с ошибкой
+RESULT_AUTH_ERROR = 1
+RESULT_REQUEST_ERROR = 2
+RESULT_INJECTED_ERROR = 100
+
+
+class FakeKitShopFaults(BaseModel):
+    """Внедряемые задержки и ошибки"""
+
+    # Задержка ответа и ее случайный разброс (секунды)
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    # Доля ответов HTTP 500 и ответов с ненулевым ResultCode
+    error_rate: float = 0.0
+    result_error_rate: float = 0.0
+    # Ограничение частоты запросов (в секунду, 0 - без ограничения), сверх него - HTTP 429
+    rate_limit: float = 0.0
+    # Ограничение одновременных запросов (0 - без ограничения), сверх него - HTTP 503
+    max_concurrency: int = 0
+
+
+class FakeKitShopSettings(BaseSettings):
+    """Настройки локальной замены KitShop API (переменные окружения `FAKE_KIT_SHOP_*`)"""
+
+    SEED: int = 0
+    COMPANY_ID: int = 1
+    USER_LOGIN: str = "fake"
+    PASSWORD: str = "fake"
+    SHOPS: int = 5
+    PRODUCTS: int = 500
+    CUSTOMERS: int = 1000
+    SALES_PER_HOUR: int = 60
+
+    LATENCY: float = 0.0
+    LATENCY_JITTER: float = 0.0
+    ERROR_RATE: float = 0.0
+    RESULT_ERROR_RATE: float = 0.0
+    RATE_LIMIT: float = 0.0
+    MAX_CONCURRENCY: int = 0
+
+    model_config = SettingsConfigDict(env_prefix="FAKE_KIT_SHOP_", extra="ignore")
+
+
+class FakeKitShopServer:
+    """
+    Локальная замена методов `APIService.svc` KitShop API
+
+    Реализует `GetSales`, `GetSaleById` и `GetCustomers` поверх :class:`FakeKitShopData`,
+    проверяет подпись `Sign` так же, как ее формирует :meth:`ApiAccess.generate_sign`, и по
+    настройкам :class:`FakeKitShopFaults` добавляет задержки, ошибки и ограничения частоты.
+    Настройки ошибок меняются на лету через `PUT /_fake/faults`.
+    """
+
+    def __init__(
+        self,
+        data: FakeKitShopData,
+        api_access: ApiAccess,
+        faults: FakeKitShopFaults | None = None,
+        clock: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        """
+        :param data: Генератор данных
+        :param api_access: Доступы, с которыми должны приходить запросы
+        :param faults: Внедряемые задержки и ошибки
+        :param clock: Источник текущего времени для отбора продаж
+        """
+        self.data = data
+        self.api_access = api_access
+        self.faults = faults or FakeKitShopFaults()
+        self._clock = clock
+        self._rng = random.Random(data.seed)
+        self._customers: bytes | None = None
+        self._in_flight = 0
+        self._tokens = self.faults.rate_limit
+        self._refilled_at = time.monotonic()
+
+        self.requests = 0
+        self.rejected = 0
+
+    @property
+    def router(self) -> APIRouter:
+        """Роутер с методами API"""
+        router = APIRouter()
+        router.add_api_route("/APIService.svc/GetSales", self.get_sales, methods=["POST"])
+        router.add_api_route("/APIService.svc/GetSaleById", self.get_sale_by_id, methods=["POST"])
+        router.add_api_route("/APIService.svc/GetCustomers", self.get_customers, methods=["POST"])
+        router.add_api_route("/_fake/faults", self.get_faults, methods=["GET"])
+        router.add_api_route("/_fake/faults", self.set_faults, methods=["PUT"])
+        router.add_api_route("/_fake/stats", self.get_stats, methods=["GET"])
+        return router
+
+    def create_app(self) -> FastAPI:
+        """Приложение FastAPI с методами API"""
+        app = FastAPI(title="Fake KitShop API")
+        app.include_router(self.router)
+        return app
+
+    async def get_sales(self, request: Request) -> Response:
+        """`GetSales`: продажи за период `Filter.UpDate` - `Filter.ToDate`"""
+
+        def handle(body: dict[str, Any]) -> dict[str, Any]:
+            date_filter = body.get("Filter") or {}
+            up_date = parse_kit_shop_datetime(date_filter["UpDate"])
+            to_date = parse_kit_shop_datetime(date_filter["ToDate"])
+            sales = self.data.sales(up_date, to_date, self._clock())
+            return {
+                "ResultCode": 0,
+                "Sales": [sale.model_dump(mode="json", exclude={"Positions"}) for sale in sales],
+            }
+
+        return await self._handle(request, handle)
+
+    async def get_sale_by_id(self, request: Request) -> Response:
+        """`GetSaleById`: продажа с позициями"""
+
+        def handle(body: dict[str, Any]) -> dict[str, Any]:
+            sale = self.data.sale(int(body["Id"]), self._clock())
+            return {"ResultCode": 0, "Sales": [sale.model_dump(mode="json")] if sale else []}
+
+        return await self._handle(request, handle)
+
+    async def get_customers(self, request: Request) -> Response:
+        """`GetCustomers`: список покупателей"""
+        return await self._handle(request, None)
+
+    async def get_faults(self) -> FakeKitShopFaults:
+        """Текущие настройки ошибок"""
+        return self.faults
+
+    async def set_faults(self, faults: FakeKitShopFaults) -> FakeKitShopFaults:
+        """Изменить настройки ошибок"""
+        self.faults = faults
+        return self.faults
+
+    async def get_stats(self) -> dict[str, int]:
+        """Счетчики запросов"""
+        return {"requests": self.requests, "rejected": self.rejected, "in_flight": self._in_flight}
+
+    async def _handle(
+        self,
+        request: Request,
+        handle: Callable[[dict[str, Any]], dict[str, Any]] | None,
+    ) -> Response:
+        """
+        Общая обработка запроса: ограничения, задержка, внедренные ошибки и проверка подписи
+
+        :param handle: Формирование ответа по телу запроса, None - список покупателей
+        """
+        self.requests += 1
+        faults = self.faults
+
+        rejection = self._admit(faults)
+        if rejection is not None:
+            self.rejected += 1
+            return rejection
+
+        self._in_flight += 1
+        try:
+            delay = faults.latency + self._rng.uniform(0, faults.latency_jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            return self._injected_error(faults) or self._respond(await request.body(), handle)
+        finally:
+            self._in_flight -= 1
+
+    def _admit(self, faults: FakeKitShopFaults) -> Response | None:
+        """Отказ по ограничению частоты или количества одновременных запросов"""
+        if not self._take_token(faults):
+            return Response(status_code=429)
+        if faults.max_concurrency and self._in_flight >= faults.max_concurrency:
+            return Response(status_code=503)
+        return None
+
+    def _injected_error(self, faults: FakeKitShopFaults) -> Response | None:
+        if self._rng.random() < faults.error_rate:
+            return Response(status_code=500)
+        if self._rng.random() < faults.result_error_rate:
+            return self._json({"ResultCode": RESULT_INJECTED_ERROR})
+        return None
+
+    def _respond(
+        self,
+        content: bytes,
+        handle: Callable[[dict[str, Any]], dict[str, Any]] | None,
+    ) -> Response:
+        try:
+            body = json.loads(content)
+        except ValueError:
+            return self._json({"ResultCode": RESULT_REQUEST_ERROR})
+        if not isinstance(body, dict) or not self._check_auth(body.get("Auth")):
+            return self._json({"ResultCode": RESULT_AUTH_ERROR})
+
+        if handle is None:
+            return Response(content=self._customers_content(), media_type="application/json")
+        try:
+            return self._json(handle(body))
+        except (KeyError, TypeError, ValueError):
+            return self._json({"ResultCode": RESULT_REQUEST_ERROR})
+
+    def _check_auth(self, auth: Any) -> bool:
+        if not isinstance(auth, dict):
+            return False
+        return (
+            auth.get("CompanyId") == self.api_access.company_id
+            and auth.get("UserLogin") == self.api_access.user_login
+            and auth.get("Sign") == self.api_access.generate_sign(str(auth.get("RequestId")))
+        )
+
+    def _take_token(self, faults: FakeKitShopFaults) -> bool:
+        if not faults.rate_limit:
+            return True
+
+        now = time.monotonic()
+        self._tokens = min(
+            faults.rate_limit,
+            self._tokens + (now - self._refilled_at) * faults.rate_limit,
+        )
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def _customers_content(self) -> bytes:
+        if self._customers is None:
+            customers = [
+                customer.model_dump(mode="json") for customer in self.data.customers_list()
+            ]
+            self._customers = json.dumps(
+                {"ResultCode": 0, "Customers": customers}, ensure_ascii=False
+            ).encode()
+        return self._customers
+
+    @staticmethod
+    def _json(body: dict[str, Any]) -> Response:
+        return Response(
+            content=json.dumps(body, ensure_ascii=False),
+            media_type="application/json",
+        )
+
+
+def create_app(settings: FakeKitShopSettings | None = None) -> FastAPI:
+    """
+    Создать приложение по настройкам из окружения
+
+    :param settings: Настройки, по умолчанию читаются из переменных `FAKE_KIT_SHOP_*`
+    :return: Приложение FastAPI
+    """
+    settings = settings or FakeKitShopSettings()
+    server = FakeKitShopServer(
+        data=FakeKitShopData(
+            seed=settings.SEED,
+            company_id=settings.COMPANY_ID,
+            shops=settings.SHOPS,
+            products=settings.PRODUCTS,
+            customers=settings.CUSTOMERS,
+            sales_per_hour=settings.SALES_PER_HOUR,
+        ),
+        api_access=ApiAccess(
+            company_id=settings.COMPANY_ID,
+            user_login=settings.USER_LOGIN,
+            password=settings.PASSWORD,
+        ),
+        faults=FakeKitShopFaults(
+            latency=settings.LATENCY,
+            latency_jitter=settings.LATENCY_JITTER,
+            error_rate=settings.ERROR_RATE,
+            result_error_rate=settings.RESULT_ERROR_RATE,
+            rate_limit=settings.RATE_LIMIT,
+            max_concurrency=settings.MAX_CONCURRENCY,
+        ),
+    )
+    return server.create_app()
@@ -7,9 +7,27 @@
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import BigInteger, Boolean, DateTime, Float, Integer, String
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 
+from ext_kit_shop.models.kit_shop import (
+    CustomerModel,
+    PositionModel,
+    SaleModel,
+    SalesAboutModel,
+)
 from ext_kit_shop.utils.jwt_helper import JWTHelper
 
 
@@ -62,6 +80,36 @@ class Sale(Base):
     """Модель для хранения данных о продаже"""
 
     __tablename__ = "sales"
+    # Отчеты по периоду в разрезе компании, магазина, кассы и покупателя. Создаются миграцией
+    # CONCURRENTLY, без блокировки записи в таблицу
+    __table_args__ = (
+        Index(
+            "ix_sales_company_id_sale_date_time",
+            "company_id",
+            "sale_date_time",
+            postgresql_include=["shop_id", "sum"],
+        ),
+        Index(
+            "ix_sales_shop_id_sale_date_time",
+            "shop_id",
+            "sale_date_time",
+            postgresql_include=["sum"],
+        ),
+        Index("ix_sales_device_id_sale_date_time", "device_id", "sale_date_time"),
+        Index(
+            "ix_sales_customer_id_sale_date_time",
+            "customer_id",
+            "sale_date_time",
+            postgresql_where=text("customer_id IS NOT NULL"),
+        ),
+        # server_date_time растет вместе с физическим порядком строк: BRIN в сотни раз меньше
+        # B-tree и достаточен для выборок по диапазону
+        Index(
+            "ix_sales_server_date_time_brin",
+            "server_date_time",
+            postgresql_using="brin",
+        ),
+    )
 
     sale_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
     device_id: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -74,3 +122,178 @@ class Sale(Base):
     pay_details: Mapped[str] = mapped_column(String, nullable=True)
     is_fiscal: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     customer_id: Mapped[int] = mapped_column(Integer, nullable=True)
+
+    @staticmethod
+    def values_from_model(sale: SaleModel) -> dict[str, Any]:
+        """
+        Значения колонок таблицы для продажи из KitShop API
+
+        :param sale: Продажа
+        :return: Словарь вида {колонка: значение}
+        """
+        return {
+            "sale_id": sale.SaleId,
+            "device_id": sale.DeviceId,
+            "shop_id": sale.ShopId,
+            "company_id": sale.CompanyId,
+            "sum": sale.Sum,
+            "sale_date_time": sale.SaleDateTime,
+            "server_date_time": sale.ServerDateTime,
+            "pay_type": sale.PayType,
+            "pay_details": sale.PayDetails,
+            "is_fiscal": sale.IsFiscal,
+            "customer_id": sale.CustomerId,
+        }
+
+
+class SalePosition(Base):
+    """Позиция продажи"""
+
+    __tablename__ = "sale_positions"
+    __table_args__ = (Index("ix_sale_positions_product_id_sale_id", "product_id", "sale_id"),)
+
+    position_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    sale_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("sales.sale_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    product_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    quantity: Mapped[float] = mapped_column(Float, nullable=False)
+    price: Mapped[float] = mapped_column(Float, nullable=False)
+    nominal_price: Mapped[float] = mapped_column(Float, nullable=False)
+    has_discount: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    has_promotion: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+
+    @staticmethod
+    def values_from_model(position: PositionModel) -> dict[str, Any]:
+        """
+        Значения колонок таблицы для позиции из KitShop API
+
+        :param position: Позиция продажи
+        :return: Словарь вида {колонка: значение}
+        """
+        return {
+            "position_id": position.PositionId,
+            "sale_id": position.SaleId,
+            "product_id": position.ProductId,
+            "quantity": position.Quantity,
+            "price": position.Price,
+            "nominal_price": position.NominalPrice,
+            "has_discount": position.HasDiscount,
+            "has_promotion": position.HasPromotion,
+        }
+
+
+class SaleDetail(Base):
+    """Ответ `GetSaleById`, сохраненный как кэш подробностей продажи"""
+
+    __tablename__ = "sale_details"
+
+    sale_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    is_fiscal: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    @staticmethod
+    def values_from_model(sale: SalesAboutModel, fetched_at: datetime) -> dict[str, Any]:
+        """
+        Значения колонок таблицы для подробностей продажи из KitShop API
+
+        :param sale: Подробности продажи
+        :param fetched_at: Время получения ответа
+        :return: Словарь вида {колонка: значение}
+        """
+        return {
+            "sale_id": sale.SaleId,
+            "is_fiscal": bool(sale.IsFiscal),
+            "payload": sale.model_dump(mode="json"),
+            "fetched_at": fetched_at,
+        }
+
+    def to_model(self) -> SalesAboutModel:
+        """Подробности продажи в формате KitShop API"""
+        return SalesAboutModel.model_validate(self.payload)
+
+
+class SaleDetailFailure(Base):
+    """Неудачная попытка получить подробности продажи и время следующей попытки"""
+
+    __tablename__ = "sale_detail_failures"
+
+    sale_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_error: Mapped[str] = mapped_column(String, nullable=False)
+    retry_after: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class SalesSyncState(Base):
+    """Отметка последней синхронизированной продажи компании (high-water mark)"""
+
+    __tablename__ = "sales_sync_state"
+
+    company_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    last_server_date_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_sale_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class SalesBackfillWindow(Base):
+    """Завершенное окно загрузки истории продаж"""
+
+    __tablename__ = "sales_backfill_windows"
+    __table_args__ = (UniqueConstraint("company_id", "window_start", "window_end"),)
+
+    company_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    window_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    window_end: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class Customer(Base):
+    """Локальная копия покупателя KitShop"""
+
+    __tablename__ = "customers"
+
+    customer_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)
+    company_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    card_number: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    customer_name: Mapped[str] = mapped_column(String, nullable=False)
+    balance: Mapped[float] = mapped_column(Float, nullable=False)
+    purchases: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_purchase: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    loyalty_id: Mapped[int] = mapped_column(Integer, nullable=True)
+
+    @staticmethod
+    def values_from_model(customer: CustomerModel, company_id: int) -> dict[str, Any]:
+        """
+        Значения колонок таблицы для покупателя из KitShop API
+
+        :param customer: Покупатель
+        :param company_id: Компания, которой принадлежит покупатель
+        :return: Словарь вида {колонка: значение}
+        """
+        return {
+            "customer_id": customer.CustomerId,
+            "company_id": company_id,
+            "card_number": customer.CardNumber,
+            "customer_name": customer.CustomerName,
+            "balance": customer.Balance,
+            "purchases": customer.Purchases,
+            "last_purchase": customer.LastPurchase,
+            "loyalty_id": customer.LoyaltyId,
+        }
+
+    def to_model(self) -> CustomerModel:
+        """Покупатель в формате KitShop API"""
+        return CustomerModel(
+            Balance=self.balance,
+            CardNumber=self.card_number,
+            CustomerId=self.customer_id,
+            CustomerName=self.customer_name,
+            LastPurchase=self.last_purchase,
+            LoyaltyId=self.loyalty_id,
+            Purchases=self.purchases,
+        )
@@ -1,4 +1,71 @@
-from pydantic import BaseModel
+from datetime import datetime
+from functools import lru_cache
+from typing import Annotated, Any
+
+from pydantic import BaseModel, BeforeValidator, PlainSerializer
+
+# Формат дат в ответах KitShop API
+KIT_SHOP_DATETIME_FORMAT = "%d.%m.%Y %H:%M:%S"
+# Длина даты в формате KitShop API и разделители на позициях 2, 5, 10, 13 и 16
+_DATETIME_LENGTH = 19
+_DATETIME_SEPARATORS = (".", ".", " ", ":", ":")
+
+
+@lru_cache(maxsize=4096)
+def parse_kit_shop_datetime(value: str) -> datetime:
+    """
+    Разбор даты KitShop API ("дд.мм.гггг чч:мм:сс")
+
+    Строка переставляется в ISO 8601 и разбирается :meth:`datetime.fromisoformat`, что в
+    несколько раз быстрее :meth:`datetime.strptime`. Даты в одном ответе часто повторяются,
+    поэтому результаты кэшируются. Строка другого вида разбирается :meth:`datetime.strptime`.
+
+    :param value: Дата в формате KitShop API
+    :raises ValueError: Если строка не является датой в формате KitShop API
+    :return: Дата без часового пояса
+    """
+    if (
+        len(value) != _DATETIME_LENGTH
+        or (value[2], value[5], value[10], value[13], value[16]) != _DATETIME_SEPARATORS
+    ):
+        return datetime.strptime(value, KIT_SHOP_DATETIME_FORMAT)
+
+    return datetime.fromisoformat(f"{value[6:10]}-{value[3:5]}-{value[0:2]}T{value[11:]}")
+
+
+def format_kit_shop_datetime(value: datetime | None) -> str:
+    """
+    Дата в формате KitShop API ("дд.мм.гггг чч:мм:сс")
+
+    :param value: Дата, None - пустая строка
+    :return: Строка с датой
+    """
+    if value is None:
+        return ""
+    return (
+        f"{value.day:02d}.{value.month:02d}.{value.year:04d} "
+        f"{value.hour:02d}:{value.minute:02d}:{value.second:02d}"
+    )
+
+
+def _validate_kit_shop_datetime(value: Any) -> Any:
+    if isinstance(value, str):
+        return parse_kit_shop_datetime(value) if value else None
+    return value
+
+
+# Дата KitShop API: при валидации строки разбираются :func:`parse_kit_shop_datetime` (пустая
+# строка - None), в JSON дата выводится в том же формате, в каком ее отдает KitShop
+KitShopDateTime = Annotated[
+    datetime,
+    BeforeValidator(_validate_kit_shop_datetime),
+    PlainSerializer(format_kit_shop_datetime, return_type=str, when_used="json"),
+]
+OptionalKitShopDateTime = Annotated[
+    datetime | None,
+    BeforeValidator(_validate_kit_shop_datetime),
+    PlainSerializer(format_kit_shop_datetime, return_type=str, when_used="json"),
+]
 
 
 class SaleModel(BaseModel):
@@ -9,8 +76,8 @@ class SaleModel(BaseModel):
     ShopId: int
     CompanyId: int
     Sum: float
-    SaleDateTime: str
-    ServerDateTime: str
+    SaleDateTime: KitShopDateTime
+    ServerDateTime: KitShopDateTime
     PayType: int
     PayDetails: str | None = ""
     IsFiscal: bool
@@ -37,8 +104,8 @@ class SalesAboutModel(BaseModel):
     CompanyId: int
     ShopId: int
     DeviceId: int
-    SaleDateTime: str
-    ServerDateTime: str | None = None
+    SaleDateTime: KitShopDateTime
+    ServerDateTime: OptionalKitShopDateTime = None
     Sum: float | None = None
     PayType: int | None = None
     IsFiscal: bool | None = None
@@ -51,6 +118,7 @@ class SalesModelFull(SaleModel):
     """Полный отчет о продаже"""
 
     about: SalesAboutModel | None = None
+    about_error: str | None = None
 
 
 class CustomerModel(BaseModel):
@@ -60,6 +128,30 @@ class CustomerModel(BaseModel):
     CardNumber: str
     CustomerId: int
     CustomerName: str
-    LastPurchase: str
+    LastPurchase: OptionalKitShopDateTime = None
     LoyaltyId: int | None = None
     Purchases: int
+
+
+class KitShopEnvelope(BaseModel):
+    """Общая часть ответа KitShop API"""
+
+    ResultCode: Any = None
+
+
+class SalesEnvelope(KitShopEnvelope):
+    """Ответ `GetSales`"""
+
+    Sales: list[SaleModel] | None = None
+
+
+class SaleAboutEnvelope(KitShopEnvelope):
+    """Ответ `GetSaleById`"""
+
+    Sales: list[SalesAboutModel] | None = None
+
+
+class CustomersEnvelope(KitShopEnvelope):
+    """Ответ `GetCustomers`"""
+
+    Customers: list[CustomerModel] | None = None
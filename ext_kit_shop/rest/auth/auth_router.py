@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 from typing import Any
 
 from pydantic import BaseModel
+from sqlalchemy import select
 
 from ext_kit_shop.models.db import User
 from ext_kit_shop.models.request import BadResponse, GoodResponse
@@ -40,7 +41,7 @@ class AuthRouter(RoutsCommon):
         self._router.add_api_route("/test-ks-manager", self.test_ks_manager, methods=["GET"])
 
     async def regist(self, request: UserCreateRequest) -> GoodResponse:
-        with self.db_helper.sessionmanager() as session:
+        async with self.async_db_helper.sessionmanager() as session:
             user = User(
                 login=request.login,
                 password=request.password,
@@ -49,7 +50,6 @@ class AuthRouter(RoutsCommon):
                 api_access_id=request.api_access_id,
             )
             session.add(user)
-            session.commit()
         return GoodResponse(message="User created successfully")
 
     # Роут для авторизации пользователя
@@ -58,16 +58,14 @@ class AuthRouter(RoutsCommon):
         username: str,
         password: str,
     ) -> GoodResponse | BadResponse:
-        with self.db_helper.sessionmanager() as session:
-            user = (
-                session.query(User)
-                .filter(User.login == username, User.password == password)
-                .first()
+        async with self.async_db_helper.sessionmanager() as session:
+            user = await session.scalar(
+                select(User).where(User.login == username, User.password == password).limit(1)
             )
             if not user:
                 return BadResponse(message="Invalid credentials")
 
-            token = user.create_token(session)
+            token = await session.run_sync(user.create_token)
         return GoodResponse(message=f"Login successful. Token: {token}")
 
     async def test_ks_manager(self) -> Any:
@@ -80,5 +78,5 @@ class AuthRouter(RoutsCommon):
 
         # return self.kit_shop_manger._get_sales_ks(up_date_str, to_date_str)
         # return self.kit_shop_manger._get_sales_about_ks(18390354)
-        # return self.kit_shop_manger.get_sales_by_period(up_date_str, to_date_str)
-        return self.kit_shop_manger.get_users_info()
+        # return await self.kit_shop_manger.get_sales_by_period(up_date_str, to_date_str)
+        return await self.kit_shop_manger.aget_users_info()
@@ -13,7 +13,7 @@ from typing import Any
 from fastapi import APIRouter
 
 from ext_kit_shop.models.request import BadResponse, GoodResponse
-from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.db_helper import AsyncDBHelper, DBHelper, EngineNotInitializedError
 from ext_kit_shop.utils.kit_shop_manager import KitShopManager
 
 
@@ -27,15 +27,29 @@ class RoutsCommon(ABC):
         prefix: str = "",
         tags: list[str | Enum] | None = None,
         logger: Logger | None = None,
+        async_db_helper: AsyncDBHelper | None = None,
     ):
         """
         :param prefix: Префикс для всех маршрутов в этом роутере.
         :param tags: Теги, используемые для группировки маршрутов в документации.
+        :param async_db_helper: Асинхронный хелпер БД для маршрутов, не блокирующих event loop.
         """
         self._router = APIRouter(prefix=prefix, tags=tags)
         self.logger = logger or getLogger(__name__)
         self.db_helper = db_helper
         self.kit_shop_manger = kit_shop_manger
+        self._async_db_helper = async_db_helper
+
+    @property
+    def async_db_helper(self) -> AsyncDBHelper:
+        """
+        Асинхронный хелпер БД
+
+        :raises EngineNotInitializedError: Если роутер создан без асинхронного хелпера
+        """
+        if self._async_db_helper is None:
+            raise EngineNotInitializedError(f"{type(self).__name__}: не передан async_db_helper")
+        return self._async_db_helper
 
     def add_route(self, path: str, endpoint: Callable[..., Any], method: str = "GET") -> None:
         """
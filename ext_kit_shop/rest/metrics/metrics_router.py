@@ -0,0 +1,30 @@
+"""
+:mod:`MetricsRouter` -- Роутер для метрик Prometheus
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from ext_kit_shop.rest.common import RoutsCommon
+
+__all__ = ("MetricsRouter",)
+
+
+class MetricsRouter(RoutsCommon):
+    """Роутер для метрик Prometheus"""
+
+    def setup_routes(self) -> None:
+        """Функция назначения routs"""
+        self._router.add_api_route(
+            "/metrics",
+            self.metrics,
+            methods=["GET"],
+            include_in_schema=False,
+        )
+
+    @staticmethod
+    async def metrics() -> Response:
+        """Метрики приложения в текстовом формате Prometheus"""
+        return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
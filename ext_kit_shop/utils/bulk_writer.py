@@ -0,0 +1,409 @@
+"""
+:mod:`bulk_writer` -- Пакетная запись больших объемов данных в БД
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncIterable, Iterable, Sequence
+from datetime import datetime
+from itertools import batched
+from logging import Logger, getLogger
+from typing import Any, cast
+from uuid import uuid4
+
+from pydantic import BaseModel
+from sqlalchemy import Table, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import CursorResult
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import ReturningInsert
+
+from ext_kit_shop.models.db import Base, Sale, SalePosition
+from ext_kit_shop.models.kit_shop import SaleModel, SalesAboutModel, SalesModelFull
+from ext_kit_shop.utils.db_helper import DBHelper
+
+__all__ = (
+    "BulkWriteStats",
+    "BulkWriter",
+)
+
+# Колонки `sales`, загружаемые через COPY (без суррогатного ключа)
+SALE_COLUMNS: tuple[str, ...] = tuple(
+    column.name for column in cast(Table, Sale.__table__).columns if column.name != "id"
+)
+
+
+class BulkWriteStats(BaseModel):
+    """Статистика пакетной записи"""
+
+    table: str
+    rows: int = 0
+    written: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        """Пропускная способность (строк в секунду)"""
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class _CopyStream:
+    """
+    Файлоподобный объект для `COPY ... FROM STDIN`
+
+    Формирует строки в текстовом формате COPY по мере чтения, поэтому весь набор данных
+    не держится в памяти целиком.
+    """
+
+    def __init__(self, rows: Iterable[dict[str, Any]], columns: Sequence[str]) -> None:
+        self._lines = (self._format_row(row, columns) for row in rows)
+        self._buffer = ""
+        self.rows = 0
+
+    @staticmethod
+    def _format_value(value: Any) -> str:
+        if value is None:
+            return "\\N"
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return (
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+
+    def _format_row(self, row: dict[str, Any], columns: Sequence[str]) -> str:
+        self.rows += 1
+        return "\t".join(self._format_value(row[column]) for column in columns) + "\n"
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+class BulkWriter:
+    """
+    Пакетная запись строк в БД
+
+    Вместо `session.add()` для каждого объекта строки пишутся пачками через
+    `INSERT ... ON CONFLICT DO UPDATE`. Для больших загрузок истории есть быстрый путь через
+    `COPY` во временную таблицу с последующим слиянием одним запросом.
+    """
+
+    def __init__(
+        self,
+        db_helper: DBHelper,
+        batch_size: int = 1000,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param db_helper: Хелпер для работы с БД
+        :param batch_size: Размер пачки по умолчанию
+        :param logger: Логгер
+        """
+        self.db_helper = db_helper
+        self.batch_size = batch_size
+        self.logger = logger or getLogger(__name__)
+
+    def upsert(
+        self,
+        model: type[Base],
+        rows: Iterable[dict[str, Any]],
+        conflict_columns: Sequence[str],
+        batch_size: int | None = None,
+        session: Session | None = None,
+    ) -> BulkWriteStats:
+        """
+        Пакетный `INSERT ... ON CONFLICT DO UPDATE`
+
+        Строки, значения которых не изменились, не перезаписываются. Если в одной пачке
+        встречается несколько строк с одним ключом, записывается последняя.
+
+        :param model: ORM модель таблицы
+        :param rows: Строки вида {колонка: значение}
+        :param conflict_columns: Колонки уникального ключа
+        :param batch_size: Размер пачки, по умолчанию :attr:`batch_size`
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Статистика записи
+        """
+        table = cast(Table, model.__table__)
+        stats = BulkWriteStats(table=table.name)
+        started = time.perf_counter()
+
+        statement = None
+        with self.db_helper.sessionmanager(session=session) as session_:
+            for batch in batched(rows, batch_size or self.batch_size):
+                # ON CONFLICT не допускает двух строк с одним ключом в одной команде
+                unique = {tuple(row[column] for column in conflict_columns): row for row in batch}
+                values = list(unique.values())
+
+                # Запрос строится один раз, а пачка передается как executemany: для
+                # INSERT ... RETURNING SQLAlchemy разворачивает ее в многострочный VALUES
+                # (insertmanyvalues) без повторной компиляции. RETURNING возвращает только
+                # вставленные и обновленные строки
+                if statement is None:
+                    statement = self._upsert_statement(table, values[0], conflict_columns)
+                written = len(session_.execute(statement, values).all())
+
+                stats.rows += len(batch)
+                stats.written += written
+                stats.batches += 1
+
+        stats.seconds = time.perf_counter() - started
+        self._log_stats(stats, "upsert")
+        return stats
+
+    @staticmethod
+    def _upsert_statement(
+        table: Table,
+        row: dict[str, Any],
+        conflict_columns: Sequence[str],
+    ) -> ReturningInsert[Any]:
+        """
+        `INSERT ... ON CONFLICT DO UPDATE`, обновляющий только изменившиеся строки
+
+        :param table: Таблица
+        :param row: Пример строки (определяет набор колонок)
+        :param conflict_columns: Колонки уникального ключа
+        """
+        statement = insert(table)
+        columns = [column for column in row if column not in conflict_columns]
+        return statement.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={column: statement.excluded[column] for column in columns},
+            where=or_(
+                *(
+                    table.c[column].is_distinct_from(statement.excluded[column])
+                    for column in columns
+                )
+            ),
+        ).returning(*table.primary_key.columns)
+
+    def copy_upsert(
+        self,
+        model: type[Base],
+        rows: Iterable[dict[str, Any]],
+        columns: Sequence[str],
+        conflict_columns: Sequence[str],
+        session: Session | None = None,
+    ) -> BulkWriteStats:
+        """
+        Загрузка через `COPY` во временную таблицу и слияние в целевую таблицу
+
+        Подходит для загрузки истории: данные передаются потоком в текстовом формате COPY,
+        а затем переносятся одним `INSERT ... SELECT ... ON CONFLICT DO UPDATE`. Из строк с
+        одинаковым ключом, как и в :meth:`upsert`, записывается последняя.
+        Работает только с драйвером psycopg2.
+
+        :param model: ORM модель таблицы
+        :param rows: Строки вида {колонка: значение}
+        :param columns: Загружаемые колонки
+        :param conflict_columns: Колонки уникального ключа
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Статистика записи
+        """
+        table = cast(Table, model.__table__)
+        staging = f"{table.name}_staging_{uuid4().hex[:8]}"
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        conflict_list = ", ".join(f'"{column}"' for column in conflict_columns)
+        update_columns = [column for column in columns if column not in conflict_columns]
+        update_list = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in update_columns)
+        current_values = ", ".join(f'"{table.name}"."{column}"' for column in update_columns)
+        new_values = ", ".join(f'EXCLUDED."{column}"' for column in update_columns)
+
+        stats = BulkWriteStats(table=table.name)
+        started = time.perf_counter()
+
+        with self.db_helper.sessionmanager(session=session) as session_:
+            session_.execute(
+                text(
+                    f'CREATE TEMP TABLE "{staging}" ON COMMIT DROP AS '
+                    f'SELECT {column_list} FROM "{table.name}" WITH NO DATA'
+                )
+            )
+            # Номер строки в порядке COPY: из строк с одним ключом берется последняя, как в upsert
+            session_.execute(text(f'ALTER TABLE "{staging}" ADD COLUMN "_copy_ordinal" bigserial'))
+
+            stream = _CopyStream(rows, columns)
+            dbapi_connection = session_.connection().connection.dbapi_connection
+            with dbapi_connection.cursor() as cursor:  # type: ignore[union-attr]
+                cursor.copy_expert(f'COPY "{staging}" ({column_list}) FROM STDIN', stream)
+
+            # DISTINCT ON: ON CONFLICT не допускает двух строк с одним ключом в одной команде
+            result = cast(
+                CursorResult[Any],
+                session_.execute(
+                    text(
+                        f'INSERT INTO "{table.name}" ({column_list}) '
+                        f"SELECT DISTINCT ON ({conflict_list}) {column_list} "
+                        f'FROM "{staging}" ORDER BY {conflict_list}, "_copy_ordinal" DESC '
+                        f"ON CONFLICT ({conflict_list}) DO UPDATE SET {update_list} "
+                        f"WHERE ({current_values}) IS DISTINCT FROM ({new_values})"
+                    )
+                ),
+            )
+
+            stats.rows = stream.rows
+            stats.written = result.rowcount
+            stats.batches = 1
+
+        stats.seconds = time.perf_counter() - started
+        self._log_stats(stats, "copy")
+        return stats
+
+    def upsert_sales(
+        self,
+        sales: Iterable[SaleModel],
+        batch_size: int | None = None,
+        session: Session | None = None,
+    ) -> BulkWriteStats:
+        """
+        Пакетный upsert продаж в `sales` по `sale_id`
+
+        :param sales: Продажи из KitShop
+        :param batch_size: Размер пачки, по умолчанию :attr:`batch_size`
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Статистика записи
+        """
+        return self.upsert(
+            Sale,
+            (Sale.values_from_model(sale) for sale in sales),
+            conflict_columns=("sale_id",),
+            batch_size=batch_size,
+            session=session,
+        )
+
+    def upsert_positions(
+        self,
+        sales: Iterable[SalesAboutModel],
+        batch_size: int | None = None,
+        session: Session | None = None,
+    ) -> BulkWriteStats:
+        """
+        Пакетный upsert позиций продаж в `sale_positions` по `position_id`
+
+        Позиции всех переданных продаж пишутся общими пачками. Продажи должны уже быть в `sales`.
+
+        :param sales: Подробная информация о продажах
+        :param batch_size: Размер пачки, по умолчанию :attr:`batch_size`
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Статистика записи
+        """
+        return self.upsert(
+            SalePosition,
+            (
+                SalePosition.values_from_model(position)
+                for sale in sales
+                for position in sale.Positions
+            ),
+            conflict_columns=("position_id",),
+            batch_size=batch_size,
+            session=session,
+        )
+
+    def upsert_sales_full(
+        self,
+        sales: Sequence[SalesModelFull],
+        batch_size: int | None = None,
+        session: Session | None = None,
+    ) -> tuple[BulkWriteStats, BulkWriteStats]:
+        """
+        Записать продажи вместе с позициями в одной транзакции
+
+        Подходит для результата :meth:`KitShopManager.get_sales_by_period`. Продажи без
+        подробностей записываются без позиций.
+
+        :param sales: Продажи с подробной информацией
+        :param batch_size: Размер пачки, по умолчанию :attr:`batch_size`
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Статистика записи продаж и позиций
+        """
+        with self.db_helper.sessionmanager(session=session) as session_:
+            sales_stats = self.upsert_sales(sales, batch_size, session_)
+            positions_stats = self.upsert_positions(
+                (sale.about for sale in sales if sale.about is not None), batch_size, session_
+            )
+        return sales_stats, positions_stats
+
+    async def upsert_sales_stream(
+        self,
+        sales: AsyncIterable[SaleModel],
+        batch_size: int | None = None,
+        session: Session | None = None,
+    ) -> BulkWriteStats:
+        """
+        Пакетный upsert продаж из асинхронного потока (:meth:`KitShopManager.stream_sales`)
+
+        В памяти одновременно находится не больше одной пачки. Запись каждой пачки выполняется в
+        отдельном потоке, чтобы не блокировать event loop.
+
+        :param sales: Асинхронный поток продаж
+        :param batch_size: Размер пачки, по умолчанию :attr:`batch_size`
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Суммарная статистика записи
+        """
+        batch_size = batch_size or self.batch_size
+        stats = BulkWriteStats(table=Sale.__tablename__)
+        started = time.perf_counter()
+
+        async def flush(batch: list[SaleModel]) -> None:
+            batch_stats = await asyncio.to_thread(self.upsert_sales, batch, batch_size, session)
+            stats.rows += batch_stats.rows
+            stats.written += batch_stats.written
+            stats.batches += batch_stats.batches
+
+        batch: list[SaleModel] = []
+        async for sale in sales:
+            batch.append(sale)
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+
+        if batch:
+            await flush(batch)
+
+        stats.seconds = time.perf_counter() - started
+        self._log_stats(stats, "upsert_stream")
+        return stats
+
+    def copy_sales(
+        self,
+        sales: Iterable[SaleModel],
+        session: Session | None = None,
+    ) -> BulkWriteStats:
+        """
+        Загрузка продаж в `sales` через `COPY` (для загрузки истории)
+
+        :param sales: Продажи из KitShop
+        :param session: Сессия (если передана, запись идет в ее транзакции)
+        :return: Статистика записи
+        """
+        return self.copy_upsert(
+            Sale,
+            (Sale.values_from_model(sale) for sale in sales),
+            columns=SALE_COLUMNS,
+            conflict_columns=("sale_id",),
+            session=session,
+        )
+
+    def _log_stats(self, stats: BulkWriteStats, method: str) -> None:
+        self.logger.info(
+            f"Записано {stats.written} из {stats.rows} строк в {stats.table} "
+            f"за {stats.seconds:.3f} с ({stats.rows_per_sec:.0f} строк/с)",
+            extra={"method": method, **stats.model_dump()},
+        )
@@ -0,0 +1,216 @@
+"""
+:mod:`cpu_pool` -- Пул процессов для CPU-емкой обработки ответов KitShop
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+Разбор и агрегация больших ответов занимают процессор и, если выполнять их в `async def`,
+блокируют event loop для всех остальных запросов. :class:`CpuPool` выполняет их в отдельных
+процессах.
+
+Результат возвращается из процесса через pickle, и его восстановление тоже стоит времени
+основного процесса. Например, список из 100 тысяч моделей pydantic восстанавливается дольше,
+чем разбирается на месте. Поэтому функции пула возвращают компактные результаты: словари из
+JSON, колонки :class:`SalesFrame`, итоги по группам или отчет о проверке, но не списки моделей.
+"""
+
+import asyncio
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from logging import Logger, getLogger
+from os import cpu_count, getpid
+from typing import Any, Literal, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from ext_kit_shop.models.kit_shop import SalesEnvelope
+from ext_kit_shop.utils.kit_shop_client import KitShopClient
+from ext_kit_shop.utils.sales_frame import SalesFrame, SalesGroups
+
+__all__ = (
+    "CpuPool",
+    "SalesValidationReport",
+)
+
+_T = TypeVar("_T")
+
+
+class SalesValidationReport(BaseModel):
+    """Результат проверки ответа `GetSales`"""
+
+    total: int
+    invalid: int = 0
+    # Первые ошибки в виде "индекс.поле: описание"
+    errors: list[str] = []
+
+    @property
+    def valid(self) -> bool:
+        """Все ли продажи прошли проверку"""
+        return not self.invalid
+
+
+def _decode(url: str, content: bytes) -> dict[str, Any]:
+    return KitShopClient.decode(url, content)
+
+
+def _validate_sales(url: str, content: bytes, max_errors: int) -> SalesValidationReport:
+    body = KitShopClient.decode(url, content)
+    total = len(body.get("Sales") or [])
+    try:
+        SalesEnvelope.model_validate(body)
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_input=False)
+        return SalesValidationReport(
+            total=total,
+            invalid=len({error["loc"][1] for error in errors if len(error["loc"]) > 1}),
+            errors=[
+                f"{'.'.join(str(part) for part in error['loc'][1:])}: {error['msg']}"
+                for error in errors[:max_errors]
+            ],
+        )
+    return SalesValidationReport(total=total)
+
+
+def _sales_frame(url: str, content: bytes) -> SalesFrame:
+    return SalesFrame.from_response(content, url)
+
+
+def _aggregate_sales(
+    url: str,
+    content: bytes,
+    by: Literal["shop", "device", "day"],
+) -> SalesGroups:
+    return SalesFrame.from_response(content, url).group_by(by)
+
+
+class CpuPool:
+    """
+    Пул процессов для разбора, проверки и агрегации ответов KitShop API
+
+    Процессы создаются при первом обращении, методом `forkserver` (где он есть): дочерние
+    процессы не наследуют потоки и соединения работающего приложения. Если процесс приложения
+    был форкнут после создания пула (например, воркеры uvicorn), в нем создается свой пул.
+    Ответы меньше `inline_threshold` байт обрабатываются в текущем процессе: передача в
+    другой процесс обошлась бы дороже самой обработки.
+
+    Ошибки из дочерних процессов (в том числе :class:`KitShopError`) пробрасываются вызвавшему.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        inline_threshold: int = 256 * 1024,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param workers: Количество процессов, по умолчанию - количество ядер
+        :param inline_threshold: Размер ответа (байты), начиная с которого он обрабатывается в пуле
+        :param logger: Логгер
+        """
+        self.workers = workers
+        self.inline_threshold = inline_threshold
+        self.logger = logger or getLogger(__name__)
+        self._executor: ProcessPoolExecutor | None = None
+        self._pid: int | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Пул процессов, создается при первом обращении"""
+        if self._executor is None or self._pid != getpid():
+            method = (
+                "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            )
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(method),
+            )
+            self._pid = getpid()
+            self.logger.info(
+                "Пул процессов создан",
+                extra={"workers": self.workers or cpu_count(), "method": method},
+            )
+        return self._executor
+
+    async def run(self, func: Callable[..., _T], *args: Any) -> _T:
+        """
+        Выполнить функцию в пуле процессов
+
+        :param func: Функция уровня модуля (передается в процесс через pickle)
+        :param args: Аргументы функции, должны сериализоваться pickle
+        :return: Результат функции
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def _run_for(self, content: bytes, func: Callable[..., _T], *args: Any) -> _T:
+        """Выполнить функцию в пуле или на месте, в зависимости от размера ответа"""
+        if len(content) < self.inline_threshold:
+            return func(*args)
+        return await self.run(func, *args)
+
+    async def decode(self, url: str, content: bytes) -> dict[str, Any]:
+        """
+        Разбор JSON ответа KitShop API с проверкой `ResultCode`
+
+        :param url: Адрес метода API
+        :param content: Тело ответа
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+        :return: Разобранное тело ответа
+        """
+        return await self._run_for(content, _decode, url, content)
+
+    async def validate_sales(
+        self,
+        url: str,
+        content: bytes,
+        max_errors: int = 20,
+    ) -> SalesValidationReport:
+        """
+        Проверка всех продаж ответа `GetSales` по модели :class:`SaleModel`
+
+        :param url: Адрес метода API
+        :param content: Тело ответа
+        :param max_errors: Максимальное количество ошибок в отчете
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном JSON
+        :return: Отчет о проверке
+        """
+        return await self._run_for(content, _validate_sales, url, content, max_errors)
+
+    async def sales_frame(self, url: str, content: bytes) -> SalesFrame:
+        """
+        Колоночное представление продаж из ответа `GetSales`
+
+        :param url: Адрес метода API
+        :param content: Тело ответа
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+        :return: Фрейм продаж
+        """
+        return await self._run_for(content, _sales_frame, url, content)
+
+    async def aggregate_sales(
+        self,
+        url: str,
+        content: bytes,
+        by: Literal["shop", "device", "day"],
+    ) -> SalesGroups:
+        """
+        Количество и сумма продаж из ответа `GetSales` по магазинам, кассам или дням
+
+        :param url: Адрес метода API
+        :param content: Тело ответа
+        :param by: Поле группировки
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+        :return: Итоги по группам
+        """
+        return await self._run_for(content, _aggregate_sales, url, content, by)
+
+    def shutdown(self) -> None:
+        """Остановить процессы пула (незавершенные задачи отменяются)"""
+        if self._executor is not None and self._pid == getpid():
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+    async def aclose(self) -> None:
+        """Остановить процессы пула, не блокируя event loop на время их завершения"""
+        await asyncio.to_thread(self.shutdown)
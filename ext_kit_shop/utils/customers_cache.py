@@ -0,0 +1,126 @@
+"""
+:mod:`customers_cache` -- Кэш списка покупателей KitShop
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import hashlib
+import time
+from collections.abc import Callable
+
+from ext_kit_shop.models.kit_shop import CustomerModel
+
+__all__ = ("CustomersCache",)
+
+
+class CustomersCache:
+    """
+    Кэш списка покупателей с TTL и определением изменений
+
+    Список покупателей меняется редко, поэтому в течение `ttl` секунд он отдается из памяти.
+    При обновлении считается хэш тела ответа: если ответ не изменился, повторная валидация
+    в :class:`CustomerModel` не выполняется, а у текущего списка просто продлевается срок жизни.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_size: int = 64 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param ttl: Время жизни списка в кэше (секунды)
+        :param max_size: Максимальный размер кэшируемого ответа (байты). Ответы большего размера
+            не кэшируются
+        :param clock: Источник времени
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._customers: list[CustomerModel] | None = None
+        self._by_id: dict[int, CustomerModel] = {}
+        self._digest: str | None = None
+        self._size = 0
+        self._expires_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.unchanged = 0
+
+    @property
+    def size(self) -> int:
+        """Размер закэшированного ответа (байты)"""
+        return self._size
+
+    @property
+    def digest(self) -> str | None:
+        """Хэш тела ответа, из которого построен текущий список"""
+        return self._digest
+
+    def is_fresh(self) -> bool:
+        """Есть ли в кэше актуальный список"""
+        return self._customers is not None and self._clock() < self._expires_at
+
+    def get(self) -> list[CustomerModel] | None:
+        """
+        Актуальный список покупателей
+
+        :return: Копия списка или None, если кэш пуст или устарел
+        """
+        if not self.is_fresh():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return list(self._customers or [])
+
+    def get_customer(self, customer_id: int) -> CustomerModel | None:
+        """
+        Покупатель по идентификатору из актуального списка
+
+        :param customer_id: Идентификатор покупателя
+        :return: Покупатель или None, если его нет или кэш устарел
+        """
+        if not self.is_fresh():
+            return None
+        return self._by_id.get(customer_id)
+
+    def update(
+        self,
+        content: bytes,
+        decode: Callable[[bytes], list[CustomerModel]],
+    ) -> list[CustomerModel]:
+        """
+        Обновить кэш по телу ответа `GetCustomers`
+
+        :param content: Тело ответа
+        :param decode: Функция разбора тела ответа в список покупателей
+        :return: Копия актуального списка покупателей
+        """
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+
+        if digest == self._digest and self._customers is not None:
+            self.unchanged += 1
+            self._expires_at = self._clock() + self.ttl
+            return list(self._customers)
+
+        customers = decode(content)
+
+        if len(content) <= self.max_size:
+            self._customers = customers
+            self._by_id = {customer.CustomerId: customer for customer in customers}
+            self._digest = digest
+            self._size = len(content)
+            self._expires_at = self._clock() + self.ttl
+        else:
+            self.invalidate()
+
+        return list(customers)
+
+    def invalidate(self) -> None:
+        """Сбросить кэш"""
+        self._customers = None
+        self._by_id = {}
+        self._digest = None
+        self._size = 0
+        self._expires_at = 0.0
@@ -0,0 +1,155 @@
+"""
+:mod:`customers_sync` -- Локальная копия покупателей KitShop в таблице `customers`
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+from logging import Logger, getLogger
+from typing import Any, cast
+
+from pydantic import BaseModel
+from sqlalchemy import Table, delete, select
+
+from ext_kit_shop.models.db import Customer
+from ext_kit_shop.models.kit_shop import CustomerModel
+from ext_kit_shop.utils.bulk_writer import BulkWriter
+from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.kit_shop_manager import KitShopManager
+from ext_kit_shop.utils.threads import to_thread
+
+__all__ = (
+    "CustomersSync",
+    "CustomersSyncResult",
+)
+
+# Колонки, по которым сравнивается состояние покупателя
+CUSTOMER_COLUMNS: tuple[str, ...] = tuple(
+    column.name for column in cast(Table, Customer.__table__).columns if column.name != "id"
+)
+
+
+class CustomersSyncResult(BaseModel):
+    """Результат синхронизации покупателей"""
+
+    total: int
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    # Исчезнувшие из снимка покупатели, удаление которых не выполнено
+    deletions_skipped: int = 0
+    skipped: bool = False
+
+
+class CustomersSync:
+    """
+    Синхронизация покупателей KitShop с таблицей `customers`
+
+    Каждый снимок `GetCustomers` сравнивается с таблицей, и в БД пишутся только отличия:
+    новые и изменившиеся покупатели одним пакетным upsert, исчезнувшие одним `DELETE`. Если тело
+    ответа не изменилось с прошлой синхронизации, сравнение не выполняется.
+
+    Пустой снимок или снимок, после которого из таблицы пришлось бы удалить больше
+    `max_delete_share` покупателей компании, скорее говорит о сбое на стороне KitShop, чем о
+    реальном удалении: в этом случае удаления не выполняются, а в лог пишется предупреждение.
+    Чтение покупателей из таблицы - :meth:`KitShopManager.get_customer`.
+    """
+
+    def __init__(
+        self,
+        db_helper: DBHelper,
+        kit_shop_manager: KitShopManager,
+        bulk_writer: BulkWriter,
+        max_delete_share: float = 0.5,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param db_helper: Хелпер для работы с БД
+        :param kit_shop_manager: Менеджер KitShop API
+        :param bulk_writer: Пакетная запись в БД
+        :param max_delete_share: Максимальная доля покупателей компании, удаляемая за одну
+            синхронизацию
+        :param logger: Логгер
+        """
+        self.db_helper = db_helper
+        self.kit_shop_manager = kit_shop_manager
+        self.bulk_writer = bulk_writer
+        self.max_delete_share = max_delete_share
+        self.logger = logger or getLogger(__name__)
+        self._applied_digest: str | None = None
+
+    @property
+    def company_id(self) -> int:
+        """Компания, покупатели которой синхронизируются"""
+        return self.kit_shop_manager.api_access.company_id
+
+    async def sync(self) -> CustomersSyncResult:
+        """
+        Выполнить синхронизацию
+
+        :raises KitShopError: Если не удалось получить список покупателей
+        :return: Результат синхронизации
+        """
+        customers = await self.kit_shop_manager.fetch_customers(use_cache=False)
+        digest = self.kit_shop_manager.customers_cache.digest
+
+        if digest is not None and digest == self._applied_digest:
+            return CustomersSyncResult(total=len(customers), skipped=True)
+
+        result = await to_thread(self._apply, customers)
+        # Снимок с пропущенными удалениями применяется повторно, пока не изменится
+        if not result.deletions_skipped:
+            self._applied_digest = digest
+
+        self.logger.info("Синхронизация покупателей завершена", extra=result.model_dump())
+        return result
+
+    def _apply(self, customers: list[CustomerModel]) -> CustomersSyncResult:
+        """Применить снимок покупателей к таблице"""
+        rows = {
+            customer.CustomerId: Customer.values_from_model(customer, self.company_id)
+            for customer in customers
+        }
+        table = cast(Table, Customer.__table__)
+
+        with self.db_helper.sessionmanager() as session:
+            existing = {
+                row.customer_id: tuple(row)
+                for row in session.execute(
+                    select(*(table.c[column] for column in CUSTOMER_COLUMNS)).where(
+                        Customer.company_id == self.company_id
+                    )
+                )
+            }
+
+            changed: list[dict[str, Any]] = []
+            inserted = 0
+            for customer_id, row in rows.items():
+                current = existing.get(customer_id)
+                if current is None:
+                    inserted += 1
+                elif current == tuple(row[column] for column in CUSTOMER_COLUMNS):
+                    continue
+                changed.append(row)
+
+            if changed:
+                self.bulk_writer.upsert(Customer, changed, ("customer_id",), session=session)
+
+            deleted = list(existing.keys() - rows.keys())
+            deletions_skipped = 0
+            if deleted and (not rows or len(deleted) > self.max_delete_share * len(existing)):
+                self.logger.warning(
+                    f"Снимок покупателей удаляет {len(deleted)} из {len(existing)} покупателей, "
+                    "удаление пропущено",
+                    extra={"company_id": self.company_id, "total": len(rows)},
+                )
+                deleted, deletions_skipped = [], len(deleted)
+            if deleted:
+                session.execute(delete(Customer).where(Customer.customer_id.in_(deleted)))
+
+        return CustomersSyncResult(
+            total=len(rows),
+            inserted=inserted,
+            updated=len(changed) - inserted,
+            deleted=len(deleted),
+            deletions_skipped=deletions_skipped,
+        )
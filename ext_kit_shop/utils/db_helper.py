@@ -5,26 +5,36 @@
 """
 
 try:
-    from collections.abc import Generator
-    from contextlib import contextmanager
+    import time
+    from collections.abc import AsyncGenerator, Generator
+    from contextlib import asynccontextmanager, contextmanager
     from json import dumps, loads
-    from logging import NOTSET, basicConfig, getLogger
+    from logging import NOTSET, Logger, basicConfig, getLogger
     from os import getpid
+    from threading import Lock
     from typing import Any
 
     from sqlalchemy import (
         create_engine as sqlalchemy_create_engine,
     )
+    from sqlalchemy import text
     from sqlalchemy.dialects import postgresql, sqlite
     from sqlalchemy.engine import Engine
     from sqlalchemy.exc import SQLAlchemyError
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
     from sqlalchemy.orm.session import Session
     from sqlalchemy.orm.session import sessionmaker as sqlalchemy_sessionmaker
     from sqlalchemy.pool import StaticPool
 except ImportError:
     raise ImportError("Install module with SQL: pip install sqlalchemy") from ImportError
 
-__all__ = ("DBHelper",)
+from ext_kit_shop.utils.metrics import DB_READONLY_SESSIONS, DB_REPLICA_LAG
+from ext_kit_shop.utils.slow_query_log import SlowQueryLog
+
+__all__ = (
+    "AsyncDBHelper",
+    "DBHelper",
+)
 
 
 def sessionmaker(
@@ -55,6 +65,7 @@ def create_engine(
     dialect: str = "postgresql",
     engine_loglevel: str | int = NOTSET,
     pool_recycle: int = 3600,
+    slow_query_log: SlowQueryLog | None = None,
     **kwargs: Any,
 ) -> Engine:
     """
@@ -67,6 +78,7 @@ def create_engine(
     :param engine_loglevel: Уровень логирования
     :param pool_recycle: Срок жизни соединения в пуле, после истечения которого соединение должно
         быть переоткрыто
+    :param slow_query_log: Журнал медленных запросов
 
     :return: Экземпляр :class:`Engine`
     """
@@ -107,6 +119,9 @@ def create_engine(
 
     engine = sqlalchemy_create_engine(db_url, **engine_options, **kwargs)
 
+    if slow_query_log is not None:
+        slow_query_log.attach(engine)
+
     return engine
 
 
@@ -155,13 +170,37 @@ class DBHelperBase:
         return self._engine is not None
 
 
+# Отставание реплики в секундах: 0, если все полученные WAL уже применены (иначе на простаивающей
+# БД отставание росло бы без новых транзакций), или сама БД не является репликой
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
 class DBHelper(DBHelperBase):
-    """Mixin для подключения к БД."""
+    """
+    Mixin для подключения к БД.
+
+    Если передан `replica_engine`, сессии `sessionmanager(readonly=True)` открываются на
+    реплике. Отставание реплики проверяется не чаще раза в `replica_check_interval` секунд;
+    пока оно больше `replica_max_lag` или реплика недоступна, такие сессии открываются на
+    основной БД.
+    """
 
     def __init__(
         self,
         engine: Engine,
         session_factory: sqlalchemy_sessionmaker[Any] | None = None,
+        replica_engine: Engine | None = None,
+        replica_max_lag: float = 30.0,
+        replica_check_interval: float = 5.0,
+        logger: Logger | None = None,
     ) -> None:
         """
         Конструктор экземпляра класса
@@ -170,8 +209,11 @@ class DBHelper(DBHelperBase):
         события для связи подсистемы аудита и журнала задач
 
         :param engine: Экземпляр :class:`Engine`
-        :param login: Логин пользователя
-        :param variables: Переменные сессии
+        :param session_factory: Фабрика сессий основной БД
+        :param replica_engine: Экземпляр :class:`Engine` реплики для сессий только для чтения
+        :param replica_max_lag: Допустимое отставание реплики (секунды)
+        :param replica_check_interval: Интервал проверки отставания реплики (секунды)
+        :param logger: Логгер
         """
         self._pid: int | None = None
 
@@ -182,12 +224,29 @@ class DBHelper(DBHelperBase):
         else:
             self._session_factory = sessionmaker(self._engine)
 
+        self._replica_engine = replica_engine
+        self._replica_session_factory = (
+            sessionmaker(replica_engine) if replica_engine is not None else None
+        )
+        self.replica_max_lag = replica_max_lag
+        self.replica_check_interval = replica_check_interval
+        self.logger = logger or getLogger(__name__)
+        self._replica_lock = Lock()
+        self._replica_checked_at: float | None = None
+        self._replica_usable: bool | None = None
+
         self._init_db_in_process()
 
+    @property
+    def replica_engine(self) -> Engine | None:
+        """Экземпляр :class:`Engine` реплики"""
+        return self._replica_engine
+
     @contextmanager
     def sessionmanager(
         self,
         session: Session | None = None,
+        readonly: bool = False,
         **kwargs: Any,
     ) -> Generator[Session, Any, Any]:
         """
@@ -202,6 +261,8 @@ class DBHelper(DBHelperBase):
         :param login: Логин пользователя
         :param variables: Переменные сессии
         :param expunge_all: Отсоединить объекты от сессии
+        :param readonly: Сессия только для чтения, открывается на реплике, если она есть и не
+            отстает. Изменения в такой сессии не допускаются
         :param kwargs: Именованные параметры, передаваемые в конструктор :class:`Session`
         """
         self._init_db_in_process()
@@ -210,8 +271,16 @@ class DBHelper(DBHelperBase):
             yield session
             return
 
+        session_factory = self._session_factory
+        if readonly and self._replica_session_factory is not None:
+            if self._check_replica():
+                session_factory = self._replica_session_factory
+            DB_READONLY_SESSIONS.labels(
+                "replica" if session_factory is self._replica_session_factory else "primary"
+            ).inc()
+
         # TODO: При создании сессии необходимо учитывать временную зону
-        session_ = self._session_factory(**kwargs)
+        session_ = session_factory(**kwargs)
 
         try:
             yield session_
@@ -237,4 +306,128 @@ class DBHelper(DBHelperBase):
         """
         if self._pid != getpid():
             self._engine.dispose()
+            if self._replica_engine is not None:
+                self._replica_engine.dispose()
+            self._replica_checked_at = None
+            self._pid = getpid()
+
+    def _check_replica(self) -> bool:
+        """Можно ли читать с реплики (результат проверки кэшируется на `replica_check_interval`)"""
+        assert self._replica_engine is not None
+
+        with self._replica_lock:
+            now = time.monotonic()
+            if (
+                self._replica_checked_at is not None
+                and now - self._replica_checked_at < self.replica_check_interval
+            ):
+                return bool(self._replica_usable)
+
+            self._replica_checked_at = now
+            # None - проверок еще не было
+            was_usable, self._replica_usable = self._replica_usable, False
+            try:
+                with self._replica_engine.connect() as connection:
+                    lag = float(connection.scalar(REPLICA_LAG_QUERY) or 0)
+            except SQLAlchemyError as e:
+                DB_REPLICA_LAG.set(-1)
+                if was_usable is not False:
+                    self.logger.warning(
+                        f"Реплика БД недоступна, чтение с основной БД: {e!r}",
+                        extra={"error": type(e).__name__},
+                    )
+                return False
+
+            DB_REPLICA_LAG.set(lag)
+            self._replica_usable = lag <= self.replica_max_lag
+            if not self._replica_usable and was_usable is not False:
+                self.logger.warning(
+                    f"Реплика БД отстает на {lag:.1f} с, чтение с основной БД",
+                    extra={"lag": lag},
+                )
+            elif self._replica_usable and was_usable is False:
+                self.logger.warning("Чтение с реплики БД возобновлено", extra={"lag": lag})
+            return self._replica_usable
+
+
+class AsyncDBHelper:
+    """
+    Подключение к БД через асинхронный драйвер (asyncpg)
+
+    Запросы не блокируют event loop, поэтому подходит для обработчиков `async def`. Объекты
+    после commit не сбрасываются (`expire_on_commit=False`): в асинхронной сессии повторная
+    загрузка атрибута при обращении к нему невозможна.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
+    ) -> None:
+        """
+        :param engine: Экземпляр :class:`AsyncEngine`
+        :param session_factory: Фабрика сессий, по умолчанию создается для `engine`
+        """
+        self._pid: int | None = None
+        self._engine = engine
+
+        if session_factory is not None:
+            self._session_factory = session_factory
+        else:
+            self._session_factory = async_sessionmaker(self._engine, expire_on_commit=False)
+
+        self._init_db_in_process()
+
+    @property
+    def engine(self) -> AsyncEngine:
+        """Экземпляр :class:`AsyncEngine`"""
+        return self._engine
+
+    @asynccontextmanager
+    async def sessionmanager(
+        self,
+        session: AsyncSession | None = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[AsyncSession]:
+        """
+        Менеджер асинхронных сессий.
+
+        Выполняет автоматический commit или rollback транзакции, так же как
+        :meth:`DBHelper.sessionmanager`
+
+        :param session: Сессия :class:`AsyncSession` (если передана, то новая сессия не создается)
+        :param kwargs: Именованные параметры, передаваемые в конструктор :class:`AsyncSession`
+        """
+        self._init_db_in_process()
+
+        if session is not None:
+            yield session
+            return
+
+        session_ = self._session_factory(**kwargs)
+
+        try:
+            yield session_
+            await session_.commit()
+        except SQLAlchemyError:
+            await session_.rollback()
+            raise
+
+        finally:
+            await session_.close()
+
+    async def dispose(self) -> None:
+        """Закрыть соединения пула (при остановке приложения)"""
+        await self._engine.dispose()
+
+    def _init_db_in_process(self) -> None:
+        """
+        Инициализация процесса для работы с БД
+
+        Как и в :meth:`DBHelper._init_db_in_process`, в дочернем процессе создается новый пул.
+        Соединения, унаследованные от родителя, не закрываются (`close=False`): они принадлежат
+        event loop родительского процесса и продолжают использоваться им.
+        """
+        if self._pid != getpid():
+            self._engine.sync_engine.dispose(close=False)
             self._pid = getpid()
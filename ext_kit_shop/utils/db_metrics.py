@@ -0,0 +1,186 @@
+"""
+:mod:`db_metrics` -- Метрики пула соединений и времени запросов к БД
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+- время ожидания соединения из пула и таймауты ожидания - :class:`InstrumentedQueuePool`;
+- занятые, свободные и сверхлимитные соединения - снимаются с пулов при сборе метрик;
+- время запросов к БД за HTTP запрос по маршрутам FastAPI - :func:`track_db_time`.
+
+Метрики отдаются маршрутом `/metrics` вместе с остальными метриками приложения.
+"""
+
+import time
+from collections.abc import Generator, Iterable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
+
+from ext_kit_shop.utils.metrics import (
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_TIMEOUTS,
+    DB_REQUEST_QUERIES,
+    DB_REQUEST_SECONDS,
+)
+
+__all__ = (
+    "DBTime",
+    "InstrumentedAsyncQueuePool",
+    "InstrumentedQueuePool",
+    "current_route",
+    "instrument_engine",
+    "observe_route",
+    "track_db_time",
+)
+
+
+class DBTime:
+    """Время и количество запросов к БД за один HTTP запрос"""
+
+    __slots__ = ("queries", "route", "seconds")
+
+    def __init__(self, route: str | None = None) -> None:
+        """:param route: HTTP запрос, например `GET /auth/login` (для логов)"""
+        self.route = route
+        self.seconds = 0.0
+        self.queries = 0
+
+
+# Счетчики текущего HTTP запроса. Задачи и потоки (asyncio.to_thread), запущенные обработчиком,
+# получают копию контекста с тем же объектом, поэтому их запросы к БД тоже учитываются
+_db_time: ContextVar[DBTime | None] = ContextVar("db_time", default=None)
+
+
+class _InstrumentedPoolMixin:
+    """Замер времени получения соединения из пула (имя пула - `pool_logging_name` engine)"""
+
+    logging_name: str | None
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        name = self.logging_name or "default"
+        started = time.perf_counter()
+        try:
+            entry: ConnectionPoolEntry = super()._do_get()  # type: ignore[misc]
+            return entry
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(name).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    """:class:`QueuePool` с метриками ожидания соединения"""
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    """:class:`AsyncAdaptedQueuePool` с метриками ожидания соединения"""
+
+
+class _PoolCollector(Collector):
+    """Состояние пулов соединений на момент сбора метрик"""
+
+    def __init__(self) -> None:
+        self.engines: dict[str, Engine] = {}
+
+    def collect(self) -> Iterable[Metric]:
+        size = GaugeMetricFamily("db_pool_size", "Размер пула соединений", labels=["pool"])
+        checked_out = GaugeMetricFamily(
+            "db_pool_checked_out", "Соединения, выданные из пула", labels=["pool"]
+        )
+        checked_in = GaugeMetricFamily(
+            "db_pool_checked_in", "Свободные соединения в пуле", labels=["pool"]
+        )
+        overflow = GaugeMetricFamily(
+            "db_pool_overflow",
+            "Соединения сверх размера пула (отрицательное - пул еще не заполнен)",
+            labels=["pool"],
+        )
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            checked_in.add_metric([name], pool.checkedin())
+            overflow.add_metric([name], pool.overflow())
+        return [size, checked_out, checked_in, overflow]
+
+
+_pool_collector = _PoolCollector()
+REGISTRY.register(_pool_collector)
+
+
+def _before_cursor_execute(conn: Any, *_: Any) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, *_: Any) -> None:
+    started = conn.info["query_started"].pop()
+    if (db_time := _db_time.get()) is not None:
+        db_time.seconds += time.perf_counter() - started
+        db_time.queries += 1
+
+
+def _handle_error(context: Any) -> None:
+    # after_cursor_execute не вызывается для запроса, завершившегося ошибкой
+    if context.connection is not None and context.connection.info.get("query_started"):
+        _after_cursor_execute(context.connection)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """
+    Подключить метрики пула и времени запросов к engine
+
+    Время ожидания соединения замеряется, только если engine создан с
+    `poolclass=InstrumentedQueuePool` (`InstrumentedAsyncQueuePool` для асинхронного).
+
+    :param engine: Экземпляр :class:`Engine` (для асинхронного - `AsyncEngine.sync_engine`)
+    :param name: Имя пула в метриках
+    """
+    _pool_collector.engines[name] = engine
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def current_route() -> str | None:
+    """HTTP запрос, в рамках которого выполняется текущий код (None - вне HTTP запроса)"""
+    db_time = _db_time.get()
+    return db_time.route if db_time is not None else None
+
+
+@contextmanager
+def track_db_time(route: str | None = None) -> Generator[DBTime]:
+    """
+    Учет времени запросов к БД внутри блока (используется middleware для HTTP запроса)
+
+    :param route: HTTP запрос, например `GET /auth/login`
+    :return: Счетчики, заполняемые запросами к БД внутри блока
+    """
+    db_time = DBTime(route)
+    token = _db_time.set(db_time)
+    try:
+        yield db_time
+    finally:
+        _db_time.reset(token)
+
+
+def observe_route(route: str, db_time: DBTime) -> None:
+    """
+    Записать время запросов к БД HTTP запроса в метрики маршрута
+
+    :param route: Шаблон пути маршрута, например `/auth/login`
+    :param db_time: Счетчики запроса
+    """
+    DB_REQUEST_SECONDS.labels(route).observe(db_time.seconds)
+    DB_REQUEST_QUERIES.labels(route).observe(db_time.queries)
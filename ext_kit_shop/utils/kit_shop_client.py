@@ -0,0 +1,581 @@
+"""
+:mod:`kit_shop_client` -- Асинхронный клиент KitShop API
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+import json
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine
+from contextlib import AbstractAsyncContextManager, nullcontext
+from logging import Logger, getLogger
+from os import getpid
+from typing import Any, TypeVar
+
+import httpx
+import ijson
+
+from ext_kit_shop.utils.metrics import (
+    KIT_SHOP_CIRCUIT_REJECTIONS,
+    KIT_SHOP_COALESCED,
+    KIT_SHOP_RETRIES,
+)
+from ext_kit_shop.utils.rate_limiter import AdaptiveRateLimiter
+from ext_kit_shop.utils.resilience import CircuitBreaker, RetryPolicy
+from ext_kit_shop.utils.single_flight import SingleFlight
+
+__all__ = (
+    "KitShopCircuitOpenError",
+    "KitShopClient",
+    "KitShopError",
+    "KitShopHTTPError",
+    "KitShopResponseError",
+    "KitShopResultError",
+    "KitShopTransportError",
+)
+
+
+class KitShopError(Exception):
+    """Базовый класс для всех исключений, связанных с KitShop API."""
+
+    def __init__(self, url: str, message: str) -> None:
+        """
+        :param url: Адрес метода API
+        :param message: Описание ошибки
+        """
+        super().__init__(f"{url}: {message}")
+        self.url = url
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        """
+        Сериализация для pickle (передача ошибки из дочернего процесса)
+
+        Конструкторы наследников принимают другие аргументы, чем хранится в `args`, поэтому
+        ошибка восстанавливается без вызова конструктора.
+        """
+        return _restore_error, (type(self), self.args, self.__dict__)
+
+
+def _restore_error(
+    cls: type[KitShopError],
+    args: tuple[Any, ...],
+    state: dict[str, Any],
+) -> KitShopError:
+    """Восстановление ошибки, сериализованной :meth:`KitShopError.__reduce__`"""
+    error = cls.__new__(cls, *args)
+    error.__dict__.update(state)
+    return error
+
+
+class KitShopTransportError(KitShopError):
+    """Ошибка сетевого уровня (таймаут, разрыв соединения и т.д.)."""
+
+
+class KitShopHTTPError(KitShopError):
+    """Ответ API с HTTP статусом, отличным от 200."""
+
+    def __init__(self, url: str, status_code: int) -> None:
+        """
+        :param url: Адрес метода API
+        :param status_code: HTTP статус ответа
+        """
+        super().__init__(url, f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class KitShopResultError(KitShopError):
+    """Ответ API с ненулевым `ResultCode`."""
+
+    def __init__(self, url: str, result_code: Any) -> None:
+        """
+        :param url: Адрес метода API
+        :param result_code: Значение `ResultCode` из ответа
+        """
+        super().__init__(url, f"ResultCode {result_code}")
+        self.result_code = result_code
+
+
+class KitShopResponseError(KitShopError):
+    """Тело ответа API не удалось разобрать."""
+
+
+class KitShopCircuitOpenError(KitShopError):
+    """KitShop API недоступен, запрос отклонен без обращения к API."""
+
+
+_T = TypeVar("_T")
+
+
+class _JsonItemsParser:
+    """
+    Инкрементальный разбор ответа KitShop API
+
+    Принимает тело ответа кусками и возвращает готовые элементы массива `prefix` по мере их
+    разбора, не дожидаясь конца ответа. Попутно запоминает `ResultCode`.
+    """
+
+    def __init__(self, prefix: str) -> None:
+        """
+        :param prefix: Путь к элементам массива в нотации ijson
+            (например, `Sales.item`)
+        """
+        self.prefix = prefix
+        self.result_code: Any = None
+        self._events = ijson.sendable_list()
+        self._coro = ijson.parse_coro(self._events, use_float=True)
+        self._builder: Any = None
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """
+        Передать очередной кусок тела ответа
+
+        :param chunk: Кусок тела ответа
+        :return: Элементы, разбор которых завершился в этом куске
+        """
+        self._coro.send(chunk)
+        return self._drain()
+
+    def close(self) -> list[Any]:
+        """
+        Завершить разбор
+
+        :return: Оставшиеся элементы
+        """
+        self._coro.close()
+        return self._drain()
+
+    def _drain(self) -> list[Any]:
+        items = []
+        for prefix, event, value in self._events:
+            if self._builder is not None:
+                self._builder.event(event, value)
+                if prefix == self.prefix and event in {"end_map", "end_array"}:
+                    items.append(self._builder.value)
+                    self._builder = None
+            elif prefix == self.prefix:
+                if event in {"start_map", "start_array"}:
+                    self._builder = ijson.ObjectBuilder()
+                    self._builder.event(event, value)
+                else:
+                    items.append(value)
+            elif prefix == "ResultCode":
+                self.result_code = value
+        del self._events[:]
+        return items
+
+
+class KitShopClient:
+    """
+    Асинхронный клиент KitShop API
+
+    Все запросы идут через один :class:`httpx.AsyncClient`, поэтому TCP/TLS соединения с
+    api.kitshop.ru переиспользуются (keep-alive), а ожидание ответа не блокирует event loop.
+    Если передан `rate_limiter`, он общий для всех методов API: каждый запрос ждет своей очереди,
+    а ошибки перегрузки уменьшают количество одновременных запросов.
+
+    Временные ошибки (сетевые, HTTP 429 и 5xx) повторяются согласно `retry_policy`. Если
+    передан `circuit_breaker`, то при недоступности API запросы сразу завершаются
+    :class:`KitShopCircuitOpenError`, не дожидаясь таймаута.
+
+    Если передан `single_flight`, одновременные одинаковые запросы (тот же метод и то же тело без
+    `Auth`) выполняются один раз, а результат получают все вызвавшие.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        timeout: float = 30.0,
+        connect_timeout: float | None = None,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        single_flight: SingleFlight | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param pool_size: Максимальное количество одновременно открытых соединений
+        :param timeout: Таймаут запроса по умолчанию (секунды)
+        :param connect_timeout: Таймаут установки соединения, по умолчанию равен `timeout`
+        :param rate_limiter: Ограничение частоты запросов, по умолчанию запросы не ограничиваются
+        :param retry_policy: Политика повторных попыток, по умолчанию запросы не повторяются
+        :param circuit_breaker: Circuit breaker, по умолчанию не используется
+        :param single_flight: Объединение одновременных одинаковых запросов, по умолчанию
+            не используется
+        :param transport: Транспорт httpx, например :class:`httpx.ASGITransport` для обращения к
+            приложению в том же процессе. По умолчанию - HTTP соединения с пулом
+        :param logger: Логгер
+        """
+        self.logger = logger or getLogger(__name__)
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.single_flight = single_flight
+        self._limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout or timeout)
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._pid: int | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Экземпляр :class:`httpx.AsyncClient`
+
+        Создается при первом обращении. Пул соединений нельзя разделять между процессами, поэтому
+        в дочернем процессе (после fork) клиент создается заново.
+        """
+        if self._client is None or self._pid != getpid():
+            self._client = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                transport=self._transport,
+            )
+            self._pid = getpid()
+        return self._client
+
+    async def post(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        """
+        Выполнить POST запрос к методу KitShop API
+
+        При объединении запросов разобранное тело ответа общее для всех вызвавших, изменять его
+        нельзя.
+
+        :param url: Адрес метода API
+        :param payload: Тело запроса
+        :param timeout: Таймаут запроса, по умолчанию используется таймаут клиента
+        :raises KitShopError: При сетевой ошибке, статусе отличном от 200, ненулевом `ResultCode`
+            или некорректном теле ответа
+        :return: Разобранное тело ответа
+        """
+
+        async def attempt() -> dict[str, Any]:
+            async with self._slot():
+                return self.decode(url, await self._send(url, payload, timeout))
+
+        return await self._coalesce("post", url, payload, lambda: self._call(url, attempt))
+
+    async def post_decoded(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        decoder: Callable[[str, bytes], _T],
+        timeout: float | None = None,
+    ) -> _T:
+        """
+        Выполнить POST запрос к методу KitShop API и разобрать ответ функцией `decoder`
+
+        То же, что :meth:`post`, но тело ответа разбирается сразу из байтов (например, в модели
+        pydantic), без промежуточного словаря.
+
+        :param url: Адрес метода API
+        :param payload: Тело запроса
+        :param decoder: Функция разбора `(url, тело ответа)`, проверяющая `ResultCode`
+        :param timeout: Таймаут запроса, по умолчанию используется таймаут клиента
+        :raises KitShopError: При сетевой ошибке, статусе отличном от 200, ненулевом `ResultCode`
+            или некорректном теле ответа
+        :return: Результат `decoder`
+        """
+
+        async def attempt() -> _T:
+            async with self._slot():
+                return decoder(url, await self._send(url, payload, timeout))
+
+        kind = f"post_decoded:{getattr(decoder, '__qualname__', decoder)}"
+        return await self._coalesce(kind, url, payload, lambda: self._call(url, attempt))
+
+    async def post_raw(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        timeout: float | None = None,
+    ) -> bytes:
+        """
+        Выполнить POST запрос к методу KitShop API и вернуть тело ответа без разбора
+
+        Проверяется только HTTP статус, `ResultCode` проверяет :meth:`decode`.
+
+        :param url: Адрес метода API
+        :param payload: Тело запроса
+        :param timeout: Таймаут запроса, по умолчанию используется таймаут клиента
+        :raises KitShopError: При сетевой ошибке или статусе отличном от 200
+        :return: Тело ответа
+        """
+
+        async def attempt() -> bytes:
+            async with self._slot():
+                return await self._send(url, payload, timeout)
+
+        return await self._coalesce("post_raw", url, payload, lambda: self._call(url, attempt))
+
+    async def _send(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        timeout: float | None = None,
+    ) -> bytes:
+        try:
+            response = await self.client.post(
+                url,
+                content=json.dumps(payload),
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+        except httpx.HTTPError as e:
+            raise KitShopTransportError(url, repr(e)) from e
+
+        if response.status_code != httpx.codes.OK:
+            raise KitShopHTTPError(url, response.status_code)
+
+        return response.content
+
+    @staticmethod
+    def decode(url: str, content: bytes) -> dict[str, Any]:
+        """
+        Разобрать тело ответа KitShop API и проверить `ResultCode`
+
+        :param url: Адрес метода API
+        :param content: Тело ответа
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+        :return: Разобранное тело ответа
+        """
+        try:
+            body = json.loads(content)
+        except ValueError as e:
+            raise KitShopResponseError(url, f"Некорректный JSON: {e}") from e
+
+        if not isinstance(body, dict):
+            raise KitShopResponseError(url, "Ожидался JSON объект")
+
+        if body.get("ResultCode", None) != 0:
+            raise KitShopResultError(url, body.get("ResultCode", None))
+
+        return body
+
+    async def stream_items(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        prefix: str,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Выполнить POST запрос и потоково разобрать массив из ответа
+
+        Тело ответа не загружается в память целиком: элементы массива `prefix` отдаются по мере
+        получения и разбора. `ResultCode` проверяется после прочтения всего ответа, поэтому при
+        ошибке исключение возникает в конце итерации.
+        Временная ошибка до получения первого элемента повторяется согласно `retry_policy`, после
+        получения элементов - нет, чтобы не отдать их повторно.
+
+        :param url: Адрес метода API
+        :param payload: Тело запроса
+        :param prefix: Путь к элементам массива в нотации ijson (например, `Sales.item`)
+        :param timeout: Таймаут запроса, по умолчанию используется таймаут клиента
+        :raises KitShopError: При сетевой ошибке, статусе отличном от 200, ненулевом `ResultCode`
+            или некорректном теле ответа
+        :return: Асинхронный итератор по элементам массива
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self._check_circuit(url)
+            received = False
+            try:
+                async for item in self._stream_once(url, payload, prefix, timeout):
+                    received = True
+                    yield item
+            except KitShopError as e:
+                delay = self._on_error(url, e, attempt, can_retry=not received)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                self._on_success()
+                return
+
+    async def _stream_once(
+        self,
+        url: str,
+        payload: dict[str, Any],
+        prefix: str,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Any]:
+        async with self._slot():
+            parser = _JsonItemsParser(prefix)
+            try:
+                async with self.client.stream(
+                    "POST",
+                    url,
+                    content=json.dumps(payload),
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                ) as response:
+                    if response.status_code != httpx.codes.OK:
+                        raise KitShopHTTPError(url, response.status_code)
+
+                    async for chunk in response.aiter_bytes():
+                        for item in parser.feed(chunk):
+                            yield item
+                    for item in parser.close():
+                        yield item
+            except httpx.HTTPError as e:
+                raise KitShopTransportError(url, repr(e)) from e
+            except ijson.JSONError as e:
+                raise KitShopResponseError(url, f"Некорректный JSON: {e}") from e
+
+            if parser.result_code != 0:
+                raise KitShopResultError(url, parser.result_code)
+
+    async def _coalesce(
+        self,
+        kind: str,
+        url: str,
+        payload: dict[str, Any],
+        func: Callable[[], Coroutine[Any, Any, _T]],
+    ) -> _T:
+        """Выполнить запрос через single-flight"""
+        if self.single_flight is None:
+            return await func()
+
+        key = (kind, url, self.request_key(payload))
+        if key in self.single_flight:
+            KIT_SHOP_COALESCED.labels(self.method_name(url)).inc()
+        return await self.single_flight.do(key, func)
+
+    @staticmethod
+    def request_key(payload: dict[str, Any]) -> str:
+        """
+        Ключ запроса для объединения одинаковых запросов
+
+        Из `Auth` учитываются только компания и логин: `RequestId` и `Sign` разные у каждого
+        запроса.
+
+        :param payload: Тело запроса
+        :return: Нормализованное тело запроса
+        """
+        auth = payload.get("Auth") or {}
+        return json.dumps(
+            {
+                **payload,
+                "Auth": {"CompanyId": auth.get("CompanyId"), "UserLogin": auth.get("UserLogin")},
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+
+    async def _call(self, url: str, attempt: Callable[[], Awaitable[_T]]) -> _T:
+        """Выполнить запрос с повторными попытками через circuit breaker"""
+        number = 0
+        while True:
+            number += 1
+            self._check_circuit(url)
+            try:
+                result = await attempt()
+            except KitShopError as e:
+                delay = self._on_error(url, e, number)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                self._on_success()
+                return result
+
+    def _check_circuit(self, url: str) -> None:
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            KIT_SHOP_CIRCUIT_REJECTIONS.labels(self.method_name(url)).inc()
+            raise KitShopCircuitOpenError(url, "API недоступен, запрос отклонен")
+
+    def _on_success(self) -> None:
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+
+    def _on_error(
+        self,
+        url: str,
+        error: KitShopError,
+        attempt: int,
+        can_retry: bool = True,
+    ) -> float | None:
+        """
+        Обработать ошибку попытки
+
+        :return: Задержка перед следующей попыткой или None, если ошибку нужно пробросить
+        """
+        transient = self.is_transient(error)
+
+        # Ответ с ненулевым ResultCode означает, что API работает
+        if self.circuit_breaker is not None:
+            if transient:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+
+        if (
+            not transient
+            or not can_retry
+            or self.retry_policy is None
+            or attempt >= self.retry_policy.attempts
+        ):
+            return None
+
+        delay = self.retry_policy.delay(attempt)
+        KIT_SHOP_RETRIES.labels(self.method_name(url)).inc()
+        self.logger.warning(
+            f"Временная ошибка запроса, повтор через {delay:.2f} секунд: {error}",
+            extra={"attempt": attempt},
+        )
+        return delay
+
+    @staticmethod
+    def method_name(url: str) -> str:
+        """
+        Имя метода KitShop API по адресу
+
+        :param url: Адрес метода API
+        :return: Последний сегмент пути (например, `GetSales`)
+        """
+        return httpx.URL(url).path.rsplit("/", 1)[-1]
+
+    @staticmethod
+    def is_transient(error: BaseException) -> bool:
+        """
+        Является ли ошибка временной, т.е. имеет ли смысл повторить запрос
+
+        :param error: Исключение, возникшее при запросе
+        :return: True для сетевых ошибок, HTTP 429 и 5xx
+        """
+        if isinstance(error, KitShopHTTPError):
+            return (
+                error.status_code == httpx.codes.TOO_MANY_REQUESTS
+                or error.status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+            )
+        return isinstance(error, KitShopTransportError)
+
+    @staticmethod
+    def is_overload(error: BaseException) -> bool:
+        """
+        Является ли ошибка признаком перегрузки KitShop API
+
+        :param error: Исключение, возникшее при запросе
+        :return: True для временных ошибок (см. :meth:`is_transient`) и ненулевого `ResultCode`
+        """
+        return KitShopClient.is_transient(error) or isinstance(error, KitShopResultError)
+
+    def _slot(self) -> AbstractAsyncContextManager[None]:
+        if self.rate_limiter is None:
+            return nullcontext()
+        return self.rate_limiter.slot(self.is_overload)
+
+    async def aclose(self) -> None:
+        """Закрыть все соединения пула"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
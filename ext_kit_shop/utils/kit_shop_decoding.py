@@ -0,0 +1,146 @@
+"""
+:mod:`kit_shop_decoding` -- Разбор ответов KitShop API в модели
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+Тело ответа валидируется целиком одним вызовом pydantic-core прямо из байтов: без
+промежуточных словарей :func:`json.loads` и без создания моделей по одной через `Model(**data)`.
+Адаптеры создаются один раз при импорте, построение схемы валидации на каждый вызов не тратится.
+"""
+
+from typing import Any
+
+from pydantic import TypeAdapter, ValidationError
+
+from ext_kit_shop.models.kit_shop import (
+    CustomerModel,
+    CustomersEnvelope,
+    KitShopEnvelope,
+    SaleAboutEnvelope,
+    SaleModel,
+    SalesAboutModel,
+    SalesEnvelope,
+)
+from ext_kit_shop.utils.kit_shop_client import (
+    KitShopClient,
+    KitShopError,
+    KitShopResponseError,
+    KitShopResultError,
+)
+
+__all__ = (
+    "CUSTOMERS_ADAPTER",
+    "SALES_ADAPTER",
+    "decode_customers",
+    "decode_sale_about",
+    "decode_sales",
+    "validate_customers",
+    "validate_sales",
+)
+
+SALES_ADAPTER = TypeAdapter(list[SaleModel])
+CUSTOMERS_ADAPTER = TypeAdapter(list[CustomerModel])
+
+
+def _response_error(url: str, content: bytes, error: ValidationError) -> KitShopError:
+    """
+    Ошибка для тела ответа, не прошедшего валидацию
+
+    Ответ с ошибкой может не соответствовать схеме успешного ответа, поэтому сначала проверяются
+    JSON и `ResultCode`, и только если они в порядке - возвращается ошибка валидации данных.
+
+    :raises KitShopError: При ненулевом `ResultCode` или некорректном JSON
+    """
+    KitShopClient.decode(url, content)
+    return KitShopResponseError(url, str(error))
+
+
+def _check_result(url: str, body: KitShopEnvelope) -> None:
+    if body.ResultCode != 0:
+        raise KitShopResultError(url, body.ResultCode)
+
+
+def decode_sales(url: str, content: bytes) -> list[SaleModel]:
+    """
+    Разбор тела ответа `GetSales`
+
+    :param url: Адрес метода API
+    :param content: Тело ответа
+    :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+    :return: Список продаж
+    """
+    try:
+        body = SalesEnvelope.model_validate_json(content)
+    except ValidationError as e:
+        raise _response_error(url, content, e) from e
+    _check_result(url, body)
+    return body.Sales or []
+
+
+def decode_sale_about(url: str, content: bytes) -> SalesAboutModel:
+    """
+    Разбор тела ответа `GetSaleById`
+
+    :param url: Адрес метода API
+    :param content: Тело ответа
+    :raises KitShopError: При ненулевом `ResultCode`, некорректном теле ответа или пустом
+        списке продаж
+    :return: Подробная информация о продаже
+    """
+    try:
+        body = SaleAboutEnvelope.model_validate_json(content)
+    except ValidationError as e:
+        raise _response_error(url, content, e) from e
+    _check_result(url, body)
+
+    sales = body.Sales
+    if not sales:
+        raise KitShopResponseError(url, "Продажа не найдена в ответе")
+    return sales[0]
+
+
+def decode_customers(url: str, content: bytes) -> list[CustomerModel]:
+    """
+    Разбор тела ответа `GetCustomers`
+
+    :param url: Адрес метода API
+    :param content: Тело ответа
+    :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+    :return: Список покупателей
+    """
+    try:
+        body = CustomersEnvelope.model_validate_json(content)
+    except ValidationError as e:
+        raise _response_error(url, content, e) from e
+    _check_result(url, body)
+    return body.Customers or []
+
+
+def validate_sales(url: str, items: Any) -> list[SaleModel]:
+    """
+    Валидация уже разобранного списка продаж одним вызовом
+
+    :param url: Адрес метода API, для текста ошибки
+    :param items: Список словарей с продажами (None - пустой список)
+    :raises KitShopResponseError: Если данные не соответствуют модели
+    :return: Список продаж
+    """
+    try:
+        return SALES_ADAPTER.validate_python(items or [])
+    except ValidationError as e:
+        raise KitShopResponseError(url, str(e)) from e
+
+
+def validate_customers(url: str, items: Any) -> list[CustomerModel]:
+    """
+    Валидация уже разобранного списка покупателей одним вызовом
+
+    :param url: Адрес метода API, для текста ошибки
+    :param items: Список словарей с покупателями (None - пустой список)
+    :raises KitShopResponseError: Если данные не соответствуют модели
+    :return: Список покупателей
+    """
+    try:
+        return CUSTOMERS_ADAPTER.validate_python(items or [])
+    except ValidationError as e:
+        raise KitShopResponseError(url, str(e)) from e
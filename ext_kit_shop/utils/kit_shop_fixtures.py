@@ -0,0 +1,197 @@
+"""
+:mod:`kit_shop_fixtures` -- Запись и воспроизведение обмена с KitShop API
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+Файл фикстур - JSON Lines, сжатый gzip: одна строка на пару запрос/ответ. Каждая запись
+дописывается отдельным gzip-блоком, поэтому файл остается читаемым, даже если запись прервана.
+"""
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Literal
+
+import httpx
+
+__all__ = (
+    "RecordingTransport",
+    "ReplayTransport",
+    "request_fixture_key",
+)
+
+# Чем заменяются скрытые значения
+SCRUBBED = "***"
+# Поля `Auth`, которые не попадают в фикстуры
+SCRUBBED_AUTH_FIELDS = ("UserLogin", "RequestId", "Sign", "Password")
+# Заголовки, которые теряют смысл после чтения тела ответа целиком
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def _scrub(body: Any) -> Any:
+    """Тело запроса без учетных данных и подписи"""
+    if not isinstance(body, dict) or not isinstance(body.get("Auth"), dict):
+        return body
+
+    auth = {
+        key: SCRUBBED if key in SCRUBBED_AUTH_FIELDS else value
+        for key, value in body["Auth"].items()
+    }
+    return {**body, "Auth": auth}
+
+
+def request_fixture_key(path: str, content: bytes) -> str:
+    """
+    Ключ запроса для сопоставления с фикстурой
+
+    :param path: Путь метода API (например, `/APIService.svc/GetSales`)
+    :param content: Тело запроса
+    :return: Путь и тело запроса без `Auth` с отсортированными ключами
+    """
+    try:
+        body = json.loads(content) if content else None
+    except ValueError:
+        return f"{path} {content.decode(errors='replace')}"
+
+    if isinstance(body, dict):
+        body = {key: value for key, value in body.items() if key != "Auth"}
+    return f"{path} {json.dumps(body, sort_keys=True, ensure_ascii=False)}"
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт httpx, записывающий обмен с API в файл фикстур
+
+    Запросы передаются в `transport` (по умолчанию - обычный HTTP), ответ читается целиком и
+    записывается вместе с запросом и временем ответа. Из `Auth` удаляются логин, `RequestId`
+    и `Sign`, поэтому фикстуры можно хранить в репозитории. Записи одновременных запросов
+    дописываются в файл по одной.
+    """
+
+    def __init__(self, path: str | Path, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        """
+        :param path: Файл фикстур, записи дописываются в конец
+        :param transport: Транспорт, выполняющий запросы
+        """
+        self.path = Path(path)
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.recorded = 0
+        # Запись идет в потоках; gzip-блоки разных записей не должны перемежаться в файле
+        self._write_lock = threading.Lock()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Выполнить запрос и записать его вместе с ответом"""
+        content = await request.aread()
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+
+        try:
+            request_body = _scrub(json.loads(content)) if content else None
+        except ValueError:
+            request_body = content.decode(errors="replace")
+
+        record = {
+            "method": request.method,
+            "path": request.url.path,
+            "request": request_body,
+            "status_code": response.status_code,
+            "content_type": response.headers.get("content-type"),
+            "elapsed": round(elapsed, 6),
+            "response": body.decode(errors="surrogateescape"),
+        }
+        await asyncio.to_thread(self._write, record)
+        self.recorded += 1
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=[
+                (name, value)
+                for name, value in response.headers.multi_items()
+                if name.lower() not in DROPPED_HEADERS
+            ],
+            content=body,
+            request=request,
+        )
+
+    def _write(self, record: dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._write_lock, gzip.open(self.path, "at", encoding="utf-8") as file:
+            file.write(line)
+
+    async def aclose(self) -> None:
+        """Закрыть транспорт, выполняющий запросы"""
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт httpx, отвечающий записанными фикстурами
+
+    Запрос сопоставляется с записями по пути и телу без `Auth` (см. :func:`request_fixture_key`).
+    Если одинаковых запросов записано несколько, ответы отдаются по кругу в порядке записи.
+    В режиме `timing="original"` ответ задерживается на записанное время ответа, деленное на
+    `speed`, в режиме `"fast"` отдается сразу. Запрос без фикстуры получает HTTP 404.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        timing: Literal["fast", "original"] = "fast",
+        speed: float = 1.0,
+    ) -> None:
+        """
+        :param path: Файл фикстур
+        :param timing: Режим задержки ответов
+        :param speed: Ускорение воспроизведения для режима `"original"`
+        """
+        self.path = Path(path)
+        self.timing = timing
+        self.speed = speed
+        self._records: dict[str, deque[dict[str, Any]]] = defaultdict(deque)
+
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                request = record["request"]
+                content = (
+                    request.encode() if isinstance(request, str) else json.dumps(request).encode()
+                )
+                self._records[request_fixture_key(record["path"], content)].append(record)
+
+        self.replayed = 0
+        self.missed = 0
+
+    def __len__(self) -> int:
+        """Количество записанных пар запрос/ответ"""
+        return sum(len(records) for records in self._records.values())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Ответить записанной фикстурой"""
+        records = self._records.get(request_fixture_key(request.url.path, await request.aread()))
+        if not records:
+            self.missed += 1
+            return httpx.Response(404, request=request, text="Фикстура не найдена")
+
+        record = records[0]
+        records.rotate(-1)
+
+        if self.timing == "original" and record["elapsed"] > 0:
+            await asyncio.sleep(record["elapsed"] / self.speed)
+
+        self.replayed += 1
+        headers = {"content-type": record["content_type"]} if record["content_type"] else {}
+        return httpx.Response(
+            status_code=record["status_code"],
+            headers=headers,
+            content=record["response"].encode(errors="surrogateescape"),
+            request=request,
+        )
@@ -4,26 +4,49 @@
 .. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
 """
 
+import asyncio
 import hashlib
 import json
+from collections.abc import AsyncIterator, Iterable
 from datetime import datetime
 from logging import Logger, getLogger
+from typing import Any
 
 import requests
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import ColumnElement, select
+from sqlalchemy.exc import SQLAlchemyError
 
+from ext_kit_shop.models.db import Customer
 from ext_kit_shop.models.kit_shop import (
     CustomerModel,
-    PositionModel,
     SaleModel,
     SalesAboutModel,
+    SalesModelFull,
 )
+from ext_kit_shop.utils.cpu_pool import CpuPool
+from ext_kit_shop.utils.customers_cache import CustomersCache
 from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.kit_shop_client import (
+    KitShopClient,
+    KitShopError,
+    KitShopResponseError,
+)
+from ext_kit_shop.utils.kit_shop_decoding import (
+    decode_customers,
+    decode_sale_about,
+    decode_sales,
+    validate_customers,
+    validate_sales,
+)
+from ext_kit_shop.utils.sale_details_cache import SaleDetailsCache
+from ext_kit_shop.utils.sales_frame import SalesFrame
 
 # region CONSTS
-URL_GET_SALES = "https://api.kitshop.ru/APIService.svc/GetSales"
-URL_GET_SALE_ABOUT = "https://api.kitshop.ru/APIService.svc/GetSaleById"
-URL_GET_CUSTOMERS = "https://api.kitshop.ru/APIService.svc/GetCustomers"
+KIT_SHOP_BASE_URL = "https://api.kitshop.ru/APIService.svc"
+URL_GET_SALES = f"{KIT_SHOP_BASE_URL}/GetSales"
+URL_GET_SALE_ABOUT = f"{KIT_SHOP_BASE_URL}/GetSaleById"
+URL_GET_CUSTOMERS = f"{KIT_SHOP_BASE_URL}/GetCustomers"
 
 # endregion
 
@@ -58,10 +81,25 @@ class KitShopManager:
         db_helper: DBHelper,
         api_access: ApiAccess,
         logger: Logger | None = None,
+        kit_shop_client: KitShopClient | None = None,
+        details_concurrency: int = 10,
+        customers_cache: CustomersCache | None = None,
+        sale_details_cache: SaleDetailsCache | None = None,
+        base_url: str = KIT_SHOP_BASE_URL,
+        cpu_pool: CpuPool | None = None,
     ):
         self.db_helper = db_helper
         self.logger = logger if logger else getLogger()
         self.api_access = api_access
+        self.kit_shop_client = kit_shop_client or KitShopClient(logger=self.logger)
+        self.details_concurrency = details_concurrency
+        self.customers_cache = customers_cache or CustomersCache()
+        self._customers_lock = asyncio.Lock()
+        self.sale_details_cache = sale_details_cache
+        self.url_get_sales = f"{base_url.rstrip('/')}/GetSales"
+        self.url_get_sale_about = f"{base_url.rstrip('/')}/GetSaleById"
+        self.url_get_customers = f"{base_url.rstrip('/')}/GetCustomers"
+        self.cpu_pool = cpu_pool
 
     def _get_sales_ks(self, up_date: str, to_date: str) -> list[SaleModel] | None:
         """
@@ -75,25 +113,23 @@ class KitShopManager:
             "Auth": self.api_access.get_auth_headers(),
             "Filter": {"UpDate": up_date, "ToDate": to_date},
         }
-        response = requests.post(URL_GET_SALES, data=json.dumps(sales_data))
+        response = requests.post(self.url_get_sales, data=json.dumps(sales_data))
+        body: Any = response.json() if response.status_code == requests.codes.ok else {}
 
-        if (
-            response.status_code != requests.codes.ok
-            or response.json().get("ResultCode", None) != 0
-        ):
+        if response.status_code != requests.codes.ok or body.get("ResultCode", None) != 0:
             self.logger.error(
-                f"Ошибка при запросе {URL_GET_SALES}: {response.status_code}",
+                f"Ошибка при запросе {self.url_get_sales}: {response.status_code}",
                 extra={
-                    "method": URL_GET_SALES,
+                    "method": self.url_get_sales,
                     "status_code": response.status_code,
                 },
             )
             return None
 
         try:
-            sales = response.json().get("Sales")
+            sales = validate_sales(self.url_get_sales, body.get("Sales"))
             self.logger.error(f"Список продаж с {up_date} по {to_date} успешно загружен")
-            return [SaleModel(**sale) for sale in sales]
+            return sales
         except Exception as e:
             self.logger.error(f"Ошибка обработки данных о продажах: {e}")
             return None
@@ -110,28 +146,23 @@ class KitShopManager:
             "Auth": self.api_access.get_auth_headers(),
             "Id": sale_id,
         }
-        response = requests.post(URL_GET_SALE_ABOUT, data=json.dumps(sales_about_data))
+        response = requests.post(self.url_get_sale_about, data=json.dumps(sales_about_data))
+        body: Any = response.json() if response.status_code == requests.codes.ok else {}
 
-        if (
-            response.status_code != requests.codes.ok
-            or response.json().get("ResultCode", None) != 0
-        ):
+        if response.status_code != requests.codes.ok or body.get("ResultCode", None) != 0:
             self.logger.error(
-                f"Ошибка при запросе {URL_GET_SALES}: {response.status_code}",
+                f"Ошибка при запросе {self.url_get_sale_about}: {response.status_code}",
                 extra={
-                    "method": URL_GET_SALES,
+                    "method": self.url_get_sale_about,
                     "status_code": response.status_code,
                 },
             )
             return None
 
         try:
-            sale_info = response.json().get("Sales")[0]
+            sale_info = body.get("Sales")[0]
             self.logger.info("Подробная информация о продаже получена", extra=sale_info)
-            sale_info["Positions"] = [
-                PositionModel(**position) for position in sale_info["Positions"]
-            ]
-            return SalesAboutModel(**sale_info)
+            return SalesAboutModel.model_validate(sale_info)
         except Exception as e:
             self.logger.error(f"Ошибка обработки данных о продажах: {e}")
             return None
@@ -140,39 +171,377 @@ class KitShopManager:
         get_users = {
             "Auth": self.api_access.get_auth_headers(),
         }
-        response = requests.post(URL_GET_CUSTOMERS, data=json.dumps(get_users))
-        if (
-            response.status_code != requests.codes.ok
-            or response.json().get("ResultCode", None) != 0
-        ):
+        response = requests.post(self.url_get_customers, data=json.dumps(get_users))
+        body: Any = response.json() if response.status_code == requests.codes.ok else {}
+
+        if response.status_code != requests.codes.ok or body.get("ResultCode", None) != 0:
             self.logger.error(
-                f"Ошибка при запросе {URL_GET_SALES}: {response.status_code}",
+                f"Ошибка при запросе {self.url_get_customers}: {response.status_code}",
                 extra={
-                    "method": URL_GET_SALES,
+                    "method": self.url_get_customers,
                     "status_code": response.status_code,
                 },
             )
             return None
 
         try:
-            sales = response.json().get("Customers")
+            customers = validate_customers(self.url_get_customers, body.get("Customers"))
             self.logger.error("Список пользователей успешно загружен")
-            return [CustomerModel(**sale) for sale in sales]
+            return customers
         except Exception as e:
             self.logger.error(f"Ошибка обработки данных о продажах: {e}")
             return None
 
-    # def get_sales_by_period(self, up_date: str, to_date: str) -> list[SalesModelFull] | None:
-    #     result = []
+    # region async
+
+    def _log_request_error(self, error: KitShopError) -> None:
+        """Логирование ошибки запроса к KitShop API"""
+        self.logger.error(
+            f"Ошибка при запросе {error}",
+            extra={
+                "method": error.url,
+                "error": type(error).__name__,
+                "status_code": getattr(error, "status_code", None),
+                "result_code": getattr(error, "result_code", None),
+            },
+        )
+
+    async def fetch_sales(self, up_date: str, to_date: str) -> list[SaleModel]:
+        """
+        Получение продаж за указанный период.
+
+        :param up_date: Начальная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :param to_date: Конечная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :raises KitShopError: При ошибке запроса или разбора ответа
+        :return: Список продаж
+        """
+        return await self.kit_shop_client.post_decoded(
+            self.url_get_sales,
+            {
+                "Auth": self.api_access.get_auth_headers(),
+                "Filter": {"UpDate": up_date, "ToDate": to_date},
+            },
+            decode_sales,
+        )
+
+    async def fetch_sales_frame(self, up_date: str, to_date: str) -> SalesFrame:
+        """
+        Получение продаж за указанный период в виде колонок для аналитики.
+
+        Модели продаж не создаются. Если настроен пул процессов, большой ответ разбирается в нем,
+        не занимая event loop.
+
+        :param up_date: Начальная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :param to_date: Конечная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :raises KitShopError: При ошибке запроса или разбора ответа
+        :return: Фрейм продаж
+        """
+        content = await self.kit_shop_client.post_raw(
+            self.url_get_sales,
+            {
+                "Auth": self.api_access.get_auth_headers(),
+                "Filter": {"UpDate": up_date, "ToDate": to_date},
+            },
+        )
+        if self.cpu_pool is None:
+            return SalesFrame.from_response(content, self.url_get_sales)
+        return await self.cpu_pool.sales_frame(self.url_get_sales, content)
+
+    async def stream_sales(self, up_date: str, to_date: str) -> AsyncIterator[SaleModel]:
+        """
+        Потоковое получение продаж за указанный период.
+
+        Ответ разбирается по мере загрузки, продажи отдаются по одной, поэтому потребление памяти
+        не зависит от длины периода.
+
+        :param up_date: Начальная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :param to_date: Конечная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :raises KitShopError: При ошибке запроса или разбора ответа
+        :return: Асинхронный итератор по продажам
+        """
+        items = self.kit_shop_client.stream_items(
+            self.url_get_sales,
+            {
+                "Auth": self.api_access.get_auth_headers(),
+                "Filter": {"UpDate": up_date, "ToDate": to_date},
+            },
+            prefix="Sales.item",
+        )
+        async for sale in items:
+            try:
+                yield SaleModel.model_validate(sale)
+            except (TypeError, ValidationError) as e:
+                raise KitShopResponseError(self.url_get_sales, str(e)) from e
+
+    async def fetch_sale_about(self, sale_id: int, use_cache: bool = True) -> SalesAboutModel:
+        """
+        Получение подробной информации о продаже.
+
+        Если настроен кэш подробностей продаж, ответ сначала ищется в нем, а полученный от KitShop
+        ответ сохраняется в кэш.
+
+        :param sale_id: Идентификатор продажи
+        :param use_cache: Искать ответ в кэше (False - всегда запрашивать KitShop)
+        :raises KitShopError: При ошибке запроса или разбора ответа
+        :return: Подробная информация о продаже
+        """
+        if (
+            use_cache
+            and self.sale_details_cache is not None
+            and (sale := await self.sale_details_cache.get(sale_id)) is not None
+        ):
+            return sale
+
+        sale = await self._request_sale_about(sale_id)
+        if self.sale_details_cache is not None:
+            await self.sale_details_cache.put(sale)
+        return sale
+
+    async def fetch_sales_about(
+        self,
+        sale_ids: Iterable[int],
+        concurrency: int | None = None,
+    ) -> tuple[dict[int, SalesAboutModel], dict[int, KitShopError]]:
+        """
+        Получение подробной информации о нескольких продажах.
+
+        Если настроен кэш подробностей продаж, он читается одним запросом до обращений к
+        KitShop, а полученные ответы сохраняются в него одним запросом после. Подробности
+        запрашиваются параллельно, но не более `concurrency` запросов одновременно. Ошибка
+        получения подробностей одной продажи не прерывает обработку остальных.
+
+        :param sale_ids: Идентификаторы продаж
+        :param concurrency: Максимальное количество одновременных запросов подробностей
+        :return: Подробности найденных продаж и ошибки остальных ({идентификатор продажи: ...})
+        """
+        sale_ids = list(dict.fromkeys(sale_ids))
+        found: dict[int, SalesAboutModel] = {}
+        if self.sale_details_cache is not None and sale_ids:
+            found = await self.sale_details_cache.get_many(sale_ids)
+
+        semaphore = asyncio.Semaphore(concurrency or self.details_concurrency)
+        fetched: list[SalesAboutModel] = []
+        errors: dict[int, KitShopError] = {}
+
+        async def fetch(sale_id: int) -> None:
+            async with semaphore:
+                try:
+                    sale = await self._request_sale_about(sale_id)
+                except KitShopError as e:
+                    self._log_request_error(e)
+                    errors[sale_id] = e
+                    return
+            fetched.append(sale)
+
+        await asyncio.gather(*(fetch(sale_id) for sale_id in sale_ids if sale_id not in found))
+
+        if fetched and self.sale_details_cache is not None:
+            await self.sale_details_cache.put_many(fetched)
+        found.update((sale.SaleId, sale) for sale in fetched)
+        return found, errors
+
+    async def _request_sale_about(self, sale_id: int) -> SalesAboutModel:
+        """Запрос подробной информации о продаже у KitShop"""
+        return await self.kit_shop_client.post_decoded(
+            self.url_get_sale_about,
+            {
+                "Auth": self.api_access.get_auth_headers(),
+                "Id": sale_id,
+            },
+            decode_sale_about,
+        )
+
+    async def fetch_customers(self, use_cache: bool = True) -> list[CustomerModel]:
+        """
+        Получение списка покупателей.
+
+        Пока список в кэше актуален, запрос к KitShop не выполняется. Одновременные промахи
+        кэша приводят к одному запросу.
+
+        :param use_cache: Использовать кэш (False - всегда запрашивать KitShop)
+        :raises KitShopError: При ошибке запроса или разбора ответа
+        :return: Список покупателей
+        """
+        if use_cache and (customers := self.customers_cache.get()) is not None:
+            return customers
+
+        async with self._customers_lock:
+            if use_cache and (customers := self.customers_cache.get()) is not None:
+                return customers
+
+            content = await self.kit_shop_client.post_raw(
+                self.url_get_customers,
+                {
+                    "Auth": self.api_access.get_auth_headers(),
+                },
+            )
+            return self.customers_cache.update(content, self._decode_customers)
+
+    def _decode_customers(self, content: bytes) -> list[CustomerModel]:
+        """
+        Разбор тела ответа `GetCustomers`
+
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+        """
+        return decode_customers(self.url_get_customers, content)
+
+    async def get_customer(self, customer_id: int) -> CustomerModel | None:
+        """
+        Получение покупателя по идентификатору.
+
+        Покупатель читается из таблицы `customers` (см. :class:`CustomersSync`). Если его там
+        нет (например, он появился после последней синхронизации), - из кэша списка покупателей.
+
+        :param customer_id: Идентификатор покупателя
+        :raises KitShopError: Если покупателя нет в таблице, кэш устарел и обновить его не удалось
+        :return: Покупатель или None, если такого нет
+        """
+        if (
+            customer := await self._find_stored_customer(Customer.customer_id == customer_id)
+        ) is not None:
+            return customer
+
+        if (customer := self.customers_cache.get_customer(customer_id)) is not None:
+            return customer
+
+        customers = await self.fetch_customers()
+        return self.customers_cache.get_customer(customer_id) or next(
+            (customer for customer in customers if customer.CustomerId == customer_id), None
+        )
+
+    async def find_customer_by_card_number(self, card_number: str) -> CustomerModel | None:
+        """
+        Получение покупателя по номеру карты.
+
+        Покупатель читается из таблицы `customers`, если его там нет - из списка покупателей.
+
+        :param card_number: Номер карты
+        :raises KitShopError: Если покупателя нет в таблице и получить список покупателей не удалось
+        :return: Покупатель или None, если такого нет
+        """
+        if (
+            customer := await self._find_stored_customer(Customer.card_number == card_number)
+        ) is not None:
+            return customer
+
+        customers = await self.fetch_customers()
+        return next(
+            (customer for customer in customers if customer.CardNumber == card_number), None
+        )
+
+    async def _find_stored_customer(self, criterion: ColumnElement[bool]) -> CustomerModel | None:
+        """Покупатель компании из таблицы `customers` (ошибка БД - как отсутствие покупателя)"""
+
+        def find() -> CustomerModel | None:
+            with self.db_helper.sessionmanager(readonly=True) as session:
+                customer = session.scalars(
+                    select(Customer)
+                    .where(Customer.company_id == self.api_access.company_id, criterion)
+                    .limit(1)
+                ).first()
+                return customer.to_model() if customer else None
+
+        try:
+            return await asyncio.to_thread(find)
+        except SQLAlchemyError as e:
+            self.logger.warning(f"Не удалось прочитать покупателя из БД: {e}")
+            return None
+
+    def invalidate_customers_cache(self) -> None:
+        """Сбросить кэш списка покупателей"""
+        self.customers_cache.invalidate()
 
-    #     sales_info = self._get_sales_ks(up_date, to_date)
+    async def _aget_sales_ks(self, up_date: str, to_date: str) -> list[SaleModel] | None:
+        """
+        Асинхронная версия :meth:`_get_sales_ks`.
 
-    #     if not sales_info:
-    #         return None
+        :param up_date: Начальная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :param to_date: Конечная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :return: Список продаж или None при ошибке
+        """
+        try:
+            sales = await self.fetch_sales(up_date, to_date)
+        except KitShopError as e:
+            self._log_request_error(e)
+            return None
+
+        self.logger.info(f"Список продаж с {up_date} по {to_date} успешно загружен")
+        return sales
+
+    async def _aget_sales_about_ks(self, sale_id: int) -> SalesAboutModel | None:
+        """
+        Асинхронная версия :meth:`_get_sales_about_ks`.
 
-    #     for sale in sales_info[:10]:
-    #         sale_about = self._get_sales_about_ks(sale.SaleId)
+        :param sale_id: Идентификатор продажи
+        :return: Подробная информация о продаже или None при ошибке
+        """
+        try:
+            sale_about = await self.fetch_sale_about(sale_id)
+        except KitShopError as e:
+            self._log_request_error(e)
+            return None
+
+        self.logger.info("Подробная информация о продаже получена", extra={"SaleId": sale_id})
+        return sale_about
+
+    async def aget_users_info(self) -> list[CustomerModel] | None:
+        """
+        Асинхронная версия :meth:`get_users_info`.
+
+        :return: Список покупателей или None при ошибке
+        """
+        try:
+            customers = await self.fetch_customers()
+        except KitShopError as e:
+            self._log_request_error(e)
+            return None
 
-    #         result.append(SalesModelFull(**sale.model_dump(), about=sale_about))
+        self.logger.info("Список пользователей успешно загружен")
+        return customers
+
+    # endregion
+
+    async def get_sales_by_period(
+        self,
+        up_date: str,
+        to_date: str,
+        concurrency: int | None = None,
+    ) -> list[SalesModelFull] | None:
+        """
+        Получение продаж за период вместе с подробной информацией о каждой продаже.
+
+        Подробности запрашиваются параллельно, но не более `concurrency` запросов одновременно.
+        Если настроен кэш подробностей продаж, у KitShop запрашиваются только продажи, которых
+        нет в кэше.
+        Порядок продаж сохраняется. Ошибка получения подробностей одной продажи не прерывает
+        обработку остальных: у такой продажи `about` равен None, а текст ошибки записан в
+        `about_error`.
+
+        :param up_date: Начальная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :param to_date: Конечная дата (в формате "дд.мм.гггг чч:мм:сс")
+        :param concurrency: Максимальное количество одновременных запросов подробностей
+        :return: Список продаж или None, если не удалось получить сам список
+        """
+        sales_info = await self._aget_sales_ks(up_date, to_date)
+
+        if sales_info is None:
+            return None
+
+        details, errors = await self.fetch_sales_about(
+            (sale.SaleId for sale in sales_info), concurrency
+        )
+        result = [
+            SalesModelFull(**sale.model_dump(), about=details[sale.SaleId])
+            if sale.SaleId in details
+            else SalesModelFull(**sale.model_dump(), about_error=str(errors[sale.SaleId]))
+            for sale in sales_info
+        ]
+
+        failed = [sale.SaleId for sale in result if sale.about_error is not None]
+        if failed:
+            self.logger.warning(
+                f"Не удалось получить подробности {len(failed)} из {len(result)} продаж",
+                extra={"failed_sale_ids": failed},
+            )
 
-    #     return result
+        return result
@@ -0,0 +1,110 @@
+"""
+:mod:`metrics` -- Метрики приложения в формате Prometheus
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+__all__ = (
+    "DB_POOL_CHECKOUT_SECONDS",
+    "DB_POOL_TIMEOUTS",
+    "DB_READONLY_SESSIONS",
+    "DB_REPLICA_LAG",
+    "DB_REQUEST_QUERIES",
+    "DB_REQUEST_SECONDS",
+    "KIT_SHOP_CIRCUIT_REJECTIONS",
+    "KIT_SHOP_CIRCUIT_STATE",
+    "KIT_SHOP_COALESCED",
+    "KIT_SHOP_RETRIES",
+    "KIT_SHOP_SALE_DETAILS_CACHE",
+    "SCHEDULER_JOB_DURATION",
+    "SCHEDULER_JOB_LAST_SUCCESS",
+    "SCHEDULER_JOB_RUNS",
+)
+
+KIT_SHOP_CIRCUIT_STATE = Gauge(
+    "kit_shop_circuit_breaker_state",
+    "Состояние circuit breaker KitShop API: 0 - closed, 1 - half-open, 2 - open",
+    ["name"],
+)
+
+KIT_SHOP_CIRCUIT_REJECTIONS = Counter(
+    "kit_shop_circuit_breaker_rejections",
+    "Запросы к KitShop API, отклоненные открытым circuit breaker",
+    ["method"],
+)
+
+KIT_SHOP_RETRIES = Counter(
+    "kit_shop_retries",
+    "Повторные попытки запросов к KitShop API после временной ошибки",
+    ["method"],
+)
+
+KIT_SHOP_COALESCED = Counter(
+    "kit_shop_coalesced_requests",
+    "Запросы к KitShop API, присоединенные к уже выполняющемуся одинаковому запросу",
+    ["method"],
+)
+
+KIT_SHOP_SALE_DETAILS_CACHE = Counter(
+    "kit_shop_sale_details_cache",
+    "Обращения к кэшу подробностей продаж: memory/db - попадание, miss - промах",
+    ["result"],
+)
+
+SCHEDULER_JOB_RUNS = Counter(
+    "scheduler_job_runs",
+    "Запуски периодических задач: success, error, timeout или skipped - предыдущий еще идет",
+    ["job", "result"],
+)
+
+SCHEDULER_JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Длительность выполнения периодических задач",
+    ["job"],
+)
+
+SCHEDULER_JOB_LAST_SUCCESS = Gauge(
+    "scheduler_job_last_success_timestamp_seconds",
+    "Время последнего успешного выполнения периодической задачи (unix time)",
+    ["job"],
+)
+
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Отставание реплики БД при последней проверке, -1 - реплика недоступна",
+)
+
+DB_READONLY_SESSIONS = Counter(
+    "db_readonly_sessions",
+    "Сессии только для чтения: replica - на реплике, primary - на основной БД из-за отставания "
+    "или недоступности реплики",
+    ["target"],
+)
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Время получения соединения из пула, включая ожидание свободного и открытие нового",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts",
+    "Превышения времени ожидания соединения из пула (pool_timeout)",
+    ["pool"],
+)
+
+DB_REQUEST_SECONDS = Histogram(
+    "db_request_seconds",
+    "Суммарное время запросов к БД за один HTTP запрос",
+    ["route"],
+)
+
+DB_REQUEST_QUERIES = Histogram(
+    "db_request_queries",
+    "Количество запросов к БД за один HTTP запрос",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
@@ -0,0 +1,178 @@
+"""
+:mod:`rate_limiter` -- Адаптивное ограничение частоты запросов к KitShop API
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from logging import Logger, getLogger
+
+__all__ = ("AdaptiveRateLimiter",)
+
+
+class AdaptiveRateLimiter:
+    """
+    Ограничение частоты и параллельности запросов
+
+    Частота ограничивается token bucket: не более `rate` запросов в секунду с запасом `burst`.
+    Количество одновременных запросов регулируется по AIMD: каждый успешный запрос увеличивает
+    лимит на `1 / limit` (примерно +1 за "поколение" запросов), а признак перегрузки (HTTP 429,
+    5xx, таймаут) умножает лимит на `decrease_factor`. Чтобы пачка одновременно упавших запросов
+    не обрушила лимит до минимума, уменьшение выполняется не чаще раза в `cooldown` секунд.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int | None = None,
+        min_concurrency: int = 1,
+        max_concurrency: int = 10,
+        initial_concurrency: int | None = None,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param rate: Максимальное количество запросов в секунду
+        :param burst: Размер корзины токенов, по умолчанию равен `max_concurrency`
+        :param min_concurrency: Нижняя граница лимита одновременных запросов
+        :param max_concurrency: Верхняя граница лимита одновременных запросов
+        :param initial_concurrency: Начальный лимит, по умолчанию равен `max_concurrency`
+        :param decrease_factor: Множитель лимита при перегрузке
+        :param cooldown: Минимальный интервал между уменьшениями лимита (секунды)
+        :param clock: Источник времени
+        :param logger: Логгер
+        """
+        self.rate = rate
+        self.burst = burst or max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.logger = logger or getLogger(__name__)
+        self._clock = clock
+
+        self._limit = float(initial_concurrency or max_concurrency)
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = clock()
+        self._decreased_at: float | None = None
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._token_lock: asyncio.Lock | None = None
+
+        self.successes = 0
+        self.overloads = 0
+
+    @property
+    def limit(self) -> int:
+        """Текущий лимит одновременных запросов"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся запросов"""
+        return self._in_flight
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        is_overload: Callable[[BaseException], bool] = lambda _: True,
+    ) -> AsyncIterator[None]:
+        """
+        Выполнить запрос в рамках лимитов
+
+        Ожидает свободного места и токена. Успешное завершение блока увеличивает лимит,
+        исключение, для которого `is_overload` вернул True, уменьшает его. Остальные исключения
+        на лимит не влияют.
+
+        :param is_overload: Является ли исключение признаком перегрузки API
+        """
+        await self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            self.release(overloaded=True if is_overload(e) else None)
+            raise
+        else:
+            self.release(overloaded=False)
+
+    async def acquire(self) -> None:
+        """Дождаться свободного места и токена"""
+        while self._in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                # Отмененный ожидающий мог уже получить место - передаем его следующему
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._wake()
+                raise
+        self._in_flight += 1
+
+        try:
+            await self._take_token()
+        except BaseException:
+            self.release(overloaded=None)
+            raise
+
+    def release(self, overloaded: bool | None) -> None:
+        """
+        Освободить место и скорректировать лимит
+
+        :param overloaded: True - перегрузка, False - успешный запрос, None - не менять лимит
+        """
+        self._in_flight -= 1
+
+        if overloaded is True:
+            self._decrease()
+        elif overloaded is False:
+            self.successes += 1
+            self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+
+        self._wake()
+
+    def _decrease(self) -> None:
+        self.overloads += 1
+        now = self._clock()
+        if self._decreased_at is not None and now - self._decreased_at < self.cooldown:
+            return
+
+        self._decreased_at = now
+        self._limit = max(self.min_concurrency, self._limit * self.decrease_factor)
+        self.logger.warning(
+            "KitShop API перегружен, лимит одновременных запросов уменьшен",
+            extra={"limit": self.limit, "in_flight": self._in_flight},
+        )
+
+    def _wake(self) -> None:
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def _take_token(self) -> None:
+        # Lock создается лениво, внутри работающего event loop
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+
+        # Токены выдаются по очереди, чтобы ожидающие запросы не обгоняли друг друга
+        async with self._token_lock:
+            while True:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
@@ -0,0 +1,160 @@
+"""
+:mod:`resilience` -- Повторные попытки и circuit breaker для запросов к внешним API
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import random
+import time
+from collections.abc import Callable
+from enum import IntEnum
+from logging import Logger, getLogger
+
+from ext_kit_shop.utils.metrics import KIT_SHOP_CIRCUIT_STATE
+
+__all__ = (
+    "CircuitBreaker",
+    "CircuitState",
+    "RetryPolicy",
+)
+
+
+class RetryPolicy:
+    """
+    Политика повторных попыток с экспоненциальной задержкой и jitter
+
+    Задержка после неудачной попытки `n` выбирается случайно из
+    `[0, min(max_delay, base_delay * 2^(n-1))]` ("full jitter"), чтобы клиенты, получившие ошибку
+    одновременно, не повторяли запросы синхронно.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+    ) -> None:
+        """
+        :param attempts: Максимальное количество попыток, включая первую
+        :param base_delay: Базовая задержка (секунды)
+        :param max_delay: Максимальная задержка (секунды)
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """
+        Задержка перед следующей попыткой
+
+        :param attempt: Номер неудавшейся попытки, начиная с 1
+        :return: Задержка (секунды)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitState(IntEnum):
+    """Состояние circuit breaker"""
+
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker
+
+    После `failure_threshold` сбоев подряд breaker открывается, и запросы отклоняются сразу, не
+    дожидаясь таймаута. Через `recovery_timeout` секунд breaker пропускает один пробный запрос:
+    при успехе он закрывается, при сбое снова открывается на `recovery_timeout`.
+    Состояние публикуется в метрике `kit_shop_circuit_breaker_state`.
+    """
+
+    def __init__(
+        self,
+        name: str = "kit_shop",
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param name: Имя breaker (метка метрики)
+        :param failure_threshold: Количество сбоев подряд, после которого breaker открывается
+        :param recovery_timeout: Время до пробного запроса после открытия (секунды)
+        :param clock: Источник времени
+        :param logger: Логгер
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.logger = logger or getLogger(__name__)
+        self._clock = clock
+
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at: float | None = None
+        KIT_SHOP_CIRCUIT_STATE.labels(name).set(self._state)
+
+    @property
+    def state(self) -> CircuitState:
+        """Текущее состояние"""
+        if self._state is CircuitState.OPEN and self._recovery_due():
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос
+
+        В состоянии half-open пропускается только один пробный запрос. Если его результат так и
+        не был записан (например, запрос отменен), через `recovery_timeout` пропускается новый.
+
+        :return: True, если запрос можно выполнить
+        """
+        if self._state is CircuitState.CLOSED:
+            return True
+
+        if self._state is CircuitState.OPEN:
+            if not self._recovery_due():
+                return False
+            self._set_state(CircuitState.HALF_OPEN)
+
+        now = self._clock()
+        if (
+            self._probe_started_at is not None
+            and now - self._probe_started_at < self.recovery_timeout
+        ):
+            return False
+
+        self._probe_started_at = now
+        return True
+
+    def record_success(self) -> None:
+        """Записать успешный запрос"""
+        self._failures = 0
+        self._probe_started_at = None
+        if self._state is not CircuitState.CLOSED:
+            self._set_state(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        """Записать сбой"""
+        self._failures += 1
+        self._probe_started_at = None
+        if self._state is CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            if self._state is not CircuitState.OPEN:
+                self._set_state(CircuitState.OPEN)
+
+    def _recovery_due(self) -> bool:
+        return self._clock() - self._opened_at >= self.recovery_timeout
+
+    def _set_state(self, state: CircuitState) -> None:
+        self.logger.warning(
+            f"Circuit breaker {self.name}: {self._state.name} -> {state.name}",
+            extra={"failures": self._failures},
+        )
+        self._state = state
+        KIT_SHOP_CIRCUIT_STATE.labels(self.name).set(state)
@@ -0,0 +1,209 @@
+"""
+:mod:`sale_details_cache` -- Кэш подробностей продаж KitShop (память + Postgres)
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta
+from logging import Logger, getLogger
+
+from sqlalchemy import or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from ext_kit_shop.models.db import SaleDetail
+from ext_kit_shop.models.kit_shop import SalesAboutModel
+from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.metrics import KIT_SHOP_SALE_DETAILS_CACHE
+from ext_kit_shop.utils.threads import to_thread
+
+__all__ = ("SaleDetailsCache",)
+
+
+class SaleDetailsCache:
+    """
+    Двухуровневый кэш ответов `GetSaleById`
+
+    Первый уровень - LRU в памяти процесса на `max_size` продаж, второй - таблица `sale_details`,
+    общая для всех процессов и переживающая перезапуск. Фискализированная продажа больше не
+    меняется, поэтому хранится бессрочно, нефискализированная - `ttl` секунд с момента получения.
+    Ошибки БД не пробрасываются: при чтении это промах кэша, при записи - только запись в лог.
+    """
+
+    def __init__(
+        self,
+        db_helper: DBHelper,
+        max_size: int = 10_000,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param db_helper: Хелпер для работы с БД
+        :param max_size: Максимальное количество продаж в памяти
+        :param ttl: Время жизни нефискализированной продажи (секунды)
+        :param clock: Источник времени для записей в памяти
+        :param logger: Логгер
+        """
+        self.db_helper = db_helper
+        self.max_size = max_size
+        self.ttl = ttl
+        self.logger = logger or getLogger(__name__)
+        self._clock = clock
+        # sale_id -> (подробности, момент устаревания по clock или None - бессрочно)
+        self._memory: OrderedDict[int, tuple[SalesAboutModel, float | None]] = OrderedDict()
+
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Количество продаж в памяти"""
+        return len(self._memory)
+
+    async def get(self, sale_id: int) -> SalesAboutModel | None:
+        """
+        Подробности продажи из кэша
+
+        :param sale_id: Идентификатор продажи
+        :return: Подробности продажи или None, если их нет в кэше или они устарели
+        """
+        return (await self.get_many([sale_id])).get(sale_id)
+
+    async def get_many(self, sale_ids: Iterable[int]) -> dict[int, SalesAboutModel]:
+        """
+        Подробности нескольких продаж из кэша
+
+        Продажи, которых нет в памяти, читаются из БД одним запросом.
+
+        :param sale_ids: Идентификаторы продаж
+        :return: Словарь {идентификатор продажи: подробности} для найденных продаж
+        """
+        found: dict[int, SalesAboutModel] = {}
+        missing: list[int] = []
+
+        for sale_id in dict.fromkeys(sale_ids):
+            sale = self._get_memory(sale_id)
+            if sale is None:
+                missing.append(sale_id)
+            else:
+                found[sale_id] = sale
+        self._count("memory", len(found))
+
+        if missing:
+            try:
+                loaded = await to_thread(self._load, missing)
+            except SQLAlchemyError as e:
+                self.logger.warning(f"Не удалось прочитать кэш подробностей продаж: {e}")
+                loaded = {}
+            for sale, remaining in loaded.values():
+                self._put_memory(sale, remaining)
+                found[sale.SaleId] = sale
+            self._count("db", len(loaded))
+            self._count("miss", len(missing) - len(loaded))
+
+        return found
+
+    async def put(self, sale: SalesAboutModel) -> None:
+        """
+        Сохранить подробности продажи
+
+        :param sale: Подробности продажи
+        """
+        await self.put_many([sale])
+
+    async def put_many(self, sales: Iterable[SalesAboutModel]) -> None:
+        """
+        Сохранить подробности нескольких продаж одним запросом к БД
+
+        :param sales: Подробности продаж
+        """
+        unique = {sale.SaleId: sale for sale in sales}
+        if not unique:
+            return
+
+        for sale in unique.values():
+            self._put_memory(sale, None if sale.IsFiscal else self.ttl)
+        try:
+            await to_thread(self._store, list(unique.values()))
+        except SQLAlchemyError as e:
+            self.logger.warning(f"Не удалось сохранить кэш подробностей продаж: {e}")
+
+    def _get_memory(self, sale_id: int) -> SalesAboutModel | None:
+        entry = self._memory.get(sale_id)
+        if entry is None:
+            return None
+
+        sale, expires_at = entry
+        if expires_at is not None and self._clock() >= expires_at:
+            del self._memory[sale_id]
+            return None
+
+        self._memory.move_to_end(sale_id)
+        return sale
+
+    def _put_memory(self, sale: SalesAboutModel, ttl: float | None) -> None:
+        self._memory[sale.SaleId] = (sale, None if ttl is None else self._clock() + ttl)
+        self._memory.move_to_end(sale.SaleId)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _load(self, sale_ids: list[int]) -> dict[int, tuple[SalesAboutModel, float | None]]:
+        """
+        Прочитать актуальные подробности продаж из БД
+
+        :return: Словарь {идентификатор продажи: (подробности, оставшееся время жизни или None)}
+        """
+        now = datetime.now()
+        loaded = {}
+        with self.db_helper.sessionmanager() as session:
+            details = session.scalars(
+                select(SaleDetail).where(
+                    SaleDetail.sale_id.in_(sale_ids),
+                    or_(
+                        SaleDetail.is_fiscal,
+                        SaleDetail.fetched_at > now - timedelta(seconds=self.ttl),
+                    ),
+                )
+            )
+            for detail in details:
+                remaining = (
+                    None
+                    if detail.is_fiscal
+                    else self.ttl - (now - detail.fetched_at).total_seconds()
+                )
+                loaded[detail.sale_id] = (detail.to_model(), remaining)
+        return loaded
+
+    def _store(self, sales: list[SalesAboutModel]) -> None:
+        fetched_at = datetime.now()
+        statement = insert(SaleDetail)
+        upsert = statement.on_conflict_do_update(
+            index_elements=[SaleDetail.sale_id],
+            set_={
+                "is_fiscal": statement.excluded.is_fiscal,
+                "payload": statement.excluded.payload,
+                "fetched_at": statement.excluded.fetched_at,
+            },
+        )
+        with self.db_helper.sessionmanager() as session:
+            # RETURNING включает insertmanyvalues: строки уходят пачками в одном INSERT
+            session.execute(
+                upsert.returning(SaleDetail.id),
+                [SaleDetail.values_from_model(sale, fetched_at) for sale in sales],
+            )
+
+    def _count(self, result: str, count: int) -> None:
+        if not count:
+            return
+
+        if result == "memory":
+            self.memory_hits += count
+        elif result == "db":
+            self.db_hits += count
+        else:
+            self.misses += count
+        KIT_SHOP_SALE_DETAILS_CACHE.labels(result).inc(count)
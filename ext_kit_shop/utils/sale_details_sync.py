@@ -0,0 +1,193 @@
+"""
+:mod:`sale_details_sync` -- Догрузка позиций синхронизированных продаж KitShop
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+from datetime import datetime, timedelta
+from logging import Logger, getLogger
+
+from pydantic import BaseModel
+from sqlalchemy import delete, exists, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from ext_kit_shop.models.db import Sale, SaleDetail, SaleDetailFailure, SalePosition
+from ext_kit_shop.models.kit_shop import SalesAboutModel
+from ext_kit_shop.utils.bulk_writer import BulkWriter
+from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.kit_shop_client import KitShopError
+from ext_kit_shop.utils.kit_shop_manager import KitShopManager
+from ext_kit_shop.utils.threads import to_thread
+
+__all__ = (
+    "SaleDetailsSync",
+    "SaleDetailsSyncResult",
+)
+
+
+class SaleDetailsSyncResult(BaseModel):
+    """Результат одного прогона догрузки позиций"""
+
+    pending: int
+    stored: int = 0
+    fetched: int = 0
+    failed: int = 0
+    written: int = 0
+
+
+class SaleDetailsSync:
+    """
+    Догрузка позиций продаж, уже записанных в `sales`
+
+    Каждый прогон выбирает не более `batch_size` продаж компании за последние `lookback`, у
+    которых еще нет позиций в `sale_positions`, и пишет их позиции пакетным upsert. Продажа с
+    сохраненными подробностями в `sale_details` (независимо от фискализации и срока жизни кэша)
+    у KitShop повторно не запрашивается: позиции берутся из сохраненных подробностей, а продажи
+    без позиций в них не выбираются вовсе. Остальные запрашиваются через
+    :meth:`KitShopManager.fetch_sales_about`. Неудачные попытки записываются в
+    `sale_detail_failures`, и продажа не выбирается до `retry_after`: задержка удваивается с
+    каждой попыткой от `retry_delay` и не превышает `lookback`.
+    """
+
+    def __init__(
+        self,
+        db_helper: DBHelper,
+        kit_shop_manager: KitShopManager,
+        bulk_writer: BulkWriter,
+        lookback: timedelta = timedelta(days=1),
+        batch_size: int = 500,
+        retry_delay: timedelta = timedelta(minutes=5),
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param db_helper: Хелпер для работы с БД
+        :param kit_shop_manager: Менеджер KitShop API
+        :param bulk_writer: Пакетная запись в БД
+        :param lookback: Глубина поиска продаж без позиций (по `server_date_time`)
+        :param batch_size: Максимальное количество продаж за прогон
+        :param retry_delay: Задержка повторного запроса после первой неудачной попытки
+        :param logger: Логгер
+        """
+        self.db_helper = db_helper
+        self.kit_shop_manager = kit_shop_manager
+        self.bulk_writer = bulk_writer
+        self.lookback = lookback
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.logger = logger or getLogger(__name__)
+
+    @property
+    def company_id(self) -> int:
+        """Компания, продажи которой обрабатываются"""
+        return self.kit_shop_manager.api_access.company_id
+
+    async def sync(self, now: datetime | None = None) -> SaleDetailsSyncResult:
+        """
+        Выполнить один прогон догрузки
+
+        Ошибка получения подробностей одной продажи не прерывает прогон: продажа останется без
+        позиций и будет запрошена снова после `retry_after` своей неудачной попытки.
+
+        :param now: Текущее время, от которого отсчитываются `lookback` и `retry_after`
+        :return: Результат догрузки
+        """
+        now = now or datetime.now()
+        stored, sale_ids = await to_thread(self._pending, now)
+        result = SaleDetailsSyncResult(pending=len(stored) + len(sale_ids), stored=len(stored))
+        if not result.pending:
+            return result
+
+        details: dict[int, SalesAboutModel] = {}
+        errors: dict[int, KitShopError] = {}
+        if sale_ids:
+            details, errors = await self.kit_shop_manager.fetch_sales_about(sale_ids)
+        result.fetched = len(details)
+        result.failed = len(errors)
+        if errors:
+            self.logger.warning(
+                f"Не удалось получить подробности {len(errors)} продаж",
+                extra={"failed_sale_ids": list(errors)},
+            )
+
+        result.written = await to_thread(self._store, stored + list(details.values()), errors, now)
+        self.logger.info("Догрузка позиций продаж завершена", extra=result.model_dump())
+        return result
+
+    def _pending(self, now: datetime) -> tuple[list[SalesAboutModel], list[int]]:
+        """
+        Продажи без позиций, начиная с самых новых
+
+        :return: Подробности продаж, сохраненные в `sale_details`, и продажи, которые нужно
+            запросить у KitShop
+        """
+        with self.db_helper.sessionmanager() as session:
+            rows = session.execute(
+                select(Sale.sale_id, SaleDetail)
+                .outerjoin(SaleDetail, SaleDetail.sale_id == Sale.sale_id)
+                .where(
+                    Sale.company_id == self.company_id,
+                    Sale.server_date_time >= now - self.lookback,
+                    ~exists().where(SalePosition.sale_id == Sale.sale_id),
+                    or_(
+                        SaleDetail.id.is_(None),
+                        func.jsonb_array_length(SaleDetail.payload["Positions"]) > 0,
+                    ),
+                    ~exists().where(
+                        SaleDetailFailure.sale_id == Sale.sale_id,
+                        SaleDetailFailure.retry_after > now,
+                    ),
+                )
+                .order_by(Sale.server_date_time.desc(), Sale.sale_id.desc())
+                .limit(self.batch_size)
+            ).all()
+            stored = [detail.to_model() for _, detail in rows if detail is not None]
+            return stored, [sale_id for sale_id, detail in rows if detail is None]
+
+    def _store(
+        self,
+        sales: list[SalesAboutModel],
+        errors: dict[int, KitShopError],
+        now: datetime,
+    ) -> int:
+        """Записать позиции и неудачные попытки в одной транзакции, вернуть число позиций"""
+        with self.db_helper.sessionmanager() as session:
+            written = self.bulk_writer.upsert_positions(sales, session=session).written
+            if sales:
+                session.execute(
+                    delete(SaleDetailFailure).where(
+                        SaleDetailFailure.sale_id.in_([sale.SaleId for sale in sales])
+                    )
+                )
+            if errors:
+                query = select(SaleDetailFailure.sale_id, SaleDetailFailure.attempts).where(
+                    SaleDetailFailure.sale_id.in_(list(errors))
+                )
+                previous = dict(session.execute(query).tuples().all())
+                rows = []
+                for sale_id, error in errors.items():
+                    attempts = previous.get(sale_id, 0) + 1
+                    rows.append(
+                        {
+                            "sale_id": sale_id,
+                            "attempts": attempts,
+                            "last_error": str(error),
+                            "retry_after": now + self._retry_delay(attempts),
+                        }
+                    )
+                statement = insert(SaleDetailFailure)
+                session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[SaleDetailFailure.sale_id],
+                        set_={
+                            "attempts": statement.excluded.attempts,
+                            "last_error": statement.excluded.last_error,
+                            "retry_after": statement.excluded.retry_after,
+                        },
+                    ),
+                    rows,
+                )
+        return written
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        """Задержка после `attempts` неудачных попыток подряд"""
+        return min(self.retry_delay * 2 ** min(attempts - 1, 30), self.lookback)
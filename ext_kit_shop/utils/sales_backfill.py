@@ -0,0 +1,189 @@
+"""
+:mod:`sales_backfill` -- Параллельная загрузка истории продаж KitShop с возобновлением
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from logging import Logger, getLogger
+
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from ext_kit_shop.models.db import SalesBackfillWindow
+from ext_kit_shop.models.kit_shop import KIT_SHOP_DATETIME_FORMAT, SaleModel
+from ext_kit_shop.utils.bulk_writer import BulkWriter
+from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.kit_shop_client import KitShopError
+from ext_kit_shop.utils.kit_shop_manager import KitShopManager
+
+__all__ = (
+    "SalesBackfill",
+    "SalesBackfillResult",
+)
+
+
+class SalesBackfillResult(BaseModel):
+    """Результат загрузки истории"""
+
+    windows: int
+    skipped: int = 0
+    completed: int = 0
+    rows: int = 0
+    failed: list[tuple[datetime, datetime]] = []
+
+
+class SalesBackfill:
+    """
+    Загрузка истории продаж окнами
+
+    Период `[start, end)` делится на окна фиксированного размера (сутки, час), которые
+    загружаются параллельно, но не более чем `workers` одновременно. Продажи окна и отметка о
+    его завершении в `sales_backfill_windows` пишутся в одной транзакции, поэтому после сбоя
+    повторный запуск с теми же параметрами загружает только незавершенные окна.
+    """
+
+    def __init__(
+        self,
+        db_helper: DBHelper,
+        kit_shop_manager: KitShopManager,
+        bulk_writer: BulkWriter,
+        window: timedelta = timedelta(days=1),
+        workers: int = 4,
+        use_copy: bool = True,
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param db_helper: Хелпер для работы с БД
+        :param kit_shop_manager: Менеджер KitShop API
+        :param bulk_writer: Пакетная запись в БД
+        :param window: Размер окна по умолчанию
+        :param workers: Количество одновременно загружаемых окон по умолчанию
+        :param use_copy: Писать продажи через `COPY` (иначе пакетным upsert)
+        :param logger: Логгер
+        """
+        self.db_helper = db_helper
+        self.kit_shop_manager = kit_shop_manager
+        self.bulk_writer = bulk_writer
+        self.window = window
+        self.workers = workers
+        self.use_copy = use_copy
+        self.logger = logger or getLogger(__name__)
+
+    @property
+    def company_id(self) -> int:
+        """Компания, история которой загружается"""
+        return self.kit_shop_manager.api_access.company_id
+
+    @staticmethod
+    def split(start: datetime, end: datetime, window: timedelta) -> list[tuple[datetime, datetime]]:
+        """
+        Разбить период на окна
+
+        :param start: Начало периода (включительно)
+        :param end: Конец периода (не включительно)
+        :param window: Размер окна
+        :return: Список окон `[начало, конец)`
+        """
+        windows = []
+        while start < end:
+            windows.append((start, min(start + window, end)))
+            start += window
+        return windows
+
+    async def run(
+        self,
+        start: datetime,
+        end: datetime,
+        window: timedelta | None = None,
+        workers: int | None = None,
+    ) -> SalesBackfillResult:
+        """
+        Загрузить историю продаж за период
+
+        Ошибка загрузки одного окна не прерывает остальные: такие окна перечислены в
+        `failed` результата и будут загружены при следующем запуске.
+
+        :param start: Начало периода (включительно)
+        :param end: Конец периода (не включительно)
+        :param window: Размер окна, по умолчанию :attr:`window`
+        :param workers: Количество одновременно загружаемых окон, по умолчанию :attr:`workers`
+        :return: Результат загрузки
+        """
+        windows = self.split(start, end, window or self.window)
+        completed = await asyncio.to_thread(self._completed_windows, start, end)
+        pending = [window_ for window_ in windows if window_ not in completed]
+
+        result = SalesBackfillResult(windows=len(windows), skipped=len(windows) - len(pending))
+        semaphore = asyncio.Semaphore(workers or self.workers)
+
+        async def process(window_: tuple[datetime, datetime]) -> None:
+            async with semaphore:
+                try:
+                    rows = await self._process_window(*window_)
+                except (KitShopError, SQLAlchemyError) as e:
+                    self.logger.error(
+                        f"Не удалось загрузить окно {window_[0]} - {window_[1]}: {e}",
+                    )
+                    result.failed.append(window_)
+                    return
+
+            result.completed += 1
+            result.rows += rows
+
+        await asyncio.gather(*(process(window_) for window_ in pending))
+
+        result.failed.sort()
+        self.logger.info("Загрузка истории продаж завершена", extra=result.model_dump())
+        return result
+
+    async def _process_window(self, window_start: datetime, window_end: datetime) -> int:
+        """
+        Загрузить одно окно
+
+        :return: Количество продаж в окне
+        """
+        # Границы фильтра GetSales включительные, а точность дат - секунда
+        sales = await self.kit_shop_manager.fetch_sales(
+            window_start.strftime(KIT_SHOP_DATETIME_FORMAT),
+            (window_end - timedelta(seconds=1)).strftime(KIT_SHOP_DATETIME_FORMAT),
+        )
+        await asyncio.to_thread(self._store_window, window_start, window_end, sales)
+        return len(sales)
+
+    def _store_window(
+        self,
+        window_start: datetime,
+        window_end: datetime,
+        sales: list[SaleModel],
+    ) -> None:
+        """Записать продажи окна и отметку о его завершении в одной транзакции"""
+        with self.db_helper.sessionmanager() as session:
+            if self.use_copy:
+                self.bulk_writer.copy_sales(sales, session=session)
+            else:
+                self.bulk_writer.upsert_sales(sales, session=session)
+
+            session.add(
+                SalesBackfillWindow(
+                    company_id=self.company_id,
+                    window_start=window_start,
+                    window_end=window_end,
+                    rows=len(sales),
+                    completed_at=datetime.now(),
+                )
+            )
+
+    def _completed_windows(self, start: datetime, end: datetime) -> set[tuple[datetime, datetime]]:
+        """Окна периода, загрузка которых уже завершена"""
+        with self.db_helper.sessionmanager() as session:
+            rows = session.execute(
+                select(SalesBackfillWindow.window_start, SalesBackfillWindow.window_end).where(
+                    SalesBackfillWindow.company_id == self.company_id,
+                    SalesBackfillWindow.window_start >= start,
+                    SalesBackfillWindow.window_end <= end,
+                )
+            )
+            return {(row.window_start, row.window_end) for row in rows}
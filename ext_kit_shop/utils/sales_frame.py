@@ -0,0 +1,330 @@
+"""
+:mod:`sales_frame` -- Колоночное представление продаж для аналитики
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import Any, Literal, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import ColumnElement, Select, select
+
+from ext_kit_shop.models.db import Sale
+from ext_kit_shop.models.kit_shop import SaleModel, parse_kit_shop_datetime
+from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.kit_shop_client import KitShopClient, KitShopResponseError
+
+__all__ = (
+    "SalesFrame",
+    "SalesGroups",
+)
+
+# Типы колонок
+COLUMNS: dict[str, npt.DTypeLike] = {
+    "sale_id": np.int64,
+    "shop_id": np.int32,
+    "device_id": np.int32,
+    "sum": np.float64,
+    "pay_type": np.int16,
+    "sale_ts": np.int64,
+    "server_ts": np.int64,
+    "is_fiscal": np.bool_,
+}
+# Поля ответа KitShop API для колонок (кроме дат)
+_RESPONSE_FIELDS = {
+    "sale_id": "SaleId",
+    "shop_id": "ShopId",
+    "device_id": "DeviceId",
+    "sum": "Sum",
+    "pay_type": "PayType",
+    "is_fiscal": "IsFiscal",
+}
+# Дата KitShop API "дд.мм.гггг чч:мм:сс": длина, позиции цифр и разделителей
+_DATETIME_LENGTH = 19
+_DATETIME_DIGITS = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18]
+_DATETIME_SEPARATORS = {2: ".", 5: ".", 10: " ", 13: ":", 16: ":"}
+_MAX_DIGIT = 9
+_MONTHS, _HOURS, _MINUTES = 12, 24, 60
+_SECONDS_PER_DAY = 86400
+
+_Mask = npt.NDArray[np.bool_]
+
+
+def _parse_datetimes(values: Sequence[str]) -> npt.NDArray[np.int64]:
+    """
+    Разбор дат KitShop API в секунды от 1970-01-01 (время без часового пояса)
+
+    Даты разбираются векторно: строки переводятся в матрицу байтов, из которой цифры
+    извлекаются столбцами. Если хотя бы одна дата имеет другой вид, все даты разбираются по
+    одной через :func:`parse_kit_shop_datetime`.
+
+    :raises ValueError: Если строка не является датой
+    """
+    if not values:
+        return np.empty(0, dtype=np.int64)
+
+    try:
+        # На байт длиннее даты: более длинная строка не обрежется незаметно
+        raw = np.array(values, dtype=f"S{_DATETIME_LENGTH + 1}")
+    except UnicodeEncodeError:
+        raw = None
+
+    if raw is not None:
+        chars = raw.view(np.uint8).reshape(-1, _DATETIME_LENGTH + 1)
+        digits = chars[:, _DATETIME_DIGITS].astype(np.int64) - ord("0")
+        valid = (
+            (chars[:, _DATETIME_LENGTH] == 0).all()
+            and ((digits >= 0) & (digits <= _MAX_DIGIT)).all()
+        ) and all(
+            (chars[:, index] == ord(separator)).all()
+            for index, separator in _DATETIME_SEPARATORS.items()
+        )
+        if valid:
+            day, month, hour, minute, second = (
+                digits[:, position] * 10 + digits[:, position + 1] for position in (0, 2, 8, 10, 12)
+            )
+            year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+            months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+            days_in_month = (months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")
+            valid = bool(
+                ((month >= 1) & (month <= _MONTHS)).all()
+                and ((day >= 1) & (day <= days_in_month.astype(np.int64))).all()
+                and (hour < _HOURS).all()
+                and (minute < _MINUTES).all()
+                and (second < _MINUTES).all()
+            )
+        if valid:
+            days = months.astype("datetime64[D]").astype(np.int64) + day - 1
+            epoch: npt.NDArray[np.int64] = (
+                days * _SECONDS_PER_DAY + hour * 3600 + minute * 60 + second
+            )
+            return epoch
+
+    return _datetimes_to_epoch([parse_kit_shop_datetime(value) for value in values])
+
+
+def _datetimes_to_epoch(values: Sequence[datetime]) -> npt.NDArray[np.int64]:
+    return np.array(values, dtype="datetime64[s]").astype(np.int64)
+
+
+class SalesGroups(NamedTuple):
+    """Итоги продаж по группам"""
+
+    # Ключи групп (магазин, касса или день), по возрастанию
+    keys: npt.NDArray[Any]
+    # Количество продаж в группе
+    counts: npt.NDArray[np.int64]
+    # Сумма продаж в группе
+    sums: npt.NDArray[np.float64]
+
+    def to_dict(self) -> dict[Any, tuple[int, float]]:
+        """Словарь {ключ: (количество, сумма)}"""
+        return {
+            key: (int(count), float(total))
+            for key, count, total in zip(self.keys.tolist(), self.counts, self.sums, strict=True)
+        }
+
+
+class SalesFrame:
+    """
+    Продажи в виде колонок NumPy (struct-of-arrays)
+
+    Каждое поле хранится отдельным массивом, даты - секундами от 1970-01-01 без часового пояса,
+    так же как они хранятся в БД. Строка занимает 43 байта вместо нескольких килобайт у
+    :class:`SaleModel`, а фильтрация, группировка и суммирование выполняются векторно.
+    Фильтрация возвращает новый фрейм, исходные колонки не изменяются.
+    """
+
+    sale_id: npt.NDArray[np.int64]
+    shop_id: npt.NDArray[np.int32]
+    device_id: npt.NDArray[np.int32]
+    sum: npt.NDArray[np.float64]
+    pay_type: npt.NDArray[np.int16]
+    sale_ts: npt.NDArray[np.int64]
+    server_ts: npt.NDArray[np.int64]
+    is_fiscal: npt.NDArray[np.bool_]
+
+    def __init__(self, **columns: npt.ArrayLike) -> None:
+        """
+        :param columns: Колонки (см. :data:`COLUMNS`), все одинаковой длины
+        :raises ValueError: Если колонок не хватает или они разной длины
+        """
+        if missing := COLUMNS.keys() - columns.keys():
+            raise ValueError(f"Не хватает колонок: {', '.join(sorted(missing))}")
+
+        length = None
+        for name, dtype in COLUMNS.items():
+            column = np.asarray(columns[name], dtype=dtype)
+            if length is not None and len(column) != length:
+                raise ValueError(f"Длина колонки {name} ({len(column)}) отличается от {length}")
+            length = len(column)
+            setattr(self, name, column)
+
+    def __len__(self) -> int:
+        """Количество продаж"""
+        return len(self.sale_id)
+
+    @property
+    def nbytes(self) -> int:
+        """Размер колонок в байтах"""
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    @property
+    def sale_date_time(self) -> npt.NDArray[np.datetime64]:
+        """Даты продаж"""
+        return self.sale_ts.astype("datetime64[s]")
+
+    @property
+    def server_date_time(self) -> npt.NDArray[np.datetime64]:
+        """Даты поступления продаж на сервер"""
+        return self.server_ts.astype("datetime64[s]")
+
+    @classmethod
+    def empty(cls) -> "SalesFrame":
+        """Фрейм без продаж"""
+        return cls(**{name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()})
+
+    @classmethod
+    def from_models(cls, sales: Iterable[SaleModel]) -> "SalesFrame":
+        """
+        Фрейм из списка продаж
+
+        :param sales: Продажи
+        """
+        sales = list(sales)
+        return cls(
+            sale_id=[sale.SaleId for sale in sales],
+            shop_id=[sale.ShopId for sale in sales],
+            device_id=[sale.DeviceId for sale in sales],
+            sum=[sale.Sum for sale in sales],
+            pay_type=[sale.PayType for sale in sales],
+            sale_ts=_datetimes_to_epoch([sale.SaleDateTime for sale in sales]),
+            server_ts=_datetimes_to_epoch([sale.ServerDateTime for sale in sales]),
+            is_fiscal=[sale.IsFiscal for sale in sales],
+        )
+
+    @classmethod
+    def from_response(cls, content: bytes, url: str = "GetSales") -> "SalesFrame":
+        """
+        Фрейм из тела ответа `GetSales` без создания моделей продаж
+
+        :param content: Тело ответа
+        :param url: Адрес метода API, для текста ошибки
+        :raises KitShopError: При ненулевом `ResultCode` или некорректном теле ответа
+        """
+        sales = KitShopClient.decode(url, content).get("Sales") or []
+        try:
+            return cls(
+                **{
+                    name: [sale[field] for sale in sales]
+                    for name, field in _RESPONSE_FIELDS.items()
+                },
+                sale_ts=_parse_datetimes([sale["SaleDateTime"] for sale in sales]),
+                server_ts=_parse_datetimes([sale["ServerDateTime"] for sale in sales]),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise KitShopResponseError(url, f"Некорректная продажа: {e!r}") from e
+
+    @staticmethod
+    def query() -> Select[Any]:
+        """Запрос колонок фрейма из таблицы `sales` (условия добавляются через `.where`)"""
+        return select(
+            Sale.sale_id,
+            Sale.shop_id,
+            Sale.device_id,
+            Sale.sum,
+            Sale.pay_type,
+            Sale.sale_date_time,
+            Sale.server_date_time,
+            Sale.is_fiscal,
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]]) -> "SalesFrame":
+        """
+        Фрейм из строк результата :meth:`query`
+
+        :param rows: Строки в порядке колонок :meth:`query`
+        """
+        columns = list(zip(*rows, strict=True))
+        if not columns:
+            return cls.empty()
+
+        sale_id, shop_id, device_id, total, pay_type, sale_dt, server_dt, is_fiscal = columns
+        return cls(
+            sale_id=sale_id,
+            shop_id=shop_id,
+            device_id=device_id,
+            sum=total,
+            pay_type=pay_type,
+            sale_ts=_datetimes_to_epoch(sale_dt),
+            server_ts=_datetimes_to_epoch(server_dt),
+            is_fiscal=is_fiscal,
+        )
+
+    @classmethod
+    def from_db(cls, db_helper: DBHelper, *criteria: ColumnElement[bool]) -> "SalesFrame":
+        """
+        Фрейм из таблицы `sales`
+
+        Запрос выполняется в сессии только для чтения, на реплике, если она настроена.
+
+        :param db_helper: Хелпер для работы с БД
+        :param criteria: Условия отбора, например `Sale.company_id == 1`
+        """
+        with db_helper.sessionmanager(readonly=True) as session:
+            return cls.from_rows(session.execute(cls.query().where(*criteria)))
+
+    def filter(self, mask: _Mask) -> "SalesFrame":
+        """
+        Продажи, для которых `mask` истинна
+
+        :param mask: Булев массив длины фрейма, например `frame.shop_id == 3`
+        """
+        return SalesFrame(**{name: getattr(self, name)[mask] for name in COLUMNS})
+
+    def between(
+        self,
+        start: datetime,
+        end: datetime,
+        column: Literal["sale", "server"] = "sale",
+    ) -> "SalesFrame":
+        """
+        Продажи за период `[start, end)`
+
+        :param start: Начало периода
+        :param end: Конец периода (не включительно)
+        :param column: По дате продажи или дате поступления на сервер
+        """
+        values = self.sale_ts if column == "sale" else self.server_ts
+        bounds = _datetimes_to_epoch([start, end])
+        return self.filter((values >= bounds[0]) & (values < bounds[1]))
+
+    def total(self) -> float:
+        """Сумма продаж"""
+        return float(self.sum.sum())
+
+    def group_by(self, by: Literal["shop", "device", "day"]) -> SalesGroups:
+        """
+        Количество и сумма продаж по магазинам, кассам или дням (по дате продажи)
+
+        :param by: Поле группировки
+        """
+        if by == "shop":
+            keys: npt.NDArray[Any] = self.shop_id
+        elif by == "device":
+            keys = self.device_id
+        else:
+            keys = (self.sale_ts // _SECONDS_PER_DAY).astype("datetime64[D]")
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return SalesGroups(
+            keys=unique,
+            counts=np.bincount(inverse, minlength=len(unique)),
+            sums=np.asarray(
+                np.bincount(inverse, weights=self.sum, minlength=len(unique)), dtype=np.float64
+            ),
+        )
@@ -0,0 +1,164 @@
+"""
+:mod:`sales_sync` -- Инкрементальная синхронизация продаж KitShop в таблицу `sales`
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+from datetime import datetime, timedelta
+from logging import Logger, getLogger
+
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from ext_kit_shop.models.db import Sale, SalesSyncState
+from ext_kit_shop.models.kit_shop import KIT_SHOP_DATETIME_FORMAT, SaleModel
+from ext_kit_shop.utils.bulk_writer import BulkWriter
+from ext_kit_shop.utils.db_helper import DBHelper
+from ext_kit_shop.utils.kit_shop_manager import KitShopManager
+from ext_kit_shop.utils.threads import to_thread
+
+__all__ = (
+    "SalesSync",
+    "SalesSyncResult",
+)
+
+
+class SalesSyncResult(BaseModel):
+    """Результат одного прогона синхронизации"""
+
+    up_date: datetime
+    to_date: datetime
+    fetched: int
+    written: int
+    last_server_date_time: datetime | None = None
+    last_sale_id: int | None = None
+
+
+class SalesSync:
+    """
+    Инкрементальная синхронизация продаж
+
+    Для каждой компании в таблице `sales_sync_state` хранится отметка последней загруженной
+    продажи (`ServerDateTime`, `SaleId`). Каждый прогон запрашивает у `GetSales` только окно от
+    этой отметки (минус небольшое перекрытие на случай поздно зарегистрированных продаж) до
+    текущего момента и выполняет upsert результата в `sales`. Строки, которые не изменились, не
+    перезаписываются.
+    """
+
+    def __init__(
+        self,
+        db_helper: DBHelper,
+        kit_shop_manager: KitShopManager,
+        bulk_writer: BulkWriter,
+        overlap: timedelta = timedelta(minutes=10),
+        initial_lookback: timedelta = timedelta(days=1),
+        logger: Logger | None = None,
+    ) -> None:
+        """
+        :param db_helper: Хелпер для работы с БД
+        :param kit_shop_manager: Менеджер KitShop API
+        :param bulk_writer: Пакетная запись в БД
+        :param overlap: Перекрытие окна запроса с предыдущим прогоном
+        :param initial_lookback: Глубина первой синхронизации, если отметки еще нет
+        :param logger: Логгер
+        """
+        self.db_helper = db_helper
+        self.kit_shop_manager = kit_shop_manager
+        self.bulk_writer = bulk_writer
+        self.overlap = overlap
+        self.initial_lookback = initial_lookback
+        self.logger = logger or getLogger(__name__)
+
+    @property
+    def company_id(self) -> int:
+        """Компания, продажи которой синхронизируются"""
+        return self.kit_shop_manager.api_access.company_id
+
+    async def sync(self, now: datetime | None = None) -> SalesSyncResult:
+        """
+        Выполнить один прогон синхронизации
+
+        :param now: Правая граница окна, по умолчанию текущее время
+        :raises KitShopError: Если не удалось получить продажи
+        :return: Результат синхронизации
+        """
+        to_date = now or datetime.now()
+        state = await to_thread(self._load_state)
+        up_date = to_date - self.initial_lookback if state is None else state[0] - self.overlap
+
+        sales = await self.kit_shop_manager.fetch_sales(
+            up_date.strftime(KIT_SHOP_DATETIME_FORMAT),
+            to_date.strftime(KIT_SHOP_DATETIME_FORMAT),
+        )
+        written, state = await to_thread(self._store, sales, state)
+
+        result = SalesSyncResult(
+            up_date=up_date,
+            to_date=to_date,
+            fetched=len(sales),
+            written=written,
+            last_server_date_time=state[0] if state else None,
+            last_sale_id=state[1] if state else None,
+        )
+        self.logger.info("Синхронизация продаж завершена", extra=result.model_dump())
+        return result
+
+    def _load_state(self) -> tuple[datetime, int] | None:
+        """Текущая отметка компании"""
+        with self.db_helper.sessionmanager() as session:
+            state = session.execute(
+                select(SalesSyncState.last_server_date_time, SalesSyncState.last_sale_id).where(
+                    SalesSyncState.company_id == self.company_id
+                )
+            ).first()
+        return (state[0], state[1]) if state else None
+
+    def _store(
+        self,
+        sales: list[SaleModel],
+        state: tuple[datetime, int] | None,
+    ) -> tuple[int, tuple[datetime, int] | None]:
+        """
+        Сохранить продажи и сдвинуть отметку в одной транзакции
+
+        :param sales: Продажи из KitShop
+        :param state: Отметка до начала прогона
+        :return: Количество записанных строк и новая отметка
+        """
+        if not sales:
+            return 0, state
+
+        rows = [Sale.values_from_model(sale) for sale in sales]
+        last = max(rows, key=lambda row: (row["server_date_time"], row["sale_id"]))
+        if state is None or (last["server_date_time"], last["sale_id"]) > state:
+            state = (last["server_date_time"], last["sale_id"])
+
+        with self.db_helper.sessionmanager() as session:
+            written = self.bulk_writer.upsert(Sale, rows, ("sale_id",), session=session).written
+
+            statement = insert(SalesSyncState).values(
+                company_id=self.company_id,
+                last_server_date_time=state[0],
+                last_sale_id=state[1],
+                updated_at=datetime.now(),
+            )
+            excluded = statement.excluded
+            # Отметка никогда не сдвигается назад
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[SalesSyncState.company_id],
+                    set_={
+                        "last_server_date_time": excluded.last_server_date_time,
+                        "last_sale_id": excluded.last_sale_id,
+                        "updated_at": excluded.updated_at,
+                    },
+                    where=(SalesSyncState.last_server_date_time < excluded.last_server_date_time)
+                    | (
+                        (SalesSyncState.last_server_date_time == excluded.last_server_date_time)
+                        & (SalesSyncState.last_sale_id < excluded.last_sale_id)
+                    ),
+                )
+            )
+
+        return written, state
@@ -0,0 +1,188 @@
+"""
+:mod:`scheduler` -- Периодический запуск фоновых задач в event loop приложения
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from logging import Logger, getLogger
+from typing import Any
+
+from ext_kit_shop.utils.metrics import (
+    SCHEDULER_JOB_DURATION,
+    SCHEDULER_JOB_LAST_SUCCESS,
+    SCHEDULER_JOB_RUNS,
+)
+
+__all__ = (
+    "PeriodicJob",
+    "Scheduler",
+)
+
+
+class PeriodicJob:
+    """Периодическая задача и ее счетчики"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        jitter: float = 0.1,
+        timeout: float | None = None,
+    ) -> None:
+        """
+        :param name: Имя задачи (в логах и метриках)
+        :param func: Функция, возвращающая корутину одного прогона
+        :param interval: Интервал между запусками (секунды)
+        :param jitter: Случайное отклонение интервала, доля от `interval`
+        :param timeout: Максимальная длительность прогона (секунды), None - без ограничения
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.running = False
+
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_success: float | None = None
+
+    def next_delay(self, rng: random.Random) -> float:
+        """Интервал до следующего запуска с учетом случайного отклонения"""
+        return self.interval * (1 + rng.uniform(-self.jitter, self.jitter))
+
+
+class Scheduler:
+    """
+    Планировщик периодических задач на asyncio
+
+    Каждая задача выполняется в своем цикле: прогон, затем ожидание интервала со случайным
+    отклонением, отсчитанного от начала прогона. Первый запуск тоже сдвинут на случайную долю
+    интервала, чтобы задачи не стартовали одновременно. Прогон, не уложившийся в `timeout`,
+    отменяется. Прогоны одной задачи не пересекаются: если прогон дольше интервала, пропущенные
+    запуски не накапливаются, а :meth:`run` во время прогона возвращает False. Ошибка прогона
+    записывается в лог и не останавливает цикл.
+
+    Работа, переданная задачей в поток, при отмене не прерывается. Если она передана через
+    :func:`~ext_kit_shop.utils.threads.to_thread`, отмененный прогон (по `timeout` или
+    :meth:`stop`) завершается и следующий может начаться только после того, как поток закончит
+    работу. Потоки, запущенные через :func:`asyncio.to_thread`, не отслеживаются.
+    """
+
+    def __init__(self, logger: Logger | None = None, rng: random.Random | None = None) -> None:
+        """
+        :param logger: Логгер
+        :param rng: Генератор случайных чисел для отклонений интервала
+        """
+        self.logger = logger or getLogger(__name__)
+        self.jobs: dict[str, PeriodicJob] = {}
+        self._rng = rng or random.Random()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    @property
+    def started(self) -> bool:
+        """Запущены ли циклы задач"""
+        return bool(self._tasks)
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        jitter: float = 0.1,
+        timeout: float | None = None,
+    ) -> PeriodicJob | None:
+        """
+        Добавить задачу
+
+        :param name: Имя задачи
+        :param func: Функция, возвращающая корутину одного прогона
+        :param interval: Интервал между запусками (секунды), 0 - задача не добавляется
+        :param jitter: Случайное отклонение интервала, доля от `interval`
+        :param timeout: Максимальная длительность прогона (секунды)
+        :raises ValueError: Если задача с таким именем уже есть
+        :return: Задача или None, если она отключена
+        """
+        if name in self.jobs:
+            raise ValueError(f"Задача {name} уже добавлена")
+        if interval <= 0:
+            self.logger.info(f"Периодическая задача {name} отключена")
+            return None
+
+        job = PeriodicJob(name, func, interval, jitter, timeout)
+        self.jobs[name] = job
+        return job
+
+    def start(self) -> None:
+        """Запустить циклы всех задач (вызывается из работающего event loop)"""
+        if self.started:
+            return
+
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"scheduler:{job.name}"))
+        self.logger.info("Планировщик запущен", extra={"jobs": list(self.jobs)})
+
+    async def stop(self) -> None:
+        """Отменить циклы и текущие прогоны и дождаться их завершения"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if tasks:
+            self.logger.info("Планировщик остановлен")
+
+    async def run(self, name: str) -> bool:
+        """
+        Выполнить прогон задачи сейчас
+
+        :param name: Имя задачи
+        :raises KeyError: Если задачи нет
+        :return: False, если прогон пропущен, потому что предыдущий еще выполняется
+        """
+        job = self.jobs[name]
+        if job.running:
+            job.skipped += 1
+            SCHEDULER_JOB_RUNS.labels(job.name, "skipped").inc()
+            self.logger.warning(f"Задача {job.name} еще выполняется, запуск пропущен")
+            return False
+
+        job.running = True
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(job.timeout):
+                await job.func()
+        except TimeoutError:
+            self._record_failure(job, "timeout", f"не уложилась в {job.timeout} с")
+        except Exception as e:  # noqa: BLE001
+            self._record_failure(job, "error", repr(e))
+        else:
+            job.last_success = time.time()
+            SCHEDULER_JOB_RUNS.labels(job.name, "success").inc()
+            SCHEDULER_JOB_LAST_SUCCESS.labels(job.name).set(job.last_success)
+        finally:
+            job.running = False
+            job.runs += 1
+            SCHEDULER_JOB_DURATION.labels(job.name).observe(time.perf_counter() - started)
+        return True
+
+    async def _loop(self, job: PeriodicJob) -> None:
+        await asyncio.sleep(job.interval * self._rng.uniform(0, job.jitter))
+        while True:
+            started = time.monotonic()
+            await self.run(job.name)
+            delay = started + job.next_delay(self._rng) - time.monotonic()
+            await asyncio.sleep(max(delay, 0.0))
+
+    def _record_failure(self, job: PeriodicJob, result: str, message: str) -> None:
+        job.failures += 1
+        SCHEDULER_JOB_RUNS.labels(job.name, result).inc()
+        self.logger.error(
+            f"Ошибка периодической задачи {job.name}: {message}",
+            extra={"job": job.name, "result": result},
+        )
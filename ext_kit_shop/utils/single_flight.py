@@ -0,0 +1,66 @@
+"""
+:mod:`single_flight` -- Объединение одновременных одинаковых запросов
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+from collections.abc import Callable, Coroutine, Hashable
+from functools import partial
+from typing import Any, TypeVar
+
+__all__ = ("SingleFlight",)
+
+_T = TypeVar("_T")
+
+
+class SingleFlight:
+    """
+    Single-flight: одновременные вызовы с одинаковым ключом выполняются один раз
+
+    Первый вызов по ключу запускает задачу, остальные, пришедшие до ее завершения, ждут ту же
+    задачу и получают тот же результат (или то же исключение). После завершения ключ
+    освобождается, и следующий вызов снова выполняет запрос - результаты не кэшируются.
+    Отмена одного из ожидающих не отменяет задачу для остальных.
+    """
+
+    def __init__(self) -> None:
+        """Счетчики `started` и `shared` - количество запущенных и объединенных вызовов"""
+        self._flights: dict[Hashable, asyncio.Task[Any]] = {}
+        self.started = 0
+        self.shared = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Выполняется ли сейчас задача с ключом `key`"""
+        return key in self._flights
+
+    def __len__(self) -> int:
+        """Количество выполняющихся задач"""
+        return len(self._flights)
+
+    async def do(self, key: Hashable, func: Callable[[], Coroutine[Any, Any, _T]]) -> _T:
+        """
+        Выполнить `func` или дождаться уже выполняющегося вызова с тем же ключом
+
+        :param key: Ключ вызова
+        :param func: Функция, возвращающая корутину
+        :return: Результат корутины
+        """
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._flights[key] = task
+            task.add_done_callback(partial(self._done, key))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        result: _T = await asyncio.shield(task)
+        return result
+
+    def _done(self, key: Hashable, task: asyncio.Task[Any]) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Если все ожидающие были отменены, исключение задачи некому получить
+        if not task.cancelled():
+            task.exception()
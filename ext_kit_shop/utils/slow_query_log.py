@@ -0,0 +1,210 @@
+"""
+:mod:`slow_query_log` -- Журнал медленных запросов к БД
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import random
+import re
+import time
+from collections.abc import Mapping, Sequence
+from logging import Logger, getLogger
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from ext_kit_shop.utils.db_metrics import current_route
+
+__all__ = (
+    "SlowQueryLog",
+    "normalize_sql",
+    "redact_params",
+)
+
+# Параметры с такими именами не попадают в лог
+_SECRET_PARAM = re.compile(r"pass|secret|token|sign|auth|key", re.IGNORECASE)
+_MAX_PARAM_LENGTH = 64
+_MAX_PARAMS = 20
+
+# Параметры драйвера: %(name)s у psycopg2, $1 у asyncpg
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<!\w)-?\d+(?:\.\d+)?\b")
+# Строки VALUES пакетной вставки и списки IN
+_VALUES_ROWS = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_IN_LIST = re.compile(r"\bIN\s*\(([^()]*,[^()]*)\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Нормализовать SQL: одинаковые по структуре запросы дают одну строку
+
+    Пробелы схлопываются, параметры, строковые и числовые литералы заменяются на `?`, строки
+    пакетной вставки и списки `IN (...)` - на `...`.
+
+    :param statement: Текст запроса
+    :return: Нормализованный текст
+    """
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _VALUES_ROWS.sub(r"\1, ...", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _redact_value(value: Any) -> Any:
+    if value is None or isinstance(value, bool | int | float):
+        return value
+    text = str(value)
+    if len(text) > _MAX_PARAM_LENGTH:
+        return f"{text[:_MAX_PARAM_LENGTH]}... ({len(text)} символов)"
+    return text
+
+
+def redact_params(parameters: Any) -> Any:
+    """
+    Параметры запроса для лога
+
+    Значения параметров с именами вроде `password`, `token`, `sign` заменяются на `***`. У
+    позиционных параметров (asyncpg) имен нет, поэтому скрываются все строковые значения.
+    Длинные значения обрезаются; у пакетного запроса показывается первая строка параметров.
+
+    :param parameters: Параметры, переданные драйверу БД
+    :return: Безопасное для лога представление параметров
+    """
+    if isinstance(parameters, Mapping):
+        return {
+            key: "***" if _SECRET_PARAM.search(str(key)) else _redact_value(value)
+            for key, value in list(parameters.items())[:_MAX_PARAMS]
+        }
+    if isinstance(parameters, Sequence) and not isinstance(parameters, str | bytes):
+        if parameters and isinstance(parameters[0], Mapping | list | tuple):
+            return {"rows": len(parameters), "first": redact_params(parameters[0])}
+        return [
+            "***" if isinstance(value, str) else _redact_value(value)
+            for value in parameters[:_MAX_PARAMS]
+        ]
+    return _redact_value(parameters)
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных запросов к БД на событиях SQLAlchemy
+
+    Запрос дольше `threshold` секунд записывается в лог с нормализованным SQL, скрытыми
+    параметрами, длительностью и HTTP запросом, в рамках которого он выполнен. Для доли
+    `explain_rate` медленных SELECT дополнительно снимается план `EXPLAIN (ANALYZE, BUFFERS)`.
+
+    `EXPLAIN ANALYZE` выполняет запрос повторно, поэтому план снимается только для SELECT,
+    не чаще раза в `explain_interval` секунд для одного нормализованного запроса, и внутри
+    SAVEPOINT текущей транзакции: ошибка `EXPLAIN` не прерывает транзакцию вызывающего кода.
+    Соединения в режиме AUTOCOMMIT и пакетные запросы не анализируются.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 1.0,
+        explain_rate: float = 0.0,
+        explain_interval: float = 60.0,
+        logger: Logger | None = None,
+        rng: random.Random | None = None,
+    ) -> None:
+        """
+        :param threshold: Длительность запроса (секунды), начиная с которой он записывается в
+            лог, 0 - журнал отключен
+        :param explain_rate: Доля медленных SELECT, для которых снимается план (от 0 до 1)
+        :param explain_interval: Минимальный интервал между планами одного запроса (секунды)
+        :param logger: Логгер
+        :param rng: Генератор случайных чисел для выборки запросов
+        """
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self.logger = logger or getLogger(__name__)
+        self._rng = rng or random.Random()
+        # Время последнего плана по нормализованному запросу
+        self._explained: dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Включен ли журнал"""
+        return self.threshold > 0
+
+    def attach(self, engine: Engine) -> None:
+        """
+        Подключить журнал к engine (для асинхронного - к `AsyncEngine.sync_engine`)
+
+        :param engine: Экземпляр :class:`Engine`
+        """
+        if not self.enabled or event.contains(
+            engine, "before_cursor_execute", self._before_cursor_execute
+        ):
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn: Connection, *_: Any) -> None:
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self,
+        conn: Connection,
+        cursor: Any,  # noqa: ARG002
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        duration = time.perf_counter() - conn.info["slow_query_started"].pop()
+        if duration < self.threshold:
+            return
+
+        normalized = normalize_sql(statement)
+        extra: dict[str, Any] = {
+            "sql": normalized,
+            "params": redact_params(parameters),
+            "duration": round(duration, 3),
+            "route": current_route(),
+            "rows": context.rowcount if executemany else None,
+        }
+        if not executemany and self._should_explain(conn, normalized):
+            extra["plan"] = self._explain(conn, statement, parameters)
+
+        self.logger.warning(f"Медленный запрос к БД: {duration:.3f} с", extra=extra)
+
+    def _should_explain(self, conn: Connection, normalized: str) -> bool:
+        if (
+            self.explain_rate <= 0
+            or normalized[:6].upper() != "SELECT"
+            or not conn.in_transaction()
+            or conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT"
+            or self._rng.random() >= self.explain_rate
+        ):
+            return False
+
+        now = time.monotonic()
+        if now - self._explained.get(normalized, float("-inf")) < self.explain_interval:
+            return False
+        self._explained[normalized] = now
+        return True
+
+    def _explain(self, conn: Connection, statement: str, parameters: Any) -> str | None:
+        """План запроса; выполняется курсором драйвера, минуя события SQLAlchemy"""
+        cursor = conn.connection.dbapi_connection.cursor()  # type: ignore[union-attr]
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+            except Exception as e:  # noqa: BLE001
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                self.logger.warning(f"Не удалось получить план медленного запроса: {e!r}")
+                return None
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        finally:
+            cursor.close()
@@ -0,0 +1,36 @@
+"""
+:mod:`threads` -- Выполнение блокирующего кода в потоках из event loop
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+"""
+
+import asyncio
+from collections.abc import Callable
+from typing import ParamSpec, TypeVar
+
+__all__ = ("to_thread",)
+
+_P = ParamSpec("_P")
+_T = TypeVar("_T")
+
+
+async def to_thread(func: Callable[_P, _T], /, *args: _P.args, **kwargs: _P.kwargs) -> _T:
+    """
+    :func:`asyncio.to_thread`, отмена которого дожидается завершения потока
+
+    Поток нельзя прервать, поэтому при отмене (например, по таймауту) ошибка
+    :class:`asyncio.CancelledError` пробрасывается только после того, как функция в потоке
+    завершится. Вызывающий код, в том числе задачи :class:`Scheduler`, не считается завершенным,
+    пока работа в потоке (например, запись в БД) еще идет.
+
+    :param func: Функция, выполняемая в потоке
+    :param args: Позиционные аргументы функции
+    :param kwargs: Именованные аргументы функции
+    :return: Результат функции
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.gather(future, return_exceptions=True)
+        raise
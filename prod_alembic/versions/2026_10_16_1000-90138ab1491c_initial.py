@@ -0,0 +1,56 @@
+"""
+Исходная схема: таблицы `user` и `sales`
+
+Revision ID: 90138ab1491c
+Revises:
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "90138ab1491c"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблиц `user` и `sales`"""
+    op.create_table(
+        "user",
+        sa.Column("login", sa.String(), nullable=False),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("first_name", sa.String(), nullable=True),
+        sa.Column("last_name", sa.String(), nullable=True),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("login"),
+    )
+    op.create_table(
+        "sales",
+        sa.Column("sale_id", sa.Integer(), nullable=False),
+        sa.Column("device_id", sa.Integer(), nullable=False),
+        sa.Column("shop_id", sa.Integer(), nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("sum", sa.Float(), nullable=False),
+        sa.Column("sale_date_time", sa.DateTime(), nullable=False),
+        sa.Column("server_date_time", sa.DateTime(), nullable=False),
+        sa.Column("pay_type", sa.Integer(), nullable=False),
+        sa.Column("pay_details", sa.String(), nullable=True),
+        sa.Column("is_fiscal", sa.Boolean(), nullable=False),
+        sa.Column("customer_id", sa.Integer(), nullable=True),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sale_id"),
+    )
+
+
+def downgrade() -> None:
+    """Удаление таблиц `user` и `sales`"""
+    op.drop_table("sales")
+    op.drop_table("user")
@@ -0,0 +1,38 @@
+"""
+Отметка синхронизации продаж `sales_sync_state`
+
+Revision ID: a2a00c4029c0
+Revises: 90138ab1491c
+Create Date: 2026-10-16 10:10:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a2a00c4029c0"
+down_revision: str | None = "90138ab1491c"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблицы `sales_sync_state`"""
+    op.create_table(
+        "sales_sync_state",
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("last_server_date_time", sa.DateTime(), nullable=False),
+        sa.Column("last_sale_id", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("company_id"),
+    )
+
+
+def downgrade() -> None:
+    """Удаление таблицы `sales_sync_state`"""
+    op.drop_table("sales_sync_state")
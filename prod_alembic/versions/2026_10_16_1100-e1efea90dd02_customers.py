@@ -0,0 +1,44 @@
+"""
+Локальная копия покупателей KitShop `customers`
+
+Revision ID: e1efea90dd02
+Revises: a2a00c4029c0
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e1efea90dd02"
+down_revision: str | None = "a2a00c4029c0"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблицы `customers` и индекса по номеру карты"""
+    op.create_table(
+        "customers",
+        sa.Column("customer_id", sa.Integer(), nullable=False),
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("card_number", sa.String(), nullable=False),
+        sa.Column("customer_name", sa.String(), nullable=False),
+        sa.Column("balance", sa.Float(), nullable=False),
+        sa.Column("purchases", sa.Integer(), nullable=False),
+        sa.Column("last_purchase", sa.DateTime(), nullable=True),
+        sa.Column("loyalty_id", sa.Integer(), nullable=True),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("customer_id"),
+    )
+    op.create_index(op.f("ix_customers_card_number"), "customers", ["card_number"], unique=False)
+
+
+def downgrade() -> None:
+    """Удаление таблицы `customers`"""
+    op.drop_index(op.f("ix_customers_card_number"), table_name="customers")
+    op.drop_table("customers")
@@ -0,0 +1,52 @@
+"""
+Позиции продаж `sale_positions`
+
+Revision ID: 5e418fbfc333
+Revises: e1efea90dd02
+Create Date: 2026-10-16 11:30:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e418fbfc333"
+down_revision: str | None = "e1efea90dd02"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблицы `sale_positions` и ее индексов"""
+    op.create_table(
+        "sale_positions",
+        sa.Column("position_id", sa.Integer(), nullable=False),
+        sa.Column("sale_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("nominal_price", sa.Float(), nullable=False),
+        sa.Column("has_discount", sa.Boolean(), nullable=False),
+        sa.Column("has_promotion", sa.Boolean(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.ForeignKeyConstraint(["sale_id"], ["sales.sale_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("position_id"),
+    )
+    op.create_index(
+        "ix_sale_positions_product_id_sale_id",
+        "sale_positions",
+        ["product_id", "sale_id"],
+        unique=False,
+    )
+    op.create_index(op.f("ix_sale_positions_sale_id"), "sale_positions", ["sale_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Удаление таблицы `sale_positions`"""
+    op.drop_index(op.f("ix_sale_positions_sale_id"), table_name="sale_positions")
+    op.drop_index("ix_sale_positions_product_id_sale_id", table_name="sale_positions")
+    op.drop_table("sale_positions")
@@ -0,0 +1,39 @@
+"""
+Завершенные окна загрузки истории продаж `sales_backfill_windows`
+
+Revision ID: dc6e422bcda3
+Revises: 5e418fbfc333
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "dc6e422bcda3"
+down_revision: str | None = "5e418fbfc333"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблицы `sales_backfill_windows`"""
+    op.create_table(
+        "sales_backfill_windows",
+        sa.Column("company_id", sa.Integer(), nullable=False),
+        sa.Column("window_start", sa.DateTime(), nullable=False),
+        sa.Column("window_end", sa.DateTime(), nullable=False),
+        sa.Column("rows", sa.Integer(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("company_id", "window_start", "window_end"),
+    )
+
+
+def downgrade() -> None:
+    """Удаление таблицы `sales_backfill_windows`"""
+    op.drop_table("sales_backfill_windows")
@@ -0,0 +1,39 @@
+"""
+Кэш подробностей продаж `sale_details`
+
+Revision ID: 1763ac8d3107
+Revises: dc6e422bcda3
+Create Date: 2026-10-16 12:30:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "1763ac8d3107"
+down_revision: str | None = "dc6e422bcda3"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблицы `sale_details`"""
+    op.create_table(
+        "sale_details",
+        sa.Column("sale_id", sa.Integer(), nullable=False),
+        sa.Column("is_fiscal", sa.Boolean(), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sale_id"),
+    )
+
+
+def downgrade() -> None:
+    """Удаление таблицы `sale_details`"""
+    op.drop_table("sale_details")
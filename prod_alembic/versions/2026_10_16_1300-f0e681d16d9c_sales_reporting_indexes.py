@@ -0,0 +1,60 @@
+"""
+Отчетные индексы таблицы `sales`
+
+Revision ID: f0e681d16d9c
+Revises: 1763ac8d3107
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f0e681d16d9c"
+down_revision: str | None = "1763ac8d3107"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Индексы создаются CONCURRENTLY: таблица sales не блокируется на запись, но такая команда не
+# выполняется внутри транзакции, поэтому миграция работает в autocommit_block. Если создание
+# прервалось, PostgreSQL оставляет невалидный индекс; повторный запуск миграции удаляет его и
+# создает заново.
+INDEXES = (
+    (
+        "ix_sales_company_id_sale_date_time",
+        ["company_id", "sale_date_time"],
+        {"postgresql_include": ["shop_id", "sum"]},
+    ),
+    (
+        "ix_sales_shop_id_sale_date_time",
+        ["shop_id", "sale_date_time"],
+        {"postgresql_include": ["sum"]},
+    ),
+    ("ix_sales_device_id_sale_date_time", ["device_id", "sale_date_time"], {}),
+    (
+        "ix_sales_customer_id_sale_date_time",
+        ["customer_id", "sale_date_time"],
+        {"postgresql_where": sa.text("customer_id IS NOT NULL")},
+    ),
+    ("ix_sales_server_date_time_brin", ["server_date_time"], {"postgresql_using": "brin"}),
+)
+
+
+def upgrade() -> None:
+    """Создание отчетных индексов `sales` (CONCURRENTLY)"""
+    with op.get_context().autocommit_block():
+        for name, columns, options in INDEXES:
+            op.drop_index(name, table_name="sales", postgresql_concurrently=True, if_exists=True)
+            op.create_index(
+                name, "sales", columns, unique=False, postgresql_concurrently=True, **options
+            )
+
+
+def downgrade() -> None:
+    """Удаление отчетных индексов `sales` (CONCURRENTLY)"""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name="sales", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,38 @@
+"""
+Неудачные попытки получения подробностей продаж `sale_detail_failures`
+
+Revision ID: 3b9d52c7e4a1
+Revises: f0e681d16d9c
+Create Date: 2026-10-16 13:30:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b9d52c7e4a1"
+down_revision: str | None = "f0e681d16d9c"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Создание таблицы `sale_detail_failures`"""
+    op.create_table(
+        "sale_detail_failures",
+        sa.Column("sale_id", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=False),
+        sa.Column("retry_after", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sale_id"),
+    )
+
+
+def downgrade() -> None:
+    """Удаление таблицы `sale_detail_failures`"""
+    op.drop_table("sale_detail_failures")
@@ -0,0 +1,90 @@
+"""
+:mod:`backfill_sales` -- Загрузка истории продаж KitShop за период
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+Запускает :class:`SalesBackfill` из DI-контейнера приложения (настройки берутся из окружения и
+`.env`, как у приложения). Период делится на окна, завершенные окна отмечаются в
+`sales_backfill_windows`, поэтому прерванную загрузку можно продолжить, запустив команду с теми
+же `--from`, `--to` и `--window`: уже загруженные окна пропускаются.
+
+Запуск::
+
+    python tools/backfill_sales.py --from 2024-01-01 --to 2024-07-01 --window 1d --workers 4
+"""
+
+import argparse
+import asyncio
+import re
+import sys
+from datetime import datetime, timedelta
+
+from ext_kit_shop.di.rest import RestDI
+
+WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_window(value: str) -> timedelta:
+    """Размер окна вида `30m`, `6h`, `1d`"""
+    match = re.fullmatch(r"(\d+)([mhd])", value.strip())
+    if match is None or not int(match[1]):
+        raise argparse.ArgumentTypeError(f"Ожидается размер окна вида 6h или 1d: {value}")
+    return timedelta(**{WINDOW_UNITS[match[2]]: int(match[1])})
+
+
+async def backfill(
+    start: datetime, end: datetime, window: timedelta | None, workers: int | None
+) -> int:
+    """Загрузить историю и вернуть код завершения (1 - остались незагруженные окна)"""
+    di = RestDI()
+    try:
+        result = await di.sales_backfill().run(start, end, window, workers)
+    finally:
+        await di.kit_shop_client().aclose()
+        await di.cpu_pool().aclose()
+
+    sys.stdout.write(
+        f"Окон: {result.windows}, загружено ранее: {result.skipped}, "
+        f"загружено: {result.completed}, продаж: {result.rows:,}, с ошибкой: {len(result.failed)}\n"
+    )
+    for window_start, window_end in result.failed:
+        sys.stdout.write(f"  не загружено: {window_start} - {window_end}\n")
+    return 1 if result.failed else 0
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--from",
+        dest="start",
+        type=datetime.fromisoformat,
+        required=True,
+        help="Начало периода (включительно), например 2024-01-01",
+    )
+    parser.add_argument(
+        "--to",
+        dest="end",
+        type=datetime.fromisoformat,
+        required=True,
+        help="Конец периода (не включительно), например 2024-07-01T12:00",
+    )
+    parser.add_argument(
+        "--window",
+        type=parse_window,
+        help="Размер окна: 30m, 6h, 1d (по умолчанию BACKFILL_WINDOW_HOURS)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Количество одновременно загружаемых окон (по умолчанию BACKFILL_WORKERS)",
+    )
+    args = parser.parse_args()
+    if args.start >= args.end:
+        parser.error("--from должен быть раньше --to")
+
+    sys.exit(asyncio.run(backfill(args.start, args.end, args.window, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
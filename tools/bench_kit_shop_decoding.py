@@ -0,0 +1,124 @@
+"""
+:mod:`bench_kit_shop_decoding` -- Сравнение скорости разбора ответов KitShop API
+===================================
+.. moduleauthor:: ilya Barinov <i-barinov@it-serv.ru>
+
+Сравнивает разбор через `json.loads` и создание моделей по одной (`Model(**data)`) с
+валидацией списка адаптером и с валидацией всего ответа из байтов (:mod:`kit_shop_decoding`).
+Данные берутся из генератора локальной замены KitShop API.
+
+Запуск::
+
+    python tools/bench_kit_shop_decoding.py --rows 100000 --repeat 5
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+from ext_kit_shop.fake_kit_shop.data import FakeKitShopData
+from ext_kit_shop.models.kit_shop import CustomerModel, SaleModel
+from ext_kit_shop.utils.kit_shop_decoding import (
+    CUSTOMERS_ADAPTER,
+    SALES_ADAPTER,
+    decode_customers,
+    decode_sales,
+)
+
+URL = "bench"
+
+
+def build_sales(rows: int) -> bytes:
+    """Тело ответа `GetSales` с `rows` продажами"""
+    data = FakeKitShopData(sales_per_hour=400)
+    start = datetime(2024, 1, 1)
+    sales: list[dict[str, Any]] = []
+    day = 0
+    while len(sales) < rows:
+        up_date = start + timedelta(days=day)
+        to_date = up_date + timedelta(days=1)
+        sales.extend(
+            sale.model_dump(mode="json", exclude={"Positions"})
+            for sale in data.sales(up_date, to_date, to_date)
+        )
+        day += 1
+    return json.dumps({"ResultCode": 0, "Sales": sales[:rows]}, ensure_ascii=False).encode()
+
+
+def build_customers(rows: int) -> bytes:
+    """Тело ответа `GetCustomers` с `rows` покупателями"""
+    customers = [
+        customer.model_dump(mode="json")
+        for customer in FakeKitShopData(customers=rows).customers_list()
+    ]
+    return json.dumps({"ResultCode": 0, "Customers": customers}, ensure_ascii=False).encode()
+
+
+def measure(func: Callable[[], list[Any]], repeat: int) -> float:
+    """Лучшее время из `repeat` запусков"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def report(
+    title: str, content: bytes, variants: dict[str, Callable[[], list[Any]]], repeat: int
+) -> None:
+    """Вывести время вариантов разбора относительно первого"""
+    sys.stdout.write(f"{title}: {len(content) / 1024 / 1024:.1f} МБ\n")
+    baseline = None
+    for name, func in variants.items():
+        elapsed = measure(func, repeat)
+        baseline = baseline or elapsed
+        sys.stdout.write(f"  {name:<40} {elapsed * 1000:9.1f} мс  x{baseline / elapsed:.2f}\n")
+
+
+def main() -> None:
+    """Точка входа"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000, help="Количество строк в ответе")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество повторов")
+    args = parser.parse_args()
+
+    sales = build_sales(args.rows)
+    report(
+        f"GetSales, {args.rows} продаж",
+        sales,
+        {
+            "json.loads + SaleModel(**sale)": lambda: [
+                SaleModel(**sale) for sale in json.loads(sales)["Sales"]
+            ],
+            "json.loads + TypeAdapter.validate_python": lambda: SALES_ADAPTER.validate_python(
+                json.loads(sales)["Sales"]
+            ),
+            "decode_sales (model_validate_json)": lambda: decode_sales(URL, sales),
+        },
+        args.repeat,
+    )
+
+    customers = build_customers(args.rows)
+    report(
+        f"GetCustomers, {args.rows} покупателей",
+        customers,
+        {
+            "json.loads + CustomerModel(**customer)": lambda: [
+                CustomerModel(**customer) for customer in json.loads(customers)["Customers"]
+            ],
+            "json.loads + TypeAdapter.validate_python": lambda: CUSTOMERS_ADAPTER.validate_python(
+                json.loads(customers)["Customers"]
+            ),
+            "decode_customers (model_validate_json)": lambda: decode_customers(URL, customers),
+        },
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()